@@ -1,14 +1,22 @@
-from typing import Optional, List, Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import Optional, List, Dict, Any, AsyncIterator, Union
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain.memory import ConversationBufferMemory
 import os
 from models.schemas import AgentResponse, AgentType, TenancyQuery
+from utils.session_store import SessionStore
+from utils.llm_clients import LLMClients, get_llm_clients
+from utils.llm_scheduler import LLMOverloadedError
+from utils.circuit_breaker import CircuitOpenError
+from utils.metrics import DEGRADED_RESPONSES_TOTAL
+from utils.keyword_matcher import match_keywords
+from utils.faq_cache import FAQAnswerCache, CachedFAQAnswer
 from utils.prompts import (
     TENANCY_FAQ_SYSTEM_PROMPT,
     TENANCY_FAQ_LOCATION_PROMPT,
-    TENANCY_FAQ_FOLLOWUPS
+    TENANCY_FAQ_FOLLOWUPS,
+    DEGRADED_FAQ_NOTICE,
+    DEGRADED_FAQ_TOPIC_GUIDANCE,
+    DEGRADED_FAQ_GUIDANCE
 )
 import random
 import json
@@ -18,19 +26,24 @@ class TenancyFAQAgent:
     LangChain-powered agent for handling tenancy laws, rental agreements, and landlord-tenant issues.
     """
     
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        openai_api_key: Optional[str] = None,
+        session_store: Optional[SessionStore] = None,
+        llm_clients: Optional[LLMClients] = None
+    ):
         """Initialize the tenancy FAQ agent with LangChain."""
-        self.llm = ChatOpenAI(
+        self.llm = (llm_clients or get_llm_clients()).chat_model(
+            "tenancy_faq",
             model="gpt-4",
             temperature=0.1,
             max_tokens=800,
             api_key=openai_api_key
         )
         
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
+        self.memory = (session_store if session_store is not None else SessionStore()).memory("tenancy_faq")
+        
+        self.answer_cache = FAQAnswerCache()
         
         self.faq_prompt = ChatPromptTemplate.from_messages([
             ("system", TENANCY_FAQ_SYSTEM_PROMPT),
@@ -42,6 +55,13 @@ class TenancyFAQAgent:
             | self.llm 
             | StrOutputParser()
         )
+        
+        self.jurisdiction_prompt = ChatPromptTemplate.from_messages([
+            ("system", "Provide key tenancy law information for the specified jurisdiction, including typical notice periods, tenant protection agencies, and relevant housing authorities."),
+            ("human", "Provide key tenancy law information for: {location}")
+        ])
+        
+        self.jurisdiction_chain = self.jurisdiction_prompt | self.llm | StrOutputParser()
 
     def answer_tenancy_question(self, question: str, location: Optional[str] = None, context: Optional[str] = None) -> AgentResponse:
         """
@@ -56,37 +76,165 @@ class TenancyFAQAgent:
             AgentResponse with legal guidance and recommendations
         """
         try:
-            complete_question = f"Question: {question}"
+            cached = self._lookup_cache(question, location, context)
+            if cached:
+                return self._build_response(cached.answer, question, location)
             
-            if context:
-                complete_question += f"\nAdditional context: {context}"
+            ai_response = self.faq_chain.invoke({"question": self._format_question(question, location, context)})
             
-            if location:
-                complete_question += f"\nLocation: {location}"
-                complete_question += f"\n\nPlease provide location-specific guidance for {location}."
+            self._store_in_cache(question, location, context, ai_response)
             
-            ai_response = self.faq_chain.invoke({"question": complete_question})
+            return self._build_response(ai_response, question, location)
             
-            ai_response += self._add_legal_disclaimer()
+        except CircuitOpenError:
+            return self._degraded_response(question, location)
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            return self._error_response(e)
+    
+    async def aanswer_tenancy_question(self, question: str, location: Optional[str] = None, context: Optional[str] = None) -> AgentResponse:
+        """
+        Async variant of answer_tenancy_question that awaits the FAQ chain without blocking the event loop.
+        
+        Args:
+            question: User's tenancy question
+            location: User's location for jurisdiction-specific advice  
+            context: Additional context about the situation
             
-            follow_ups = self._generate_followup_questions(question, location)
+        Returns:
+            AgentResponse with legal guidance and recommendations
+        """
+        try:
+            cached = self._lookup_cache(question, location, context)
+            if cached:
+                return self._build_response(cached.answer, question, location)
             
-            confidence = 0.8 if location else 0.6
+            ai_response = await self.faq_chain.ainvoke({"question": self._format_question(question, location, context)})
             
-            return AgentResponse(
-                agent_type=AgentType.TENANCY_FAQ,
-                message=ai_response,
-                confidence=confidence,
-                follow_up_questions=follow_ups
-            )
+            self._store_in_cache(question, location, context, ai_response)
             
+            return self._build_response(ai_response, question, location)
+            
+        except CircuitOpenError:
+            return self._degraded_response(question, location)
+        except LLMOverloadedError:
+            raise
         except Exception as e:
-            return AgentResponse(
-                agent_type=AgentType.TENANCY_FAQ,
-                message=f"I apologize, but I encountered an error while processing your tenancy question: {str(e)}. Please try rephrasing your question.",
-                confidence=0.3,
-                follow_up_questions=["Could you rephrase your question?", "What specific tenancy issue are you facing?"]
-            )
+            return self._error_response(e)
+    
+    async def astream_tenancy_answer(self, question: str, location: Optional[str] = None, context: Optional[str] = None) -> AsyncIterator[Union[str, AgentResponse]]:
+        """
+        Stream the tenancy answer token by token.
+        
+        Args:
+            question: User's tenancy question
+            location: User's location for jurisdiction-specific advice  
+            context: Additional context about the situation
+            
+        Yields:
+            Answer text chunks as they arrive, then the complete AgentResponse
+        """
+        cached = self._lookup_cache(question, location, context)
+        if cached:
+            yield cached.answer
+            yield self._build_response(cached.answer, question, location)
+            return
+        
+        chunks = []
+        try:
+            async for chunk in self.faq_chain.astream({"question": self._format_question(question, location, context)}):
+                if chunk:
+                    chunks.append(chunk)
+                    yield chunk
+        except CircuitOpenError:
+            degraded = self._degraded_response(question, location)
+            yield degraded.message
+            yield degraded
+            return
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            yield self._error_response(e)
+            return
+        
+        ai_response = "".join(chunks)
+        self._store_in_cache(question, location, context, ai_response)
+        
+        yield self._build_response(ai_response, question, location)
+    
+    def _lookup_cache(self, question: str, location: Optional[str], context: Optional[str]) -> Optional[CachedFAQAnswer]:
+        """
+        Cached answer to the question for the location.
+        
+        The FAQ prompt carries no session history, so the same question gets the
+        same answer on any turn. Questions with extra context always go to the model.
+        """
+        if context:
+            return None
+        return self.answer_cache.get(question, location)
+    
+    def _store_in_cache(self, question: str, location: Optional[str], context: Optional[str], answer: str):
+        """Cache the model's answer to a question without extra context, tagged with its FAQ topics for invalidation."""
+        if context:
+            return
+        topics = tuple(category[len("topic_"):] for category in match_keywords(question) if category.startswith("topic_"))
+        self.answer_cache.put(question, location, answer, topics)
+    
+    def _format_question(self, question: str, location: Optional[str], context: Optional[str]) -> str:
+        """Combine the question, context and location into the FAQ chain input."""
+        complete_question = f"Question: {question}"
+        
+        if context:
+            complete_question += f"\nAdditional context: {context}"
+        
+        if location:
+            complete_question += f"\nLocation: {location}"
+            complete_question += f"\n\nPlease provide location-specific guidance for {location}."
+        
+        return complete_question
+    
+    def _build_response(self, ai_response: str, question: str, location: Optional[str]) -> AgentResponse:
+        """Attach the legal disclaimer and follow-ups to the model's answer."""
+        ai_response += self._add_legal_disclaimer()
+        
+        follow_ups = self._generate_followup_questions(question, location)
+        
+        confidence = 0.8 if location else 0.6
+        
+        return AgentResponse(
+            agent_type=AgentType.TENANCY_FAQ,
+            message=ai_response,
+            confidence=confidence,
+            follow_up_questions=follow_ups
+        )
+    
+    def _error_response(self, error: Exception) -> AgentResponse:
+        """Response returned when the FAQ chain fails."""
+        return AgentResponse(
+            agent_type=AgentType.TENANCY_FAQ,
+            message=f"I apologize, but I encountered an error while processing your tenancy question: {str(error)}. Please try rephrasing your question.",
+            confidence=0.3,
+            follow_up_questions=["Could you rephrase your question?", "What specific tenancy issue are you facing?"]
+        )
+    
+    def _degraded_response(self, question: str, location: Optional[str]) -> AgentResponse:
+        """Canned guidance for the question's topics, given while the model's circuit breaker is open."""
+        DEGRADED_RESPONSES_TOTAL.labels("tenancy_faq").inc()
+        
+        hits = match_keywords(question)
+        guidance = [text for topic, text in DEGRADED_FAQ_TOPIC_GUIDANCE.items() if f"topic_{topic}" in hits][:2]
+        
+        message = "\n\n".join([DEGRADED_FAQ_NOTICE] + guidance + [DEGRADED_FAQ_GUIDANCE])
+        if location:
+            message += f" Rules differ by jurisdiction, so check what applies in {location}."
+        
+        return AgentResponse(
+            agent_type=AgentType.TENANCY_FAQ,
+            message=message + self._add_legal_disclaimer(),
+            confidence=0.4,
+            follow_up_questions=self._generate_followup_questions(question, location)
+        )
     
     def _add_legal_disclaimer(self) -> str:
         """Add legal disclaimer to responses."""
@@ -94,29 +242,28 @@ class TenancyFAQAgent:
     
     def _generate_followup_questions(self, question: str, location: Optional[str]) -> List[str]:
         """Generate relevant follow-up questions based on the query."""
-        question_lower = question.lower()
-        
         if not location:
             return ["What city or state/province are you located in for more specific guidance?"]
         
+        topics = match_keywords(question)
         follow_ups = []
         
-        if "rent" in question_lower and "increase" in question_lower:
+        if "topic_rent" in topics and "topic_increase" in topics:
             follow_ups.extend([
                 "What type of rental agreement do you have (month-to-month or fixed-term)?",
                 "Have you received written notice of the rent increase?"
             ])
-        elif "eviction" in question_lower:
+        elif "topic_eviction" in topics:
             follow_ups.extend([
                 "Have you received any formal eviction notices?",
                 "Are you current on your rent payments?"
             ])
-        elif "deposit" in question_lower:
+        elif "topic_deposit" in topics:
             follow_ups.extend([
                 "Do you have documentation of the property's condition when you moved in?",
                 "How long has it been since you moved out?"
             ])
-        elif "repair" in question_lower or "maintenance" in question_lower:
+        elif "topic_repair" in topics:
             follow_ups.extend([
                 "Have you notified your landlord in writing about these issues?",
                 "How long have these repair issues been ongoing?"
@@ -129,21 +276,13 @@ class TenancyFAQAgent:
     def get_jurisdiction_info(self, location: str) -> str:
         """Get specific jurisdiction information for a location."""
         try:
-            jurisdiction_prompt = ChatPromptTemplate.from_messages([
-                ("system", "Provide key tenancy law information for the specified jurisdiction, including typical notice periods, tenant protection agencies, and relevant housing authorities."),
-                ("human", "Provide key tenancy law information for: {location}")
-            ])
-            
-            jurisdiction_chain = jurisdiction_prompt | self.llm | StrOutputParser()
-            
-            response = jurisdiction_chain.invoke({"location": location})
+            response = self.jurisdiction_chain.invoke({"location": location})
             
             return response
             
         except Exception as e:
             return f"Unable to retrieve specific information for {location}. Please consult local housing authorities or tenant rights organizations."
     
-    def add_to_memory(self, user_input: str, response: str):
-        """Add interaction to LangChain memory."""
-        self.memory.chat_memory.add_user_message(user_input)
-        self.memory.chat_memory.add_ai_message(response) 
\ No newline at end of file
+    def add_to_memory(self, session_id: str, user_input: str, response: str):
+        """Add interaction to the session's memory."""
+        self.memory.add_exchange(session_id, user_input, response) 
\ No newline at end of file
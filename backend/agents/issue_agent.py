@@ -1,5 +1,4 @@
-from typing import Optional, List, Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import Optional, List, Dict, Any, AsyncIterator, Union
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.tools import tool
@@ -10,26 +9,36 @@ from langchain_core.messages import (
     SystemMessage,
     ToolMessage
 )
-from langchain.memory import ConversationBufferMemory
-from PIL import Image
+import asyncio
 import base64
 import json
 import random
+from concurrent.futures.process import BrokenProcessPool
 
 from models.schemas import AgentResponse, AgentType
-from utils.image_utils import (
-    preprocess_image, 
-    enhance_image_for_analysis, 
-    detect_image_issues, 
-    encode_image_for_openai
-)
+from utils.session_store import SessionStore
+from utils.llm_clients import LLMClients, get_llm_clients
+from utils.llm_scheduler import LLMOverloadedError
+from utils.circuit_breaker import CircuitOpenError
+from utils.keyword_matcher import match_keywords
+from utils.image_utils import ImageBuffer, ImageInput, ANALYSIS_IMAGE_SIZE, to_image_buffer, encoded_image_size
+from utils.cv_pool import analyze_image, analyze_image_async
+from utils.image_cache import ImageAnalysisCache
+from utils.usage import estimate_image_tokens, record_image_tokens
+from utils.metrics import DEGRADED_RESPONSES_TOTAL
 from utils.prompts import (
     ISSUE_DETECTION_SYSTEM_PROMPT,
     ISSUE_DETECTION_IMAGE_PROMPT,
-    ISSUE_DETECTION_FOLLOWUPS
+    ISSUE_DETECTION_FOLLOWUPS,
+    DEGRADED_ISSUE_NOTICE,
+    DEGRADED_ISSUE_GUIDANCE
 )
 
 
+# CV worker failures that leave the request answerable from its description alone
+CV_FAILURES = (asyncio.TimeoutError, BrokenProcessPool)
+
+
 @tool
 def analyze_property_image(image_data: str, user_description: str) -> Dict[str, Any]:
     """
@@ -43,18 +52,9 @@ def analyze_property_image(image_data: str, user_description: str) -> Dict[str,
         Analysis results with detected issues and confidence scores
     """
     try:
-        import cv2
-        import numpy as np
-        from PIL import Image
-        import base64
-        import io
-        
         image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
         
-        processed_image = preprocess_image(image)
-        enhanced_image = enhance_image_for_analysis(processed_image)
-        cv_issues = detect_image_issues(enhanced_image)
+        cv_issues = ImageBuffer.from_bytes(image_bytes, max_size=ANALYSIS_IMAGE_SIZE).resize().enhance().detect_issues()
         
         return {
             "tool_name": "analyze_property_image",
@@ -91,16 +91,12 @@ def assess_issue_severity(issue_description: str, visible_indicators: List[str])
     Returns:
         Severity assessment and recommended actions
     """
-    high_severity = ["structural", "electrical", "gas", "flood", "fire", "collapse"]
-    medium_severity = ["leak", "crack", "mold", "damage", "malfunction"]
-    low_severity = ["wear", "maintenance", "cosmetic", "minor"]
+    hits = match_keywords(issue_description)
     
-    description_lower = issue_description.lower()
-    
-    if any(keyword in description_lower for keyword in high_severity):
+    if "severity_high" in hits:
         severity = "high"
         urgency = "immediate"
-    elif any(keyword in description_lower for keyword in medium_severity):
+    elif "severity_medium" in hits:
         severity = "medium"
         urgency = "within_days"
     else:
@@ -126,20 +122,25 @@ class LangChainIssueDetectionAgent:
     Modern LangChain-based issue detection agent with advanced tool integration.
     """
     
-    def __init__(self, openai_api_key: str):
+    def __init__(
+        self,
+        openai_api_key: str,
+        session_store: Optional[SessionStore] = None,
+        llm_clients: Optional[LLMClients] = None
+    ):
         """Initialize the modern issue detection agent."""
         
-        self.llm = ChatOpenAI(
+        self.llm = (llm_clients or get_llm_clients()).chat_model(
+            "issue_detection",
             model="gpt-4o",
             temperature=0.2,
             max_tokens=800,
             api_key=openai_api_key
         )
         
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
+        self.memory = (session_store if session_store is not None else SessionStore()).memory("issue_detection")
+        
+        self.image_cache = ImageAnalysisCache()
         
         self.tools = [
             analyze_property_image,
@@ -160,14 +161,14 @@ class LangChainIssueDetectionAgent:
     def analyze_issue(
         self, 
         user_text: str, 
-        image: Optional[Image.Image] = None
+        image: Optional[ImageInput] = None
     ) -> AgentResponse:
         """
         Analyze property issue using LangChain with optional image.
         
         Args:
             user_text: User's description of the issue
-            image: Optional PIL image for visual analysis
+            image: Optional image (ImageBuffer or PIL image) for visual analysis
             
         Returns:
             AgentResponse with analysis and recommendations
@@ -177,102 +178,322 @@ class LangChainIssueDetectionAgent:
         else:
             return self._analyze_text_only(user_text)
     
-    def clear_memory(self):
-        """Clear conversation memory for fresh analysis."""
-        self.memory.clear()
+    async def aanalyze_issue(
+        self, 
+        user_text: str, 
+        image: Optional[ImageInput] = None
+    ) -> AgentResponse:
+        """
+        Async variant of analyze_issue that awaits the LLM instead of blocking the event loop.
+        
+        Args:
+            user_text: User's description of the issue
+            image: Optional image (ImageBuffer or PIL image) for visual analysis
+            
+        Returns:
+            AgentResponse with analysis and recommendations
+        """
+        if image:
+            return await self._aanalyze_with_image(user_text, image)
+        else:
+            return await self._aanalyze_text_only(user_text)
     
-    def _analyze_with_image(self, user_text: str, image: Image.Image) -> AgentResponse:
-        """Analyze issue with image using LangChain Vision API."""
+    async def astream_issue(
+        self, 
+        user_text: str, 
+        image: Optional[ImageInput] = None
+    ) -> AsyncIterator[Union[str, AgentResponse]]:
+        """
+        Stream the issue analysis token by token.
+        
+        Args:
+            user_text: User's description of the issue
+            image: Optional image (ImageBuffer or PIL image) for visual analysis
+            
+        Yields:
+            Answer text chunks as they arrive, then the complete AgentResponse
+        """
+        cv_issues = None
+        messages = None
+        if image:
+            buffer = to_image_buffer(image)
+            image_hash = await asyncio.to_thread(buffer.dhash)
+            
+            cached = self.image_cache.get(image_hash, user_text)
+            if cached:
+                yield cached.analysis
+                yield self._build_image_response(cached.analysis, cached.cv_issues)
+                return
+            
+            try:
+                messages, cv_issues = await self._aprepare_vision_request(user_text, buffer)
+            except CV_FAILURES as e:
+                print(f"Image preprocessing failed, analyzing the description only: {e!r}")
         
-        processed_image = preprocess_image(image)
-        enhanced_image = enhance_image_for_analysis(processed_image)
+        if messages is not None:
+            stream = (self.llm | StrOutputParser()).astream(messages)
+            
+            def build_response(text: str) -> AgentResponse:
+                self.image_cache.put(image_hash, user_text, cv_issues, text)
+                return self._build_image_response(text, cv_issues)
+            
+            error_response = self._image_error_response
+        else:
+            stream = self.analysis_chain.astream({"input": self._format_text_analysis_input(user_text)})
+            photo_failed = image is not None
+            
+            def build_response(text: str) -> AgentResponse:
+                return self._build_text_response(text, photo_failed)
+            
+            error_response = self._text_error_response
         
-        cv_issues = detect_image_issues(enhanced_image)
+        chunks = []
+        try:
+            async for chunk in stream:
+                if chunk:
+                    chunks.append(chunk)
+                    yield chunk
+        except CircuitOpenError:
+            degraded = self._degraded_response(user_text, cv_issues)
+            yield degraded.message
+            yield degraded
+            return
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            yield error_response(e)
+            return
         
-        encoded_image = encode_image_for_openai(enhanced_image)
+        yield build_response("".join(chunks))
+    
+    def clear_memory(self, session_id: str):
+        """Clear the session's conversation memory for fresh analysis."""
+        self.memory.clear(session_id)
+    
+    def _analyze_with_image(self, user_text: str, image: ImageInput) -> AgentResponse:
+        """Analyze issue with image using LangChain Vision API."""
         
-        vision_prompt = self._format_image_analysis_input(user_text, cv_issues)
+        buffer = to_image_buffer(image)
+        image_hash = buffer.dhash()
+        
+        cached = self.image_cache.get(image_hash, user_text)
+        if cached:
+            return self._build_image_response(cached.analysis, cached.cv_issues)
+        
+        messages, cv_issues = self._prepare_vision_request(user_text, buffer)
         
         try:
-            messages = [
-                {
-                    "role": "system", 
-                    "content": ISSUE_DETECTION_SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": vision_prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{encoded_image}",
-                                "detail": "high"
-                            }
-                        }
-                    ]
-                }
-            ]
-            
             response = self.llm.invoke(messages)
             ai_analysis = response.content if hasattr(response, 'content') else str(response)
             
-            additional_notes = []
-            if cv_issues["darkness"]:
-                additional_notes.append("**Additional Note:** Image appears dark - better lighting recommended for accurate analysis.")
+            self.image_cache.put(image_hash, user_text, cv_issues, ai_analysis)
             
-            if cv_issues["blur"]:
-                additional_notes.append("**Additional Note:** Image appears blurry - clearer photos would help with diagnosis.")
+            return self._build_image_response(ai_analysis, cv_issues)
             
-            if additional_notes:
-                ai_analysis += "\n\n" + "\n\n".join(additional_notes)
+        except CircuitOpenError:
+            return self._degraded_response(user_text, cv_issues)
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            return self._image_error_response(e)
+    
+    async def _aanalyze_with_image(self, user_text: str, image: ImageInput) -> AgentResponse:
+        """Async variant of _analyze_with_image."""
+        
+        buffer = to_image_buffer(image)
+        image_hash = await asyncio.to_thread(buffer.dhash)
+        
+        cached = self.image_cache.get(image_hash, user_text)
+        if cached:
+            return self._build_image_response(cached.analysis, cached.cv_issues)
+        
+        try:
+            messages, cv_issues = await self._aprepare_vision_request(user_text, buffer)
+        except CV_FAILURES as e:
+            print(f"Image preprocessing failed, analyzing the description only: {e!r}")
+            return await self._aanalyze_text_only(user_text, photo_failed=True)
+        
+        try:
+            response = await self.llm.ainvoke(messages)
+            ai_analysis = response.content if hasattr(response, 'content') else str(response)
             
-            follow_ups = random.sample(ISSUE_DETECTION_FOLLOWUPS, 2)
+            self.image_cache.put(image_hash, user_text, cv_issues, ai_analysis)
             
-            return AgentResponse(
-                agent_type=AgentType.ISSUE_DETECTION,
-                message=ai_analysis,
-                confidence=0.85,
-                follow_up_questions=follow_ups
-            )
+            return self._build_image_response(ai_analysis, cv_issues)
             
+        except CircuitOpenError:
+            return self._degraded_response(user_text, cv_issues)
+        except LLMOverloadedError:
+            raise
         except Exception as e:
-            return AgentResponse(
-                agent_type=AgentType.ISSUE_DETECTION,
-                message=f"Error analyzing image: {str(e)}. Please try again or provide a text description.",
-                confidence=0.3,
-                follow_up_questions=["Could you describe the issue in more detail?"]
-            )
+            return self._image_error_response(e)
+    
+    def _prepare_vision_request(self, user_text: str, image: ImageInput) -> tuple[List[Dict[str, Any]], Dict[str, bool]]:
+        """Run the CV preprocessing inline and build the vision chat messages."""
+        
+        cv_issues, encoded_image = analyze_image(image)
+        
+        return self._build_vision_messages(user_text, cv_issues, encoded_image), cv_issues
+    
+    async def _aprepare_vision_request(self, user_text: str, image: ImageInput) -> tuple[List[Dict[str, Any]], Dict[str, bool]]:
+        """Run the CV preprocessing on the worker pool and build the vision chat messages."""
+        
+        cv_issues, encoded_image = await analyze_image_async(image)
+        
+        return self._build_vision_messages(user_text, cv_issues, encoded_image), cv_issues
+    
+    def _build_vision_messages(self, user_text: str, cv_issues: Dict[str, bool], encoded_image: str) -> List[Dict[str, Any]]:
+        """Build the vision chat messages from the CV results and the encoded image."""
+        
+        vision_prompt = self._format_image_analysis_input(user_text, cv_issues)
+        
+        record_image_tokens("issue_detection", estimate_image_tokens(*encoded_image_size(encoded_image), detail="high"))
+        
+        messages = [
+            {
+                "role": "system", 
+                "content": ISSUE_DETECTION_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": vision_prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{encoded_image}",
+                            "detail": "high"
+                        }
+                    }
+                ]
+            }
+        ]
+        
+        return messages
+    
+    def _build_image_response(self, ai_analysis: str, cv_issues: Dict[str, bool]) -> AgentResponse:
+        """Attach CV quality notes and follow-ups to the vision model's analysis."""
+        
+        additional_notes = []
+        if cv_issues["darkness"]:
+            additional_notes.append("**Additional Note:** Image appears dark - better lighting recommended for accurate analysis.")
+        
+        if cv_issues["blur"]:
+            additional_notes.append("**Additional Note:** Image appears blurry - clearer photos would help with diagnosis.")
+        
+        if additional_notes:
+            ai_analysis += "\n\n" + "\n\n".join(additional_notes)
+        
+        follow_ups = random.sample(ISSUE_DETECTION_FOLLOWUPS, 2)
+        
+        return AgentResponse(
+            agent_type=AgentType.ISSUE_DETECTION,
+            message=ai_analysis,
+            confidence=0.85,
+            follow_up_questions=follow_ups
+        )
+    
+    def _image_error_response(self, error: Exception) -> AgentResponse:
+        """Response returned when the vision call fails."""
+        return AgentResponse(
+            agent_type=AgentType.ISSUE_DETECTION,
+            message=f"Error analyzing image: {str(error)}. Please try again or provide a text description.",
+            confidence=0.3,
+            follow_up_questions=["Could you describe the issue in more detail?"]
+        )
     
     def _analyze_text_only(self, user_text: str) -> AgentResponse:
         """Analyze issue using only text with LangChain."""
         
-        analysis_input = f"""User describes this property issue: {user_text}
-
-Please provide detailed analysis and recommendations based on the description. 
-Note: No image was provided, so ask for more details if needed for accurate diagnosis."""
-        
         try:
-            ai_analysis = self.analysis_chain.invoke({"input": analysis_input})
+            ai_analysis = self.analysis_chain.invoke({"input": self._format_text_analysis_input(user_text)})
             
-            ai_analysis += "\n\n**💡 Tip:** For more accurate diagnosis, consider uploading a photo of the issue."
+            return self._build_text_response(ai_analysis)
             
-            follow_ups = random.sample(ISSUE_DETECTION_FOLLOWUPS, 3)
+        except CircuitOpenError:
+            return self._degraded_response(user_text)
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            return self._text_error_response(e)
+    
+    async def _aanalyze_text_only(self, user_text: str, photo_failed: bool = False) -> AgentResponse:
+        """Async variant of _analyze_text_only; photo_failed when an uploaded photo could not be preprocessed."""
+        
+        try:
+            ai_analysis = await self.analysis_chain.ainvoke({"input": self._format_text_analysis_input(user_text)})
             
-            return AgentResponse(
-                agent_type=AgentType.ISSUE_DETECTION,
-                message=ai_analysis,
-                confidence=0.65,  # Lower confidence without image
-                follow_up_questions=follow_ups
-            )
+            return self._build_text_response(ai_analysis, photo_failed)
             
+        except CircuitOpenError:
+            return self._degraded_response(user_text)
+        except LLMOverloadedError:
+            raise
         except Exception as e:
-            return AgentResponse(
-                agent_type=AgentType.ISSUE_DETECTION,
-                message=f"Error analyzing issue: {str(e)}. Please provide more details about the problem.",
-                confidence=0.3,
-                follow_up_questions=["Can you describe the issue in more detail?"]
-            )
+            return self._text_error_response(e)
+    
+    def _format_text_analysis_input(self, user_text: str) -> str:
+        """Format input for text-only analysis."""
+        return f"""User describes this property issue: {user_text}
+
+Please provide detailed analysis and recommendations based on the description. 
+Note: No image was provided, so ask for more details if needed for accurate diagnosis."""
+    
+    def _build_text_response(self, ai_analysis: str, photo_failed: bool = False) -> AgentResponse:
+        """Attach the photo tip (or a note that the photo could not be analyzed) and follow-ups to a text-only analysis."""
+        
+        if photo_failed:
+            ai_analysis += "\n\n**💡 Note:** Your photo could not be analyzed this time, so this assessment is based on your description. Please try uploading it again."
+        else:
+            ai_analysis += "\n\n**💡 Tip:** For more accurate diagnosis, consider uploading a photo of the issue."
+        
+        follow_ups = random.sample(ISSUE_DETECTION_FOLLOWUPS, 3)
+        
+        return AgentResponse(
+            agent_type=AgentType.ISSUE_DETECTION,
+            message=ai_analysis,
+            confidence=0.65,  # Lower confidence without image
+            follow_up_questions=follow_ups
+        )
+    
+    def _text_error_response(self, error: Exception) -> AgentResponse:
+        """Response returned when the text analysis call fails."""
+        return AgentResponse(
+            agent_type=AgentType.ISSUE_DETECTION,
+            message=f"Error analyzing issue: {str(error)}. Please provide more details about the problem.",
+            confidence=0.3,
+            follow_up_questions=["Can you describe the issue in more detail?"]
+        )
+    
+    def _degraded_response(self, user_text: str, cv_issues: Optional[Dict[str, bool]] = None) -> AgentResponse:
+        """Keyword severity assessment plus canned guidance, given while the model's circuit breaker is open."""
+        DEGRADED_RESPONSES_TOTAL.labels("issue_detection").inc()
+        
+        indicators = ["visible crack"] if cv_issues and cv_issues.get("cracks_detected") else []
+        assessment = assess_issue_severity.invoke({
+            "issue_description": " ".join([user_text or ""] + indicators),
+            "visible_indicators": indicators
+        })
+        
+        lines = [
+            DEGRADED_ISSUE_NOTICE,
+            "",
+            f"**Severity:** {assessment['severity_level'].upper()} (priority {assessment['priority_score']}/10)",
+            f"**Recommended timeline:** {assessment['urgency_timeline'].replace('_', ' ')}"
+        ]
+        if indicators:
+            lines.append("**Seen in your photo:** crack-like lines")
+        # The first two actions repeat the severity and timeline
+        lines += ["", "**Recommended actions:**"] + [f"- {action}" for action in assessment["recommended_actions"][2:]]
+        lines += ["", DEGRADED_ISSUE_GUIDANCE]
+        
+        return AgentResponse(
+            agent_type=AgentType.ISSUE_DETECTION,
+            message="\n".join(lines),
+            confidence=0.4,
+            follow_up_questions=random.sample(ISSUE_DETECTION_FOLLOWUPS, 2),
+            recommendations=assessment["recommended_actions"]
+        )
     
     def _format_image_analysis_input(self, user_text: str, cv_issues: Dict[str, bool]) -> str:
         """Format input for image analysis using existing prompt template."""
@@ -292,7 +513,6 @@ Note: No image was provided, so ask for more details if needed for accurate diag
         
         return ISSUE_DETECTION_IMAGE_PROMPT.format(user_text=enhanced_user_text)
     
-    def add_to_memory(self, user_input: str, analysis_result: str):
-        """Add interaction to LangChain memory."""
-        self.memory.chat_memory.add_user_message(user_input)
-        self.memory.chat_memory.add_ai_message(analysis_result) 
\ No newline at end of file
+    def add_to_memory(self, session_id: str, user_input: str, analysis_result: str):
+        """Add interaction to the session's memory."""
+        self.memory.add_exchange(session_id, user_input, analysis_result) 
\ No newline at end of file
@@ -1,24 +1,29 @@
-from typing import TypedDict, Annotated, Optional, List, Dict, Any, Sequence
+from typing import TypedDict, Annotated, Optional, List, Dict, Any, AsyncIterator
 from typing_extensions import Literal
-from langgraph.graph import StateGraph, START, END
+from langgraph.graph import StateGraph
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
 from langchain_core.messages import (
     BaseMessage, 
     HumanMessage, 
-    AIMessage, 
-    SystemMessage,
-    ToolMessage
+    AIMessage
 )
-from langchain_core.tools import tool
-from PIL import Image
-import json
+from langchain_core.runnables import RunnableLambda
+import asyncio
+import os
 
 from models.schemas import AgentType, AgentResponse
 from agents.router import LangChainRouterAgent
 from agents.issue_agent import LangChainIssueDetectionAgent
 from agents.faq_agent import TenancyFAQAgent 
 from utils.prompts import EMERGENCY_RESPONSE
+from utils.session_store import SessionStore, create_session_store
+from utils.history_compactor import HistoryCompactor
+from utils.llm_clients import LLMClients, get_llm_clients
+from utils.llm_scheduler import LLMOverloadedError
+from utils.image_utils import ImageInput
+from utils.metrics import timed_node, ROUTED_TOTAL, EMERGENCY_TOTAL, ERRORS_TOTAL, SPECULATION_TOTAL, SPECULATION_WASTED_TOKENS
+from utils.usage import UsageTracker, track_usage
+from utils.speculation import SpeculativeRun, SpeculationStats
 
 
 class ConversationState(TypedDict):
@@ -27,7 +32,7 @@ class ConversationState(TypedDict):
     user_text: str
     user_location: Optional[str]
     has_image: bool
-    image_data: Optional[Image.Image]
+    image_data: Optional[ImageInput]
     current_agent: Optional[str]
     agent_response: Optional[str]
     confidence_score: float
@@ -35,6 +40,8 @@ class ConversationState(TypedDict):
     follow_up_questions: List[str]
     session_id: str
     conversation_history: List[Dict[str, Any]]
+    last_agent: Optional[str]
+    speculation: Optional[SpeculativeRun]
 
 
 class RealEstateWorkflow:
@@ -42,26 +49,54 @@ class RealEstateWorkflow:
     LangGraph-powered workflow orchestrating the multi-agent real estate system.
     """
     
-    def __init__(self, openai_api_key: str):
+    def __init__(
+        self,
+        openai_api_key: str,
+        session_store: Optional[SessionStore] = None,
+        llm_clients: Optional[LLMClients] = None
+    ):
         """Initialize the workflow with all agents."""
-        self.router_agent = LangChainRouterAgent(openai_api_key)
-        self.issue_agent = LangChainIssueDetectionAgent(openai_api_key)
-        self.faq_agent = TenancyFAQAgent(openai_api_key) 
+        self.session_store = session_store if session_store is not None else create_session_store()
+        self.llm_clients = llm_clients or get_llm_clients()
+        
+        if self.session_store.compactor is None and os.getenv("HISTORY_COMPACTION", "false").lower() == "true":
+            self.session_store.compactor = self._create_compactor(openai_api_key)
+        
+        self.router_agent = LangChainRouterAgent(openai_api_key, self.session_store, self.llm_clients)
+        self.issue_agent = LangChainIssueDetectionAgent(openai_api_key, self.session_store, self.llm_clients)
+        self.faq_agent = TenancyFAQAgent(openai_api_key, self.session_store, self.llm_clients)
+        
+        self.speculative_routing = os.getenv("SPECULATIVE_ROUTING", "false").lower() == "true"
+        self.speculation_stats = SpeculationStats()
         
         self.workflow = self._create_workflow()
         self.app = self.workflow.compile()
     
+    def _create_compactor(self, openai_api_key: str) -> HistoryCompactor:
+        """Create the history compactor, with a cheap model for rolling summaries if any agent's prompt carries history."""
+        compactor = HistoryCompactor(self.session_store)
+        if not compactor.token_budgets:
+            return compactor
+        compactor.llm = self.llm_clients.chat_model(
+            "summarizer",
+            model=os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini"),
+            temperature=0,
+            max_tokens=compactor.summary_tokens,
+            api_key=openai_api_key
+        )
+        return compactor
+    
     def _create_workflow(self) -> StateGraph:
         """Create the LangGraph workflow definition."""
         
         workflow = StateGraph(ConversationState)
         
-        workflow.add_node("route_request", self._route_request)
-        workflow.add_node("handle_emergency", self._handle_emergency)
-        workflow.add_node("issue_detection", self._handle_issue_detection)
-        workflow.add_node("tenancy_faq", self._handle_tenancy_faq)
-        workflow.add_node("router_clarification", self._handle_router_clarification)
-        workflow.add_node("finalize_response", self._finalize_response)
+        workflow.add_node("route_request", self._timed_node("route_request", self._route_request, self._aroute_request))
+        workflow.add_node("handle_emergency", self._timed_node("handle_emergency", self._handle_emergency))
+        workflow.add_node("issue_detection", self._timed_node("issue_detection", self._handle_issue_detection, self._ahandle_issue_detection))
+        workflow.add_node("tenancy_faq", self._timed_node("tenancy_faq", self._handle_tenancy_faq, self._ahandle_tenancy_faq))
+        workflow.add_node("router_clarification", self._timed_node("router_clarification", self._handle_router_clarification))
+        workflow.add_node("finalize_response", self._timed_node("finalize_response", self._finalize_response, self._afinalize_response))
         
         workflow.set_entry_point("route_request")
         
@@ -85,20 +120,107 @@ class RealEstateWorkflow:
         
         return workflow
     
+    def _timed_node(self, name: str, func, afunc=None):
+        """Wrap a node's sync and optional async implementation with latency metrics."""
+        if afunc is None:
+            return timed_node(name, func)
+        return RunnableLambda(timed_node(name, func), afunc=timed_node(name, afunc))
+    
     def _route_request(self, state: ConversationState) -> ConversationState:
         """Route the incoming request to appropriate agent."""
         
-        agent_type, message, is_emergency = self.router_agent.route_request(
+        routing = self.router_agent.route_request(
+            user_text=state["user_text"],
+            has_image=state["has_image"],
+            location=state["user_location"],
+            conversation_history=state["conversation_history"],
+            last_agent=state["last_agent"]
+        )
+        
+        return self._apply_routing(state, *routing)
+    
+    async def _aroute_request(self, state: ConversationState) -> ConversationState:
+        """Async variant of _route_request, optionally starting the predicted specialist alongside the router."""
+        
+        speculation = self._start_speculation(state) if self.speculative_routing else None
+        
+        try:
+            routing = await self._arun_router(state)
+        except BaseException:
+            if speculation is not None:
+                speculation.cancel()
+            raise
+        
+        state = self._apply_routing(state, *routing)
+        
+        if speculation is not None:
+            state = self._settle_speculation(state, speculation)
+        
+        return state
+    
+    async def _arun_router(self, state: ConversationState) -> tuple[AgentType, str, bool]:
+        """Ask the router agent for its decision without blocking the event loop."""
+        
+        return await self.router_agent.aroute_request(
             user_text=state["user_text"],
             has_image=state["has_image"],
             location=state["user_location"],
-            conversation_history=state["conversation_history"]
+            conversation_history=state["conversation_history"],
+            last_agent=state["last_agent"]
+        )
+    
+    def _start_speculation(self, state: ConversationState) -> Optional[SpeculativeRun]:
+        """Start the specialist the router will most likely pick, if the router is going to call the LLM."""
+        
+        predicted = self.router_agent.predict_specialist(
+            user_text=state["user_text"],
+            has_image=state["has_image"],
+            conversation_history=state["conversation_history"],
+            last_agent=state["last_agent"]
         )
         
+        if predicted == AgentType.TENANCY_FAQ:
+            call = self.faq_agent.aanswer_tenancy_question(
+                question=state["user_text"],
+                location=state["user_location"]
+            )
+        elif predicted == AgentType.ISSUE_DETECTION:
+            call = self.issue_agent.aanalyze_issue(
+                user_text=state["user_text"],
+                image=state["image_data"]
+            )
+        else:
+            return None
+        
+        return SpeculativeRun(predicted.value, call)
+    
+    def _settle_speculation(self, state: ConversationState, speculation: SpeculativeRun) -> ConversationState:
+        """Keep the speculative call for the specialist node if the router agreed, cancel it otherwise."""
+        
+        if not state["is_emergency"] and state["current_agent"] == speculation.agent:
+            SPECULATION_TOTAL.labels(speculation.agent, "hit").inc()
+            self.speculation_stats.record_hit(speculation.agent)
+            state["speculation"] = speculation
+            return state
+        
+        wasted_tokens = speculation.cancel()
+        SPECULATION_TOTAL.labels(speculation.agent, "miss").inc()
+        SPECULATION_WASTED_TOKENS.labels(speculation.agent).inc(wasted_tokens)
+        self.speculation_stats.record_miss(speculation.agent, wasted_tokens)
+        
+        return state
+    
+    def _apply_routing(self, state: ConversationState, agent_type: AgentType, message: str, is_emergency: bool) -> ConversationState:
+        """Store the router's decision on the state."""
+        
         state["current_agent"] = agent_type.value if hasattr(agent_type, 'value') else str(agent_type)
         state["is_emergency"] = is_emergency
         state["agent_response"] = message
         
+        ROUTED_TOTAL.labels(state["current_agent"]).inc()
+        if is_emergency:
+            EMERGENCY_TOTAL.inc()
+        
         if message: 
             state["messages"].append(AIMessage(content=f"[Router] {message}"))
         
@@ -139,21 +261,55 @@ class RealEstateWorkflow:
                 user_text=state["user_text"],
                 image=state["image_data"]
             )
-            
-            state["agent_response"] = response.message
-            state["confidence_score"] = response.confidence
-            state["follow_up_questions"] = response.follow_up_questions or []
-            
-            self.issue_agent.add_to_memory(state["user_text"], response.message)
-            
-            state["messages"].append(AIMessage(content=f"[Issue Detection] {response.message}"))
-            
+        except LLMOverloadedError:
+            raise
         except Exception as e:
-            state["agent_response"] = f"Error analyzing property issue: {str(e)}"
-            state["confidence_score"] = 0.3
-            state["follow_up_questions"] = ["Could you provide more details about the issue?"]
-            
-            state["messages"].append(AIMessage(content=f"[Issue Detection Error] {state['agent_response']}"))
+            return self._apply_issue_error(state, e)
+        
+        return self._apply_issue_response(state, response)
+    
+    async def _ahandle_issue_detection(self, state: ConversationState) -> ConversationState:
+        """Async variant of _handle_issue_detection."""
+        
+        try:
+            if state.get("speculation") is not None:
+                response = await state["speculation"].result()
+            else:
+                response = await self.issue_agent.aanalyze_issue(
+                    user_text=state["user_text"],
+                    image=state["image_data"]
+                )
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            return self._apply_issue_error(state, e)
+        
+        # Memory writes share the session store's lock with its flusher, so keep them off the event loop
+        return await asyncio.to_thread(self._apply_issue_response, state, response)
+    
+    def _apply_issue_response(self, state: ConversationState, response: AgentResponse) -> ConversationState:
+        """Store the issue agent's analysis on the state."""
+        
+        state["agent_response"] = response.message
+        state["confidence_score"] = response.confidence
+        state["follow_up_questions"] = response.follow_up_questions or []
+        
+        self.issue_agent.add_to_memory(state["session_id"], state["user_text"], response.message)
+        
+        state["messages"].append(AIMessage(content=f"[Issue Detection] {response.message}"))
+        
+        return state
+    
+    def _apply_issue_error(self, state: ConversationState, error: Exception) -> ConversationState:
+        """Store a fallback response when issue analysis fails."""
+        
+        ERRORS_TOTAL.labels("issue_detection").inc()
+        
+        state["agent_response"] = f"Error analyzing property issue: {str(error)}"
+        state["confidence_score"] = 0.3
+        state["follow_up_questions"] = ["Could you provide more details about the issue?"]
+        
+        state["messages"].append(AIMessage(content=f"[Issue Detection Error] {state['agent_response']}"))
         
         return state
     
@@ -165,19 +321,54 @@ class RealEstateWorkflow:
                 question=state["user_text"],
                 location=state["user_location"]
             )
-            
-            state["agent_response"] = response.message
-            state["confidence_score"] = response.confidence
-            state["follow_up_questions"] = response.follow_up_questions or []
-            
-            state["messages"].append(AIMessage(content=f"[Tenancy FAQ] {response.message}"))
-            
+        except LLMOverloadedError:
+            raise
         except Exception as e:
-            state["agent_response"] = f"Error answering tenancy question: {str(e)}"
-            state["confidence_score"] = 0.3
-            state["follow_up_questions"] = ["Could you rephrase your question?"]
-            
-            state["messages"].append(AIMessage(content=f"[Tenancy FAQ Error] {state['agent_response']}"))
+            return self._apply_faq_error(state, e)
+        
+        return self._apply_faq_response(state, response)
+    
+    async def _ahandle_tenancy_faq(self, state: ConversationState) -> ConversationState:
+        """Async variant of _handle_tenancy_faq."""
+        
+        try:
+            if state.get("speculation") is not None:
+                response = await state["speculation"].result()
+            else:
+                response = await self.faq_agent.aanswer_tenancy_question(
+                    question=state["user_text"],
+                    location=state["user_location"]
+                )
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            return self._apply_faq_error(state, e)
+        
+        return await asyncio.to_thread(self._apply_faq_response, state, response)
+    
+    def _apply_faq_response(self, state: ConversationState, response: AgentResponse) -> ConversationState:
+        """Store the FAQ agent's answer on the state."""
+        
+        state["agent_response"] = response.message
+        state["confidence_score"] = response.confidence
+        state["follow_up_questions"] = response.follow_up_questions or []
+        
+        self.faq_agent.add_to_memory(state["session_id"], state["user_text"], response.message)
+        
+        state["messages"].append(AIMessage(content=f"[Tenancy FAQ] {response.message}"))
+        
+        return state
+    
+    def _apply_faq_error(self, state: ConversationState, error: Exception) -> ConversationState:
+        """Store a fallback response when the FAQ agent fails."""
+        
+        ERRORS_TOTAL.labels("tenancy_faq").inc()
+        
+        state["agent_response"] = f"Error answering tenancy question: {str(error)}"
+        state["confidence_score"] = 0.3
+        state["follow_up_questions"] = ["Could you rephrase your question?"]
+        
+        state["messages"].append(AIMessage(content=f"[Tenancy FAQ Error] {state['agent_response']}"))
         
         return state
     
@@ -197,6 +388,7 @@ class RealEstateWorkflow:
         
         if hasattr(self.router_agent, 'add_to_memory'):
             self.router_agent.add_to_memory(
+                session_id=state["session_id"],
                 user_message=state["user_text"],
                 agent_response=state["agent_response"],
                 agent_type=state["current_agent"]
@@ -206,13 +398,25 @@ class RealEstateWorkflow:
             state["agent_response"] = "I encountered an issue processing your request. Please try again."
             state["confidence_score"] = 0.1
         
+        self.session_store.append_turn(
+            session_id=state["session_id"],
+            user_message=state["user_text"],
+            agent_response=state["agent_response"],
+            agent_type=state["current_agent"]
+        )
+        
         return state
     
+    async def _afinalize_response(self, state: ConversationState) -> ConversationState:
+        """Async variant of _finalize_response, run on a worker thread since it writes to the session store."""
+        
+        return await asyncio.to_thread(self._finalize_response, state)
+    
     def process_request(
         self,
         user_text: str,
         session_id: str,
-        image: Optional[Image.Image] = None,
+        image: Optional[ImageInput] = None,
         location: Optional[str] = None,
         conversation_history: Optional[List[Dict]] = None
     ) -> Dict[str, Any]:
@@ -224,13 +428,139 @@ class RealEstateWorkflow:
             session_id: Session identifier
             image: Optional image for analysis
             location: User's location
-            conversation_history: Previous conversation messages
+            conversation_history: Previous conversation messages, only needed when the
+                session is not yet known to the server-side session store
             
         Returns:
             Complete response with agent analysis
         """
         
-        initial_state = ConversationState(
+        initial_state = self._build_initial_state(user_text, session_id, image, location, conversation_history)
+        
+        with track_usage() as usage:
+            final_state = self.app.invoke(initial_state)
+        
+        return self._build_result(final_state, session_id, usage)
+    
+    async def process_request_async(
+        self,
+        user_text: str,
+        session_id: str,
+        image: Optional[ImageInput] = None,
+        location: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> Dict[str, Any]:
+        """
+        Process a user request through the LangGraph workflow without blocking the event loop.
+        
+        Args:
+            user_text: User's message
+            session_id: Session identifier
+            image: Optional image for analysis
+            location: User's location
+            conversation_history: Previous conversation messages, only needed when the
+                session is not yet known to the server-side session store
+            
+        Returns:
+            Complete response with agent analysis
+        """
+        
+        initial_state = await asyncio.to_thread(self._build_initial_state, user_text, session_id, image, location, conversation_history)
+        
+        with track_usage() as usage:
+            final_state = await self.app.ainvoke(initial_state)
+        
+        return await asyncio.to_thread(self._build_result, final_state, session_id, usage)
+    
+    async def stream_request(
+        self,
+        user_text: str,
+        session_id: str,
+        image: Optional[ImageInput] = None,
+        location: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user request and stream progress events as they happen.
+        
+        Runs the same steps as the LangGraph workflow, but streams the specialist
+        agent's answer token by token instead of waiting for the full completion.
+        
+        Args:
+            user_text: User's message
+            session_id: Session identifier
+            image: Optional image for analysis
+            location: User's location
+            conversation_history: Previous conversation messages, only needed when the
+                session is not yet known to the server-side session store
+            
+        Yields:
+            Events of the form {"event": ..., "data": {...}}: one "route" event with the
+            router decision, one "agent" event with the chosen node, "token" events with
+            answer text, and a closing "final" event with the complete result
+        """
+        
+        with track_usage() as usage:
+            state = await asyncio.to_thread(self._build_initial_state, user_text, session_id, image, location, conversation_history)
+            # No speculation here: a speculative call returns the whole answer, which would delay the first token
+            state = self._apply_routing(state, *await self._arun_router(state))
+            
+            yield {
+                "event": "route",
+                "data": {
+                    "agent_type": state["current_agent"],
+                    "is_emergency": state["is_emergency"],
+                    "message": state["agent_response"]
+                }
+            }
+            
+            next_step = self._determine_next_step(state)
+            yield {"event": "agent", "data": {"agent_type": state["current_agent"], "node": next_step}}
+            
+            if next_step == "issue_detection":
+                stream = self.issue_agent.astream_issue(user_text=user_text, image=image)
+                apply_response = self._apply_issue_response
+            elif next_step == "tenancy_faq":
+                stream = self.faq_agent.astream_tenancy_answer(question=user_text, location=location)
+                apply_response = self._apply_faq_response
+            else:
+                stream = None
+            
+            if stream is None:
+                if next_step == "emergency":
+                    state = self._handle_emergency(state)
+                else:
+                    state = self._handle_router_clarification(state)
+                if state["agent_response"]:
+                    yield {"event": "token", "data": {"text": state["agent_response"]}}
+            else:
+                streamed = ""
+                async for item in stream:
+                    if isinstance(item, AgentResponse):
+                        state = await asyncio.to_thread(apply_response, state, item)
+                        if item.message.startswith(streamed):
+                            remainder = item.message[len(streamed):]
+                            if remainder:
+                                yield {"event": "token", "data": {"text": remainder}}
+                    else:
+                        streamed += item
+                        yield {"event": "token", "data": {"text": item}}
+            
+            state = await asyncio.to_thread(self._finalize_response, state)
+            
+            yield {"event": "final", "data": await asyncio.to_thread(self._build_result, state, session_id, usage)}
+    
+    def _build_initial_state(
+        self,
+        user_text: str,
+        session_id: str,
+        image: Optional[ImageInput],
+        location: Optional[str],
+        conversation_history: Optional[List[Dict]]
+    ) -> ConversationState:
+        """Build the initial graph state for a request."""
+        
+        return ConversationState(
             messages=[HumanMessage(content=user_text)],
             user_text=user_text,
             user_location=location,
@@ -242,12 +572,23 @@ class RealEstateWorkflow:
             is_emergency=False,
             follow_up_questions=[],
             session_id=session_id,
-            conversation_history=conversation_history or []
+            conversation_history=conversation_history or [],
+            last_agent=self.session_store.get_last_agent(session_id),
+            speculation=None
         )
+    
+    def _build_result(self, final_state: ConversationState, session_id: str, usage: Optional[UsageTracker] = None) -> Dict[str, Any]:
+        """Convert the final graph state into the API result payload, with this turn's and the session's token usage."""
+        
+        session_usage = self.session_store.add_usage(session_id, usage) if usage else None
         
-        final_state = self.app.invoke(initial_state)
+        # Commit the turn's session writes before answering, so whichever worker gets the next turn sees them.
+        # This can wait on SQLite's write lock, so async callers run this method on a worker thread.
+        self.session_store.flush()
         
         return {
+            "usage": usage.to_dict() if usage else None,
+            "session_usage": session_usage,
             "agent_type": final_state["current_agent"],
             "message": final_state["agent_response"],
             "confidence": final_state["confidence_score"],
@@ -262,4 +603,4 @@ class RealEstateWorkflow:
                 }
                 for msg in final_state["messages"]
             ]
-        } 
\ No newline at end of file
+        }
@@ -3,14 +3,23 @@ LangChain-based router agent for intelligent request routing.
 """
 
 from typing import Optional, List, Dict, Any
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain.memory import ConversationBufferWindowMemory
 from langchain.schema import BaseMessage, HumanMessage, AIMessage
 
 from models.schemas import AgentType
-from utils.prompts import ROUTER_SYSTEM_PROMPT, EMERGENCY_KEYWORDS, EMERGENCY_RESPONSE
+from utils.prompts import ROUTER_SYSTEM_PROMPT, EMERGENCY_RESPONSE
+from utils.keyword_matcher import match_keywords
+from utils.session_store import SessionStore
+from utils.llm_clients import LLMClients, get_llm_clients
+from utils.llm_scheduler import LLMOverloadedError, Lane, llm_lane
+from utils.circuit_breaker import CircuitOpenError
+from utils.metrics import FALLBACK_ROUTING_TOTAL, ERRORS_TOTAL, DEGRADED_RESPONSES_TOTAL
+from utils.text_features import routing_keyword_scores
+from utils.intent_classifier import RoutingStats, load_default_classifier, log_decision
+import asyncio
+import os
+import random
 import re
 
 
@@ -19,20 +28,22 @@ class LangChainRouterAgent:
     Intelligent routing agent with advanced memory management.
     """
     
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        openai_api_key: Optional[str] = None,
+        session_store: Optional[SessionStore] = None,
+        llm_clients: Optional[LLMClients] = None
+    ):
         """Initialize the LangChain router agent."""
-        self.llm = ChatOpenAI(
+        self.llm = (llm_clients or get_llm_clients()).chat_model(
+            "router",
             model="gpt-4",
             temperature=0.1,
             max_tokens=100,
             api_key=openai_api_key
         )
         
-        self.memory = ConversationBufferWindowMemory(
-            k=10,
-            return_messages=True,
-            memory_key="chat_history"
-        )
+        self.memory = (session_store if session_store is not None else SessionStore()).memory("router")
         
         self.router_prompt = ChatPromptTemplate.from_messages([
             ("system", ROUTER_SYSTEM_PROMPT),
@@ -44,13 +55,20 @@ class LangChainRouterAgent:
             | self.llm 
             | StrOutputParser()
         )
+        
+        self.classifier = load_default_classifier()
+        self.local_threshold = float(os.getenv("ROUTER_LOCAL_THRESHOLD", "0.9"))
+        self.shadow_rate = float(os.getenv("ROUTER_SHADOW_RATE", "0.05"))
+        self.routing_stats = RoutingStats()
+        self._shadow_tasks = set()
     
     def route_request(
         self, 
         user_text: str, 
         has_image: bool = False, 
         location: Optional[str] = None, 
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        last_agent: Optional[str] = None
     ) -> tuple[AgentType, str, bool]:
         """
         Route request using LangChain with advanced context awareness.
@@ -59,40 +77,232 @@ class LangChainRouterAgent:
             user_text: User's input text
             has_image: Whether image is attached
             location: User's location
-            conversation_history: Previous conversation messages
+            conversation_history: Previous conversation messages, used when last_agent is not known
+            last_agent: Last active agent from the server-side session store
             
         Returns:
             Tuple of (agent_type, message, is_emergency)
         """
         
-        if self._detect_emergency(user_text):
-            return AgentType.ISSUE_DETECTION, EMERGENCY_RESPONSE, True
+        prerouted = self._preroute(user_text, has_image)
+        if prerouted:
+            return prerouted
         
-        if has_image:
-            return AgentType.ISSUE_DETECTION, "", False
+        routing_input = self._build_routing_input(user_text, has_image, location, conversation_history, last_agent)
         
-        last_agent = self._extract_last_agent(conversation_history)
+        local = self._classify_locally(routing_input)
+        if self._is_confident(local):
+            return self._accept_local_routing(routing_input, local)
         
         try:
-            routing_input = {
-                "user_text": user_text,
-                "location": location or "Not provided",
-                "has_image": str(has_image),
-                "last_agent": last_agent or "None"
-            }
-            
             router_response = self.router_chain.invoke(routing_input)
             
-            return self._parse_router_response(router_response)
+            return self._accept_llm_routing(routing_input, local, router_response)
+            
+        except CircuitOpenError:
+            return self._degraded_routing(user_text)
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            print(f"LangChain router error: {e}")
+            ERRORS_TOTAL.labels("router").inc()
+            return self._fallback_routing(user_text)
+    
+    async def aroute_request(
+        self, 
+        user_text: str, 
+        has_image: bool = False, 
+        location: Optional[str] = None, 
+        conversation_history: Optional[List[Dict]] = None,
+        last_agent: Optional[str] = None
+    ) -> tuple[AgentType, str, bool]:
+        """
+        Async variant of route_request that awaits the router chain without blocking the event loop.
+        
+        Args:
+            user_text: User's input text
+            has_image: Whether image is attached
+            location: User's location
+            conversation_history: Previous conversation messages, used when last_agent is not known
+            last_agent: Last active agent from the server-side session store
+            
+        Returns:
+            Tuple of (agent_type, message, is_emergency)
+        """
+        
+        prerouted = self._preroute(user_text, has_image)
+        if prerouted:
+            return prerouted
+        
+        routing_input = self._build_routing_input(user_text, has_image, location, conversation_history, last_agent)
+        
+        local = self._classify_locally(routing_input)
+        if self._is_confident(local):
+            if random.random() < self.shadow_rate:
+                task = asyncio.create_task(self._shadow_check(routing_input, local))
+                self._shadow_tasks.add(task)
+                task.add_done_callback(self._shadow_tasks.discard)
+            return self._accept_local_routing(routing_input, local)
+        
+        try:
+            router_response = await self.router_chain.ainvoke(routing_input)
+            
+            return self._accept_llm_routing(routing_input, local, router_response)
             
+        except CircuitOpenError:
+            return self._degraded_routing(user_text)
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             print(f"LangChain router error: {e}")
+            ERRORS_TOTAL.labels("router").inc()
             return self._fallback_routing(user_text)
     
+    def predict_specialist(
+        self,
+        user_text: str,
+        has_image: bool = False,
+        conversation_history: Optional[List[Dict]] = None,
+        last_agent: Optional[str] = None
+    ) -> Optional[AgentType]:
+        """
+        Guess the specialist the LLM router will pick, for starting it speculatively.
+
+        Only requests that will wait on the LLM router get a guess: emergencies,
+        images and confident local predictions are routed without it.
+
+        Args:
+            user_text: User's input text
+            has_image: Whether image is attached
+            conversation_history: Previous conversation messages, used when last_agent is not known
+            last_agent: Last active agent from the server-side session store
+
+        Returns:
+            The predicted agent type, or None when no guess is worth making
+        """
+
+        if self._preroute(user_text, has_image):
+            return None
+
+        routing_input = self._build_routing_input(user_text, has_image, None, conversation_history, last_agent)
+        if self._is_confident(self._classify_locally(routing_input)):
+            return None
+
+        # Follow-ups mostly stay with the previous agent; otherwise go by keyword scores
+        if routing_input["last_agent"] in (AgentType.ISSUE_DETECTION.value, AgentType.TENANCY_FAQ.value):
+            return AgentType(routing_input["last_agent"])
+
+        issue_score, tenancy_score = routing_keyword_scores(user_text)
+        if issue_score > tenancy_score:
+            return AgentType.ISSUE_DETECTION
+        elif tenancy_score > issue_score:
+            return AgentType.TENANCY_FAQ
+        return None
+
+    def is_emergency(self, user_text: str) -> bool:
+        """
+        Whether the message will be answered as an emergency, without an LLM call.
+
+        Args:
+            user_text: User's input text
+
+        Returns:
+            True if the message matches the emergency keywords
+        """
+        return self._detect_emergency(user_text)
+
+    def _preroute(self, user_text: str, has_image: bool) -> Optional[tuple[AgentType, str, bool]]:
+        """Resolve requests that never need the LLM router (emergencies and images)."""
+        if self._detect_emergency(user_text):
+            return AgentType.ISSUE_DETECTION, EMERGENCY_RESPONSE, True
+        
+        if has_image:
+            return AgentType.ISSUE_DETECTION, "", False
+        
+        return None
+    
+    def _build_routing_input(
+        self, 
+        user_text: str, 
+        has_image: bool, 
+        location: Optional[str], 
+        conversation_history: Optional[List[Dict]],
+        last_agent: Optional[str] = None
+    ) -> Dict[str, str]:
+        """Build the router prompt variables."""
+        if last_agent is None:
+            last_agent = self._extract_last_agent(conversation_history)
+        
+        return {
+            "user_text": user_text,
+            "location": location or "Not provided",
+            "has_image": str(has_image),
+            "last_agent": last_agent or "None"
+        }
+    
+    def _classify_locally(self, routing_input: Dict[str, str]) -> Optional[tuple[str, float]]:
+        """Run the local classifier, if one is loaded."""
+        if self.classifier is None:
+            return None
+        
+        try:
+            return self.classifier.predict(routing_input["user_text"], routing_input["last_agent"])
+        except Exception as e:
+            print(f"Local router classifier error: {e}")
+            return None
+    
+    def _is_confident(self, local: Optional[tuple[str, float]]) -> bool:
+        """Whether a local prediction may skip the LLM router. Clarifications always go to the LLM."""
+        return bool(local) and local[0] != "CLARIFY" and local[1] >= self.local_threshold
+    
+    def _accept_local_routing(self, routing_input: Dict[str, str], local: tuple[str, float]) -> tuple[AgentType, str, bool]:
+        """Route using a confident local prediction."""
+        self.routing_stats.record_local_hit()
+        log_decision(routing_input["user_text"], routing_input["last_agent"], local[0], "local")
+        return self._parse_router_response(local[0])
+    
+    def _accept_llm_routing(
+        self, 
+        routing_input: Dict[str, str], 
+        local: Optional[tuple[str, float]], 
+        router_response: str
+    ) -> tuple[AgentType, str, bool]:
+        """Route using the LLM's answer and record it for agreement metrics and training."""
+        routing = self._parse_router_response(router_response)
+        label = self._routing_label(routing[0])
+        
+        self.routing_stats.record_llm_call(local, label)
+        log_decision(routing_input["user_text"], routing_input["last_agent"], label, "llm")
+        
+        return routing
+    
+    async def _shadow_check(self, routing_input: Dict[str, str], local: tuple[str, float]):
+        """Ask the LLM about a locally routed request in the background to measure agreement."""
+        try:
+            # Agreement checks must never hold up user-facing calls
+            with llm_lane(Lane.BACKGROUND):
+                router_response = await self.router_chain.ainvoke(routing_input)
+        except CircuitOpenError:
+            return
+        except Exception as e:
+            print(f"LangChain router shadow check error: {e}")
+            return
+        
+        label = self._routing_label(self._parse_router_response(router_response)[0])
+        self.routing_stats.record_shadow(local, label)
+        log_decision(routing_input["user_text"], routing_input["last_agent"], label, "llm")
+    
+    def _routing_label(self, agent_type: AgentType) -> str:
+        """Map a routed agent type back to the router's output label."""
+        if agent_type == AgentType.ISSUE_DETECTION:
+            return "ISSUE_DETECTION"
+        elif agent_type == AgentType.TENANCY_FAQ:
+            return "TENANCY_FAQ"
+        return "CLARIFY"
+    
     def _detect_emergency(self, text: str) -> bool:
         """Fast keyword-based emergency detection."""
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in EMERGENCY_KEYWORDS)
+        return "emergency" in match_keywords(text)
     
     def _extract_last_agent(self, conversation_history: Optional[List[Dict]]) -> Optional[str]:
         """Extract the last active agent from conversation history."""
@@ -127,20 +337,17 @@ class LangChainRouterAgent:
     
     def _fallback_routing(self, text: str) -> tuple[AgentType, str, bool]:
         """Keyword-based fallback routing when LangChain fails."""
-        text_lower = text.lower()
-        
-        issue_keywords = [
-            "damage", "broken", "leak", "crack", "mold", "water", "repair",
-            "fix", "maintenance", "issue", "problem", "wall", "ceiling"
-        ]
-        
-        tenancy_keywords = [
-            "landlord", "tenant", "rent", "lease", "eviction", "deposit",
-            "notice", "agreement", "legal", "rights", "law"
-        ]
-        
-        issue_score = sum(1 for keyword in issue_keywords if keyword in text_lower)
-        tenancy_score = sum(1 for keyword in tenancy_keywords if keyword in text_lower)
+        FALLBACK_ROUTING_TOTAL.inc()
+        return self._keyword_routing(text)
+    
+    def _degraded_routing(self, text: str) -> tuple[AgentType, str, bool]:
+        """Keyword routing without waiting on the LLM while the router's circuit breaker is open."""
+        DEGRADED_RESPONSES_TOTAL.labels("router").inc()
+        return self._keyword_routing(text)
+    
+    def _keyword_routing(self, text: str) -> tuple[AgentType, str, bool]:
+        """Route by keyword scores alone, asking the user to clarify on a tie."""
+        issue_score, tenancy_score = routing_keyword_scores(text)
         
         if issue_score > tenancy_score:
             return AgentType.ISSUE_DETECTION, "", False
@@ -149,11 +356,10 @@ class LangChainRouterAgent:
         else:
             return AgentType.ROUTER, "Please clarify: is this about property damage or tenancy law?", False
     
-    def add_to_memory(self, user_message: str, agent_response: str, agent_type: str):
-        """Add conversation to LangChain memory."""
-        self.memory.chat_memory.add_user_message(user_message)
-        self.memory.chat_memory.add_ai_message(f"[{agent_type}] {agent_response}")
+    def add_to_memory(self, session_id: str, user_message: str, agent_response: str, agent_type: str):
+        """Add conversation to the session's router memory."""
+        self.memory.add_exchange(session_id, user_message, f"[{agent_type}] {agent_response}")
     
-    def get_memory_context(self) -> List[BaseMessage]:
-        """Get conversation history from LangChain memory."""
-        return self.memory.chat_memory.messages 
\ No newline at end of file
+    def get_memory_context(self, session_id: str) -> List[BaseMessage]:
+        """Get conversation history from the session's router memory."""
+        return self.memory.messages(session_id) 
\ No newline at end of file
@@ -0,0 +1 @@
+# Benchmarks for the multi-agent real estate chatbot backend 
\ No newline at end of file
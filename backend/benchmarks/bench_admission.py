@@ -0,0 +1,131 @@
+"""
+Benchmark: LLM admission control while the upstream is overloaded.
+
+The offline OpenAI stub runs with --capacity, so beyond that many requests
+in flight every call slows down proportionally, like an overloaded API.
+Tenancy questions arrive at a fixed rate well above what it can serve, and
+every tenth message reports an emergency. Each run goes through the real
+/api/chat endpoint in-process, once without and once with the scheduler.
+
+Without admission control, calls pile up at the upstream and latency keeps
+growing for everyone. With it, the concurrency limit backs off, excess
+requests get a fast 503 with Retry-After, and emergencies never wait.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_admission --rate 10 --duration 15
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.load_test import wait_until_ready
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+async def offer_load(app, rate: float, duration: float) -> list:
+    """Send requests open-loop at a fixed rate; return (kind, status, seconds, answer ok) per request."""
+    async def one(client: httpx.AsyncClient, number: int) -> tuple:
+        emergency = number % 10 == 0
+        message = (
+            f"There is a gas leak in the hallway outside unit {number}!" if emergency
+            else f"My landlord wants to raise the rent on unit {number} by 15 percent, is that allowed?"
+        )
+        start = time.perf_counter()
+        response = await client.post("/api/chat", data={"message": message, "location": "Toronto, Ontario"})
+        elapsed = time.perf_counter() - start
+        ok = response.status_code == 200 and not response.json()["message"].startswith("Error")
+        return ("emergency" if emergency else "question", response.status_code, elapsed, ok)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        tasks = []
+        for number in range(int(rate * duration)):
+            tasks.append(asyncio.create_task(one(client, number)))
+            await asyncio.sleep(1 / rate)
+        return await asyncio.gather(*tasks)
+
+
+def report(name: str, results: list, scheduler_stats: dict, stub_stats: dict):
+    questions = [result for result in results if result[0] == "question"]
+    served = [seconds for _, status, seconds, ok in questions if ok]
+    rejected = [seconds for _, status, seconds, _ in questions if status == 503]
+    emergencies = [seconds for kind, status, seconds, ok in results if kind == "emergency" and ok]
+
+    print(f"\n{name}")
+    print(f"  questions answered: {len(served)}/{len(questions)}, p50 {percentile(served, 0.5):.2f}s, p95 {percentile(served, 0.95):.2f}s, max {max(served, default=0):.2f}s")
+    print(f"  rejected with 503:  {len(rejected)}, p50 {percentile(rejected, 0.5) * 1000:.0f} ms")
+    print(f"  emergencies:        {len(emergencies)} answered, max {max(emergencies, default=0) * 1000:.0f} ms")
+    print(f"  upstream peak in flight: {stub_stats['peak_in_flight']}")
+    if scheduler_stats.get("enabled"):
+        print(f"  final limit {scheduler_stats['limit']}, decreases {scheduler_stats['limit_decreases']}, increases {scheduler_stats['limit_increases']}, rejected {scheduler_stats['rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=float, default=10, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds of offered load per run")
+    parser.add_argument("--capacity", type=int, default=6, help="Upstream requests in flight before the stub slows down")
+    parser.add_argument("--stub-port", type=int, default=9170)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LLM_QUEUE_MAX", "32")
+    os.environ.setdefault("LLM_QUEUE_TIMEOUT_SECONDS", "3")
+    # Distinct questions only; keep the answer cache out of the measurement
+    os.environ["FAQ_CACHE_ENABLED"] = "false"
+    os.environ["CV_WARMUP"] = "false"
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    processes = []
+    try:
+        for scheduler in ("false", "true"):
+            # A fresh stub per run, so its in-flight peak belongs to this run
+            processes.append(subprocess.Popen([
+                sys.executable, "-m", "benchmarks.openai_stub",
+                "--port", str(args.stub_port),
+                "--router-latency", "fixed:0.3",
+                "--text-latency", "fixed:1.0",
+                "--capacity", str(args.capacity)
+            ]))
+            wait_until_ready(f"{stub_url}/v1/models")
+            os.environ["OPENAI_API_KEY"] = "sk-bench"
+            os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"{stub_url}/v1"
+            os.environ["LLM_SCHEDULER"] = scheduler
+
+            import main as api
+            from agents.langgraph_workflow import RealEstateWorkflow
+            from utils.llm_clients import LLMClients
+            from utils.session_store import SessionStore
+
+            clients = LLMClients()
+            api.workflow = RealEstateWorkflow("sk-bench", SessionStore(), clients)
+
+            # The service ran normally before the surge: a few calls at low load set the baselines
+            asyncio.run(offer_load(api.app, 1, 4))
+            results = asyncio.run(offer_load(api.app, args.rate, args.duration))
+            report(
+                f"admission control {'on' if scheduler == 'true' else 'off'} ({args.rate:g} req/s for {args.duration:g}s, upstream capacity {args.capacity})",
+                results,
+                clients.stats()["scheduler"],
+                httpx.get(f"{stub_url}/stats").json()
+            )
+
+            processes.pop().terminate()
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: circuit breakers during an upstream outage.
+
+Tenants keep asking questions at a steady rate while the offline OpenAI
+stub goes through three phases: normal service, an outage in which every
+call hangs until the client times out, and recovery. Each run goes through
+the workflow, once without and once with circuit breakers, and reports
+latency per phase, how many answers were degraded or refused with 503 by
+admission control, and how long after the outage ended the breakers closed
+again.
+
+Read timeouts are shortened and retries disabled so the run stays short;
+with the production timeouts (15 s router, 45 s FAQ, plus retries) the
+difference is proportionally larger.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_circuit_breaker --rate 2
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.load_test import wait_until_ready
+from utils.llm_scheduler import LLMOverloadedError
+
+
+PHASES = (("normal", None), ("outage", "hang"), ("recovery", None))
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+async def run_phase(workflow, stub_url: str, mode, rate: float, duration: float, clients) -> dict:
+    """Send questions open-loop for one phase; return latencies, degraded answers and when breakers closed."""
+    async with httpx.AsyncClient() as http:
+        await http.post(f"{stub_url}/outage", json={"mode": mode})
+
+    start = time.perf_counter()
+    closed_after = None
+
+    async def one(number: int) -> tuple:
+        began = time.perf_counter()
+        try:
+            result = await workflow.process_request_async(
+                f"Can my landlord keep my deposit for carpet cleaning after {number + 2} years?",
+                str(uuid.uuid4()),
+                location="Toronto, Ontario"
+            )
+            outcome = "degraded" if "temporarily unavailable" in result["message"] else "answered"
+        except LLMOverloadedError:
+            # The API would answer 503; admission control backs off when calls fail
+            outcome = "overloaded"
+        return time.perf_counter() - began, outcome
+
+    tasks = []
+    for number in range(int(rate * duration)):
+        if closed_after is None and all(breaker["state"] == "closed" for breaker in clients.breaker_stats().values()):
+            closed_after = time.perf_counter() - start
+        tasks.append(asyncio.create_task(one(number)))
+        await asyncio.sleep(1 / rate)
+    results = await asyncio.gather(*tasks)
+
+    return {
+        "latencies": [seconds for seconds, _ in results],
+        "degraded": sum(outcome == "degraded" for _, outcome in results),
+        "overloaded": sum(outcome == "overloaded" for _, outcome in results),
+        "closed_after": closed_after
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=float, default=2, help="Questions per second")
+    parser.add_argument("--phase-seconds", type=float, default=20, help="Length of each phase")
+    parser.add_argument("--stub-port", type=int, default=9180)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LLM_READ_TIMEOUT_ROUTER", "2")
+    os.environ.setdefault("LLM_READ_TIMEOUT_TENANCY_FAQ", "5")
+    os.environ.setdefault("LLM_MAX_RETRIES_ROUTER", "0")
+    os.environ.setdefault("LLM_MAX_RETRIES_TENANCY_FAQ", "0")
+    os.environ.setdefault("CIRCUIT_OPEN_SECONDS", "5")
+    # Every question must reach the model; the answer cache would hide the outage
+    os.environ["FAQ_CACHE_ENABLED"] = "false"
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.openai_stub",
+        "--port", str(args.stub_port),
+        "--router-latency", "fixed:0.3",
+        "--text-latency", "fixed:0.8"
+    ])
+    try:
+        wait_until_ready(f"{stub_url}/v1/models")
+        os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"{stub_url}/v1"
+
+        from agents.langgraph_workflow import RealEstateWorkflow
+        from utils.llm_clients import LLMClients
+        from utils.session_store import SessionStore
+
+        print(f"{args.rate:g} questions/s, {args.phase_seconds:g} s per phase\n")
+        print(f"{'breakers':>8} {'phase':>9} {'p50 s':>6} {'p95 s':>6} {'max s':>6} {'degraded':>9} {'503':>4}")
+        for circuit_breakers in (False, True):
+            clients = LLMClients(circuit_breakers=circuit_breakers)
+            workflow = RealEstateWorkflow("sk-bench", SessionStore(), clients)
+
+            async def run_phases() -> list:
+                # One event loop for all phases; the pooled async connections belong to it
+                return [await run_phase(workflow, stub_url, mode, args.rate, args.phase_seconds, clients) for _, mode in PHASES]
+
+            for (phase, _), result in zip(PHASES, asyncio.run(run_phases())):
+                latencies = result["latencies"]
+                print(
+                    f"{'on' if circuit_breakers else 'off':>8} {phase:>9} {percentile(latencies, 0.5):>6.2f} "
+                    f"{percentile(latencies, 0.95):>6.2f} {max(latencies):>6.2f} {result['degraded']:>5}/{len(latencies):<3} {result['overloaded']:>4}"
+                )
+                if circuit_breakers and phase == "recovery":
+                    closed = "never" if result["closed_after"] is None else f"{result['closed_after']:.1f} s"
+                    print(f"\nbreakers closed {closed} after the outage ended")
+                    for name, breaker in clients.breaker_stats().items():
+                        print(f"  {name}: {breaker['state']}, {breaker['trips']} trips, {breaker['rejected']} calls refused")
+    finally:
+        # Calls hung by the outage would keep a graceful shutdown waiting
+        stub.kill()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: single-flight coalescing of LLM calls during an incident burst.
+
+Many tenants report the same building-wide problem within seconds. Each
+burst sends --burst requests at once, in fresh sessions: most carry the
+same message and the rest are distinct. The burst runs through the workflow
+against the offline OpenAI stub with coalescing off and on. The stub counts
+the upstream calls it received.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_coalescing --burst 40
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.load_test import wait_until_ready
+
+
+INCIDENT_MESSAGE = "The water main burst and our whole building has no water, do we still have to pay full rent this month?"
+DISTINCT_MESSAGE = "My landlord has not returned my deposit after {n} weeks, what can I do?"
+
+
+async def burst(workflow, size: int, distinct: int) -> list:
+    """Send one burst; return per-request latencies."""
+    messages = [DISTINCT_MESSAGE.format(n=n + 2) for n in range(distinct)]
+    messages += [INCIDENT_MESSAGE] * (size - distinct)
+
+    async def one(message: str) -> float:
+        start = time.perf_counter()
+        await workflow.process_request_async(message, str(uuid.uuid4()), location="Toronto, Ontario")
+        return time.perf_counter() - start
+
+    return await asyncio.gather(*(one(message) for message in messages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--burst", type=int, default=40)
+    parser.add_argument("--distinct", type=int, default=4, help="Requests per burst with their own message")
+    parser.add_argument("--stub-port", type=int, default=9160)
+    args = parser.parse_args()
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.openai_stub",
+        "--port", str(args.stub_port),
+        "--router-latency", "fixed:0.4",
+        "--text-latency", "fixed:0.8"
+    ])
+    try:
+        wait_until_ready(f"{stub_url}/v1/models")
+        os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"{stub_url}/v1"
+        # Measure coalescing alone, not the FAQ answer cache
+        os.environ["FAQ_CACHE_ENABLED"] = "false"
+
+        from agents.langgraph_workflow import RealEstateWorkflow
+        from utils.llm_clients import LLMClients
+        from utils.session_store import SessionStore
+
+        print(f"{args.burst} requests per burst, {args.burst - args.distinct} identical\n")
+        print(f"{'coalescing':>10} {'upstream calls':>15} {'p50 s':>6} {'max s':>6} {'ratio':>6}")
+        for coalescing in (False, True):
+            clients = LLMClients(coalescing=coalescing)
+            workflow = RealEstateWorkflow("sk-bench", SessionStore(), clients)
+
+            before = httpx.get(f"{stub_url}/stats").json()["calls"]
+            latencies = asyncio.run(burst(workflow, args.burst, args.distinct))
+            after = httpx.get(f"{stub_url}/stats").json()["calls"]
+
+            upstream = sum(after.values()) - sum(before.values())
+            ratio = clients.single_flight.stats()["coalescing_ratio"]
+            print(f"{'on' if coalescing else 'off':>10} {upstream:>15} {statistics.median(latencies):>6.2f} {max(latencies):>6.2f} {ratio:>6.2f}")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: image analysis inline on the event loop vs. on the CV worker pool.
+
+Runs a batch of concurrent analyses of a synthetic 12 MP JPEG while a ticker
+task measures how long the event loop is stalled, i.e. how long any other
+request would wait to be served. Throughput with the pool should scale with
+the number of workers up to the core count.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_cv_pool --images 16 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.bench_image_pipeline import make_photo
+from utils.cv_pool import CVWorkerPool, analyze_image
+from utils.image_utils import ImageBuffer, ANALYSIS_IMAGE_SIZE
+
+
+async def measure(run_batch, tick: float = 0.005) -> tuple:
+    """Run a batch while sampling event-loop lag; return (seconds, max lag ms)."""
+    max_lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal max_lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(tick)
+            max_lag = max(max_lag, time.perf_counter() - start - tick)
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await run_batch()
+    elapsed = time.perf_counter() - start
+    done = True
+    await ticker_task
+
+    return elapsed, max_lag * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    photo = make_photo()
+    decoded = ImageBuffer.from_bytes(photo, ANALYSIS_IMAGE_SIZE).bgr
+
+    def fresh_buffers():
+        # Analysis resizes buffers in place, so every batch gets its own copies, made outside the measurement
+        return [ImageBuffer(decoded.copy()) for _ in range(args.images)]
+
+    buffers = fresh_buffers()
+
+    async def inline_batch():
+        for buffer in buffers:
+            analyze_image(buffer)
+            await asyncio.sleep(0)
+
+    print(f"{'mode':>12} {'images/s':>9} {'max loop lag ms':>16}")
+
+    elapsed, lag = await measure(inline_batch)
+    print(f"{'inline':>12} {args.images / elapsed:>9.1f} {lag:>16.1f}")
+
+    for workers in args.workers:
+        pool = CVWorkerPool(max_workers=workers, task_timeout=60)
+        # Start the workers outside the measurement
+        await asyncio.gather(*[pool.analyze(buffer) for buffer in fresh_buffers()[:workers]])
+        buffers = fresh_buffers()
+
+        async def pool_batch(buffers=buffers):
+            await asyncio.gather(*[pool.analyze(buffer) for buffer in buffers])
+
+        elapsed, lag = await measure(pool_batch)
+        print(f"{f'pool x{workers}':>12} {args.images / elapsed:>9.1f} {lag:>16.1f}")
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
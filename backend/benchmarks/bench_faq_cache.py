@@ -0,0 +1,122 @@
+"""
+Benchmark: semantic FAQ answer cache.
+
+1. Matching: similarity of hand-labelled question pairs, and whether each
+   one is served from the cache at the configured threshold. Paraphrases
+   should hit; different questions on the same topic must not.
+2. Lookup cost against a location index of growing size.
+3. End to end: first-turn tenancy questions and their paraphrases sent
+   through the workflow against the offline OpenAI stub, in fresh sessions,
+   reporting latency and FAQ tokens of cache misses and hits.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_faq_cache
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+from benchmarks.load_test import wait_until_ready
+from utils.faq_cache import FAQAnswerCache, embed_question
+
+
+# (question, question, same question?)
+PAIRS = [
+    ("Can my landlord raise my rent?", "can the landlord increase the rent", True),
+    ("Can my landlord evict me without notice?", "can I be evicted without notice", True),
+    ("How do I get my deposit back?", "how do i get my deposit back??", True),
+    ("My landlord won't do repairs, what can I do?", "landlord wont do repairs what can i do", True),
+    ("Can my landlord raise my rent?", "Can my landlord not raise my rent?", False),
+    ("Can my landlord raise my rent?", "can my landlord raise rent twice a year", False),
+    ("Can my landlord raise my rent?", "How much notice for a rent increase?", False),
+    ("Can my landlord keep my security deposit?", "can landlord keep deposit for cleaning", False),
+    ("How do I get my deposit back?", "How much deposit can a landlord ask for?", False),
+    ("Can my landlord evict me without notice?", "Can my landlord enter without notice?", False)
+]
+
+# Asked first in fresh sessions (misses), then as paraphrases (hits)
+QUESTIONS = [
+    ("Can my landlord raise my rent?", "can the landlord increase the rent"),
+    ("Can my landlord evict me without notice?", "can I be evicted without notice"),
+    ("How do I get my deposit back?", "how do i get my deposit back??"),
+    ("My landlord won't do repairs, what can I do?", "landlord wont do repairs what can i do")
+]
+
+
+def matching(cache: FAQAnswerCache):
+    print(f"threshold {cache.similarity_threshold}")
+    print(f"{'similarity':>10} {'hit':>4} {'want':>5}  pair")
+    correct = 0
+    for first, second, same in PAIRS:
+        similarity = float(embed_question(first) @ embed_question(second))
+        hit = similarity >= cache.similarity_threshold
+        correct += hit == same
+        print(f"{similarity:>10.2f} {'yes' if hit else 'no':>4} {'yes' if same else 'no':>5}  {first!r} / {second!r}")
+    print(f"{correct}/{len(PAIRS)} pairs decided correctly")
+
+
+def lookup_cost(sizes, lookups: int):
+    print(f"\n{'entries':>8} {'lookup us':>10}")
+    for size in sizes:
+        cache = FAQAnswerCache()
+        for number in range(size):
+            cache.put(f"question {number} about clause {number * 7} of the lease", "Toronto, Ontario", "answer")
+        times = []
+        for number in range(lookups):
+            start = time.perf_counter()
+            cache.get(f"question {number % size} about clause {number} of the lease", "toronto ontario")
+            times.append(time.perf_counter() - start)
+        print(f"{size:>8} {statistics.median(times) * 1e6:>10.0f}")
+
+
+def end_to_end(stub_port: int):
+    stub = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.openai_stub",
+        "--port", str(stub_port),
+        "--router-latency", "fixed:0.4",
+        "--text-latency", "fixed:0.6"
+    ])
+    try:
+        wait_until_ready(f"http://127.0.0.1:{stub_port}/v1/models")
+        os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1"
+
+        from agents.langgraph_workflow import RealEstateWorkflow
+        from utils.session_store import SessionStore
+
+        workflow = RealEstateWorkflow("sk-bench", SessionStore())
+        print(f"\n{'request':>8} {'seconds':>8} {'faq tokens':>11}  question")
+        for label, index in (("miss", 0), ("hit", 1)):
+            for pair in QUESTIONS:
+                start = time.perf_counter()
+                result = workflow.process_request(pair[index], str(uuid.uuid4()), location="Toronto, Ontario")
+                elapsed = time.perf_counter() - start
+                faq = result["usage"]["agents"].get("tenancy_faq", {})
+                tokens = faq.get("prompt_tokens", 0) + faq.get("completion_tokens", 0)
+                print(f"{label:>8} {elapsed:>8.2f} {tokens:>11}  {pair[index]!r}")
+        print(f"\ncache stats: {workflow.faq_agent.answer_cache.stats()}")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--stub-port", type=int, default=9150)
+    parser.add_argument("--skip-end-to-end", action="store_true")
+    args = parser.parse_args()
+
+    matching(FAQAnswerCache())
+    lookup_cost((10, 100, 512), args.lookups)
+    if not args.skip_end_to_end:
+        end_to_end(args.stub_port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: hedged router and FAQ calls against a stalling upstream.
+
+The offline OpenAI stub answers most calls quickly, but a small fraction of
+them stall for several seconds (the "stall" latency spec), which is what
+sets the p99 of a real deployment. Tenancy questions arrive at a steady
+rate and go through the workflow, once without and once with hedging. The
+run reports p50/p95/p99 latency, how often hedges fired and won, and how
+many extra upstream calls they cost.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_hedging --requests 250 --rate 5
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.load_test import wait_until_ready
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+async def offer_load(workflow, requests: int, rate: float) -> list:
+    """Send distinct questions open-loop at a fixed rate; return per-request latencies."""
+    async def one(number: int) -> float:
+        start = time.perf_counter()
+        await workflow.process_request_async(
+            f"Can my landlord raise the rent on unit {number} twice in one year?",
+            str(uuid.uuid4()),
+            location="Toronto, Ontario"
+        )
+        return time.perf_counter() - start
+
+    tasks = []
+    for number in range(requests):
+        tasks.append(asyncio.create_task(one(number)))
+        await asyncio.sleep(1 / rate)
+    return await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=250)
+    parser.add_argument("--rate", type=float, default=5, help="Questions per second")
+    parser.add_argument("--stall-probability", type=float, default=0.03, help="Fraction of upstream calls that stall")
+    parser.add_argument("--stub-port", type=int, default=9190)
+    args = parser.parse_args()
+
+    # Distinct questions only; keep the answer cache out of the measurement
+    os.environ["FAQ_CACHE_ENABLED"] = "false"
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.openai_stub",
+        "--port", str(args.stub_port),
+        "--router-latency", f"stall:0.3,4,{args.stall_probability}",
+        "--text-latency", f"stall:0.8,8,{args.stall_probability}",
+        "--seed", "7"
+    ])
+    try:
+        wait_until_ready(f"{stub_url}/v1/models")
+        os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"{stub_url}/v1"
+
+        from agents.langgraph_workflow import RealEstateWorkflow
+        from utils.llm_clients import LLMClients
+        from utils.session_store import SessionStore
+
+        print(f"{args.requests} questions at {args.rate:g}/s, {args.stall_probability:.0%} of upstream calls stall\n")
+        print(f"{'hedging':>7} {'p50 s':>6} {'p95 s':>6} {'p99 s':>6} {'max s':>6} {'upstream calls':>15}")
+        for hedging in (False, True):
+            clients = LLMClients(hedging=hedging)
+            workflow = RealEstateWorkflow("sk-bench", SessionStore(), clients)
+
+            before = sum(httpx.get(f"{stub_url}/stats").json()["calls"].values())
+            latencies = asyncio.run(offer_load(workflow, args.requests, args.rate))
+            upstream = sum(httpx.get(f"{stub_url}/stats").json()["calls"].values()) - before
+
+            print(
+                f"{'on' if hedging else 'off':>7} {percentile(latencies, 0.5):>6.2f} {percentile(latencies, 0.95):>6.2f} "
+                f"{percentile(latencies, 0.99):>6.2f} {max(latencies):>6.2f} {upstream:>15}"
+            )
+            for name, hedger in clients.hedging_stats().items():
+                print(
+                    f"  {name}: delay {hedger['delay_seconds']} s, fired {hedger['fired']}/{hedger['calls']} "
+                    f"({hedger['fire_rate']:.1%}), won {hedger['won']} ({hedger['win_rate']:.0%}), denied {hedger['denied']}"
+                )
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: history size per turn in a long tenancy dispute, with and without history compaction.
+
+Plays a 36-turn conversation through the workflow against the offline
+OpenAI stub and, after each turn, reads the tenancy FAQ agent's memory the
+way a prompt carrying history would, reporting its size in tokens. Without
+compaction the history grows until the session store's turn cap; with it,
+the history levels off at the agent's budget. That history is what such a
+prompt would add to every model call.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_history_compaction --turns 36
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.load_test import wait_until_ready
+from utils.history_compactor import estimate_tokens
+
+
+QUESTIONS = [
+    "My landlord says I owe {n}00 dollars for repainting after I moved out, can they charge that?",
+    "The lease I signed in March says the deposit is refundable within 30 days, it has been {n} weeks.",
+    "I sent a written request on day {n} and they have not answered, what are my options?",
+    "They also kept part of the deposit for carpet cleaning, is that normal wear and tear?"
+]
+
+
+def play(workflow, turns: int, session_id: str) -> list:
+    """Send turns through the workflow; return the tokens of FAQ history a prompt would carry after each turn."""
+    results = []
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)].format(n=turn + 1)
+        workflow.process_request(question, session_id, location="Toronto, Ontario")
+        history = workflow.faq_agent.memory.messages(session_id)
+        results.append(sum(estimate_tokens(message.content) for message in history))
+        if workflow.session_store.compactor is not None:
+            # Give the background summary a moment, as the gap between real user turns would
+            time.sleep(0.05)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=36)
+    parser.add_argument("--stub-port", type=int, default=9120)
+    args = parser.parse_args()
+
+    stub = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.openai_stub",
+        "--port", str(args.stub_port),
+        "--router-latency", "fixed:0",
+        "--text-latency", "fixed:0",
+        "--token-interval", "0"
+    ])
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.stub_port}/v1/models")
+        os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+
+        from agents.langgraph_workflow import RealEstateWorkflow
+        from utils.session_store import SessionStore
+
+        # Compaction is off by default, and summaries are only written for agents with a history budget
+        os.environ["HISTORY_COMPACTION"] = "true"
+        os.environ.setdefault("HISTORY_TOKEN_BUDGET_TENANCY_FAQ", "1200")
+        compacted = RealEstateWorkflow("sk-bench", SessionStore())
+        os.environ["HISTORY_COMPACTION"] = "false"
+        plain = RealEstateWorkflow("sk-bench", SessionStore())
+
+        runs = {
+            "plain": play(plain, args.turns, "plain"),
+            "compacted": play(compacted, args.turns, "compacted")
+        }
+        summaries = compacted.session_store.compactor.stats()["summaries"]
+        compacted.session_store.compactor.shutdown()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(f"{'turn':>5} {'plain tokens':>13} {'compacted tokens':>17}")
+    for turn in range(args.turns):
+        if turn < 3 or (turn + 1) % 6 == 0:
+            print(f"{turn + 1:>5} {runs['plain'][turn]:>13} {runs['compacted'][turn]:>17}")
+
+    for name, results in runs.items():
+        tail = results[-8:]
+        print(f"\n{name}: last turns average {sum(tail) / len(tail):.0f} history tokens (max {max(results)})")
+    print(f"summaries written: {summaries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark: legacy PIL image pipeline vs. the fused ImageBuffer pipeline.
+
+Each pipeline decodes a synthetic 12 MP phone-sized JPEG, resizes it to fit
+1024x1024, applies CLAHE, runs issue detection and re-encodes it for the
+vision API. Each pipeline runs in a fresh subprocess, which reports its best
+CPU time and its peak resident memory above the idle baseline.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_image_pipeline
+"""
+
+import argparse
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.image_utils import (
+    ImageBuffer,
+    ANALYSIS_IMAGE_SIZE,
+    preprocess_image,
+    encode_image_for_openai,
+    _detect_issues_from_gray
+)
+
+
+def make_photo(width: int = 4032, height: int = 3024) -> bytes:
+    """Build a JPEG with gradients, noise and a few line features at phone resolution."""
+    rng = np.random.default_rng(0)
+    columns = np.linspace(0, 160, width, dtype=np.float32)[None, :]
+    rows = np.linspace(0, 60, height, dtype=np.float32)[:, None]
+    base = (columns + rows).astype(np.uint8)
+    image = cv2.merge((base, base // 2 + 40, 255 - base))
+    image = cv2.add(image, rng.integers(0, 30, image.shape, dtype=np.uint8))
+
+    for i in range(8):
+        cv2.line(image, (200 + i * 400, 100), (260 + i * 400, height - 100), (20, 20, 20), 6)
+
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def legacy_pipeline(data: bytes) -> dict:
+    """The previous path: PIL decode, PIL resize, PIL<->OpenCV copies per stage."""
+    image = preprocess_image(Image.open(io.BytesIO(data)))
+
+    cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    lab = cv2.cvtColor(cv_image, cv2.COLOR_BGR2LAB)
+    l_channel, a, b = cv2.split(lab)
+    l_channel = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(l_channel)
+    enhanced = cv2.cvtColor(cv2.merge((l_channel, a, b)), cv2.COLOR_LAB2BGR)
+    enhanced = Image.fromarray(cv2.cvtColor(enhanced, cv2.COLOR_BGR2RGB))
+
+    gray = cv2.cvtColor(cv2.cvtColor(np.array(enhanced), cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2GRAY)
+    issues = _detect_issues_from_gray(gray)
+    encode_image_for_openai(enhanced)
+
+    return issues
+
+
+def fused_pipeline(data: bytes, quality: str) -> dict:
+    """The ImageBuffer path: decode once, operate on one ndarray."""
+    buffer = ImageBuffer.from_bytes(data, max_size=ANALYSIS_IMAGE_SIZE).resize(quality=quality).enhance()
+    issues = buffer.detect_issues()
+    buffer.encode_jpeg()
+
+    return issues
+
+
+def upload_pipeline(data: bytes) -> dict:
+    """The upload path: scaled decode from the spooled file object, then the fused pipeline."""
+    buffer = ImageBuffer.from_file(io.BytesIO(data), max_size=ANALYSIS_IMAGE_SIZE).resize().enhance()
+    issues = buffer.detect_issues()
+    buffer.encode_jpeg()
+
+    return issues
+
+
+PIPELINES = {
+    "legacy": legacy_pipeline,
+    "fused-lanczos": lambda data: fused_pipeline(data, "lanczos"),
+    "fused-fast": lambda data: fused_pipeline(data, "fast"),
+    "upload-file": upload_pipeline
+}
+
+
+def reset_peak_rss():
+    """Reset the kernel's resident-set high-water mark for this process (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size since the last reset, in MB."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is KiB on Linux and cannot be reset
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb() -> float:
+    """Current resident set size in MB."""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_one(name: str, photo_path: str, repeat: int) -> dict:
+    """Time one pipeline in this process and report CPU time and peak RSS above the idle baseline."""
+    with open(photo_path, "rb") as photo:
+        data = photo.read()
+
+    # Warm up so one-off allocations (codec tables, thread pools) are not counted
+    PIPELINES[name](data)
+
+    baseline = current_rss_mb()
+    reset_peak_rss()
+
+    cpu_times = []
+    for _ in range(repeat):
+        start = time.process_time()
+        PIPELINES[name](data)
+        cpu_times.append(time.process_time() - start)
+
+    return {
+        "pipeline": name,
+        "cpu_ms": min(cpu_times) * 1000,
+        "peak_rss_mb": peak_rss_mb() - baseline
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pipeline", choices=list(PIPELINES), help=argparse.SUPPRESS)
+    parser.add_argument("--photo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+
+    if args.pipeline:
+        print(json.dumps(run_one(args.pipeline, args.photo, args.repeat)))
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as photo:
+        photo.write(make_photo())
+        photo.flush()
+
+        print(f"{'pipeline':>14} {'cpu ms':>8} {'peak MB':>8}")
+        for name in PIPELINES:
+            output = subprocess.run(
+                [
+                    sys.executable, "-m", "benchmarks.bench_image_pipeline",
+                    "--pipeline", name, "--photo", photo.name, "--repeat", str(args.repeat)
+                ],
+                capture_output=True,
+                text=True,
+                check=True
+            ).stdout
+            result = json.loads(output)
+            print(f"{name:>14} {result['cpu_ms']:>8.1f} {result['peak_rss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Microbenchmark: compiled keyword matcher vs. per-keyword substring scans.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_keyword_matcher
+"""
+
+import argparse
+import random
+import time
+
+from utils.keyword_matcher import match_keywords
+from utils.prompts import (
+    EMERGENCY_KEYWORDS,
+    ISSUE_KEYWORDS,
+    TENANCY_KEYWORDS,
+    SEVERITY_KEYWORDS,
+    FAQ_TOPIC_KEYWORDS
+)
+
+
+FILLER_WORDS = (
+    "the apartment kitchen bathroom since last week my landlord said we would talk about it "
+    "but nothing happened and now there is a smell near the window waterproof fired current parent"
+).split()
+
+
+def legacy_scan(text: str) -> dict:
+    """The previous approach: one substring scan per keyword, per call site."""
+    text_lower = text.lower()
+    lists = {
+        "emergency": EMERGENCY_KEYWORDS,
+        "issue": ISSUE_KEYWORDS,
+        "tenancy": TENANCY_KEYWORDS,
+        **{f"severity_{tier}": keywords for tier, keywords in SEVERITY_KEYWORDS.items()},
+        **{f"topic_{topic}": keywords for topic, keywords in FAQ_TOPIC_KEYWORDS.items()}
+    }
+    return {
+        category: [keyword for keyword in keywords if keyword in text_lower]
+        for category, keywords in lists.items()
+    }
+
+
+def make_message(n_words: int, rng: random.Random) -> str:
+    """Build a long message of filler words with a few keywords sprinkled in."""
+    keywords = ISSUE_KEYWORDS + TENANCY_KEYWORDS + ["gas leak", "mold"]
+    words = [rng.choice(FILLER_WORDS) for _ in range(n_words)]
+    for _ in range(max(1, n_words // 50)):
+        words[rng.randrange(n_words)] = rng.choice(keywords)
+    return " ".join(words)
+
+
+def bench(func, messages, repeat: int) -> float:
+    """Return the best-of-repeat seconds for one pass over all messages."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            func(message)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    print(f"{'words/msg':>10} {'legacy msg/s':>14} {'matcher msg/s':>14} {'matcher MB/s':>13} {'speedup':>8}")
+    for n_words in (20, 200, 2000, 10000):
+        messages = [make_message(n_words, rng) for _ in range(args.messages)]
+        total_mb = sum(len(message) for message in messages) / 1e6
+
+        legacy = bench(legacy_scan, messages, args.repeat)
+        matcher = bench(match_keywords, messages, args.repeat)
+
+        print(
+            f"{n_words:>10} {len(messages) / legacy:>14.0f} {len(messages) / matcher:>14.0f} "
+            f"{total_mb / matcher:>13.1f} {legacy / matcher:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
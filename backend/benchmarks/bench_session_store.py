@@ -0,0 +1,137 @@
+"""
+Benchmark: in-process vs. SQLite session store, and SQLite across worker processes.
+
+1. Cost of one turn's session writes (two memory exchanges, a fold, the
+   turn, usage, then the end-of-turn flush) and of the routing read
+   (get_last_agent), for each backend in one process.
+2. Routing continuity: worker processes take turns answering the same
+   sessions, and each checks it sees the previous worker's last agent and turns.
+3. Lost updates: every worker adds usage to one shared session at once; the
+   total must come out exact.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_session_store --workers 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from utils.session_store import SessionStore
+from utils.sqlite_session_store import SqliteSessionStore
+from utils.usage import UsageCounts, UsageTracker
+
+
+AGENTS = ("tenancy_faq", "issue_detection")
+
+
+def one_token() -> UsageTracker:
+    tracker = UsageTracker()
+    tracker.add("router", UsageCounts(prompt_tokens=1, llm_calls=1))
+    return tracker
+
+
+def turn(store: SessionStore, session_id: str, number: int):
+    """The session writes of one workflow turn."""
+    agent = AGENTS[number % 2]
+    store.add_memory(session_id, agent, f"question {number}", f"answer {number}")
+    store.fold_memory(session_id, agent, 6)
+    store.add_memory(session_id, "router", f"question {number}", f"[{agent}] answer {number}")
+    store.append_turn(session_id, f"question {number}", f"answer {number}", agent)
+    store.add_usage(session_id, one_token())
+    store.flush()
+
+
+def time_backend(store: SessionStore, turns: int) -> tuple:
+    """Median microseconds per turn of writes and per routing read."""
+    write_times, read_times = [], []
+    for number in range(turns):
+        session_id = f"bench-{number % 50}"
+        start = time.perf_counter()
+        turn(store, session_id, number)
+        write_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        store.get_last_agent(session_id)
+        read_times.append(time.perf_counter() - start)
+    return statistics.median(write_times) * 1e6, statistics.median(read_times) * 1e6
+
+
+def continuity_worker(path: str, index: int, workers: int, sessions: int, turns: int, barrier, errors):
+    store = SqliteSessionStore(path=path)
+    for number in range(turns):
+        if number % workers == index:
+            for s in range(sessions):
+                session_id = f"continuity-{s}"
+                expected_agent = AGENTS[(number - 1) % 2] if number else None
+                if store.get_last_agent(session_id) != expected_agent:
+                    errors.value += 1
+                if len(store.get_history(session_id)) != 2 * min(number, store.max_turns):
+                    errors.value += 1
+                turn(store, session_id, number)
+        barrier.wait()
+    store.close()
+
+
+def contention_worker(path: str, additions: int):
+    store = SqliteSessionStore(path=path)
+    for _ in range(additions):
+        store.add_usage("shared", one_token())
+        store.flush()
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--additions", type=int, default=200, help="Usage additions per worker in the contention test")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'backend':>8} {'turn writes us':>15} {'routing read us':>16}")
+        for name, store in (("memory", SessionStore()), ("sqlite", SqliteSessionStore(path=os.path.join(directory, "timing.db")))):
+            writes, reads = time_backend(store, args.turns)
+            print(f"{name:>8} {writes:>15.0f} {reads:>16.1f}")
+            store.close()
+
+        context = multiprocessing.get_context("spawn")
+
+        path = os.path.join(directory, "continuity.db")
+        barrier = context.Barrier(args.workers)
+        errors = context.Value("i", 0)
+        turns = 3 * args.workers
+        processes = [
+            context.Process(target=continuity_worker, args=(path, index, args.workers, args.sessions, turns, barrier, errors))
+            for index in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        print(f"\ncontinuity: {args.workers} workers x {args.sessions} sessions x {turns} turns, mismatches: {errors.value}")
+
+        path = os.path.join(directory, "contention.db")
+        SqliteSessionStore(path=path).close()
+        start = time.perf_counter()
+        processes = [context.Process(target=contention_worker, args=(path, args.additions)) for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        store = SqliteSessionStore(path=path)
+        total = store.get("shared").usage["router"].prompt_tokens
+        store.close()
+        expected = args.workers * args.additions
+        print(f"contention: {expected} concurrent additions to one session in {elapsed:.2f}s, stored total {total} ({'exact' if total == expected else 'LOST UPDATES'})")
+
+
+if __name__ == "__main__":
+    main()
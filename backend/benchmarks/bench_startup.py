@@ -0,0 +1,159 @@
+"""
+Benchmark: cold start of the API server.
+
+Every measurement runs in a fresh interpreter, like a newly scaled instance:
+
+- importing main, and whether OpenCV got loaded by it
+- the heaviest top-level packages by import time (python -X importtime)
+- building the workflow (agents, LLM clients, compiled graph)
+- the first image analysis with and without the CV warm-up
+- time from launching uvicorn until /api/ready answers 200, against the offline OpenAI stub
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Any, List
+
+import httpx
+
+from benchmarks.load_test import stop_servers, wait_until_ready
+
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import main
+from utils.lazy_import import is_loaded
+print(json.dumps({"seconds": time.perf_counter() - start, "cv2_loaded": is_loaded(sys.modules["cv2"])}))
+"""
+
+WORKFLOW_SNIPPET = """
+import json, time
+import main
+start = time.perf_counter()
+main.get_workflow()
+print(json.dumps({"seconds": time.perf_counter() - start}))
+"""
+
+FIRST_IMAGE_SNIPPET = """
+import asyncio, json, sys, time
+from benchmarks.bench_image_pipeline import make_photo
+from utils.cv_pool import get_cv_pool
+from utils.image_utils import ImageBuffer, ANALYSIS_IMAGE_SIZE
+
+async def run(warm):
+    pool = get_cv_pool()
+    result = {}
+    if warm:
+        start = time.perf_counter()
+        await pool.warm()
+        result["warmup"] = time.perf_counter() - start
+    photo = make_photo()
+    start = time.perf_counter()
+    await pool.analyze(ImageBuffer.from_bytes(photo, ANALYSIS_IMAGE_SIZE))
+    result["seconds"] = time.perf_counter() - start
+    pool.shutdown()
+    return result
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(run(sys.argv[1] == "warm"))))
+"""
+
+
+def run_snippet(snippet: str, *args: str, env: Dict[str, str] = None) -> Dict[str, Any]:
+    """Run a snippet in a fresh interpreter and parse the JSON it prints last."""
+    completed = subprocess.run(
+        [sys.executable, "-c", snippet, *args],
+        capture_output=True, text=True, check=True, env=env
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def import_profile(top: int) -> List[tuple]:
+    """Self import time per top-level package, heaviest first."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, check=True
+    )
+    totals = defaultdict(int)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def time_to_ready(stub_port: int, api_port: int) -> Dict[str, float]:
+    """Launch the stub and uvicorn; time until /api/ready answers 200."""
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-startup-bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{stub_port}/v1",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1"
+    }
+    processes = [subprocess.Popen([sys.executable, "-m", "benchmarks.openai_stub", "--port", str(stub_port)])]
+    try:
+        wait_until_ready(f"http://127.0.0.1:{stub_port}/v1/models")
+
+        start = time.perf_counter()
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning"],
+            env=env
+        ))
+        url = f"http://127.0.0.1:{api_port}"
+        wait_until_ready(f"{url}/")
+        listening = time.perf_counter() - start
+
+        while httpx.get(f"{url}/api/ready", timeout=2.0).status_code != 200:
+            time.sleep(0.05)
+        ready = time.perf_counter() - start
+
+        return {"listening": listening, "ready": ready}
+    finally:
+        stop_servers(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Packages listed in the import profile")
+    parser.add_argument("--stub-port", type=int, default=9140)
+    parser.add_argument("--api-port", type=int, default=8140)
+    args = parser.parse_args()
+
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-startup-bench")}
+
+    imports = [run_snippet(IMPORT_SNIPPET) for _ in range(args.runs)]
+    print(f"import main:        {statistics.median(run['seconds'] for run in imports) * 1000:8.0f} ms (median of {args.runs})")
+    print(f"cv2 loaded by it:   {any(run['cv2_loaded'] for run in imports)}")
+
+    builds = [run_snippet(WORKFLOW_SNIPPET, env=env)["seconds"] for _ in range(args.runs)]
+    print(f"build workflow:     {statistics.median(builds) * 1000:8.0f} ms")
+
+    cold = run_snippet(FIRST_IMAGE_SNIPPET, "cold")
+    warm = run_snippet(FIRST_IMAGE_SNIPPET, "warm")
+    print(f"first image, cold:  {cold['seconds'] * 1000:8.0f} ms")
+    print(f"first image, warm:  {warm['seconds'] * 1000:8.0f} ms (after a {warm['warmup'] * 1000:.0f} ms warm-up)")
+
+    startup = time_to_ready(args.stub_port, args.api_port)
+    print(f"uvicorn listening:  {startup['listening'] * 1000:8.0f} ms")
+    print(f"/api/ready is 200:  {startup['ready'] * 1000:8.0f} ms")
+
+    print("\nimport time by package (self time, ms):")
+    for package, micros in import_profile(args.top):
+        print(f"  {package:<24} {micros / 1000:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
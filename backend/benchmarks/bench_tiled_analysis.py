@@ -0,0 +1,113 @@
+"""
+Benchmark: single-pass crack detection vs. tiled full-resolution analysis.
+
+Draws hairline cracks (1 px wide) on a 12 MP photo-like image and compares:
+
+- legacy: the previous per-line Python angle loop at 1024 px
+- single-pass: the vectorized default path at 1024 px
+- tiled: overlapping full-resolution tiles with segment merging
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_tiled_analysis
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from utils.image_utils import (
+    ImageBuffer,
+    ANALYSIS_IMAGE_SIZE,
+    detect_issues_tiled,
+    _detect_issues_from_gray,
+    _linear_crack_mask
+)
+
+
+def make_cracked_photo(width: int = 4032, height: int = 3024) -> np.ndarray:
+    """Textured wall with a few long 1 px hairline cracks, as a BGR array."""
+    rng = np.random.default_rng(0)
+    wall = cv2.GaussianBlur(rng.integers(150, 200, (height, width), dtype=np.uint8), (0, 0), 3)
+
+    for i in range(6):
+        x = 400 + i * 600
+        cv2.line(wall, (x, 200), (x + 150, height - 200), 150, 1)
+    cv2.line(wall, (300, 1500), (width - 300, 1580), 150, 1)
+
+    return cv2.cvtColor(wall, cv2.COLOR_GRAY2BGR)
+
+
+def legacy_detect(gray: np.ndarray) -> bool:
+    """The previous detect_image_issues body, with a Python loop over lines."""
+    np.mean(gray)
+    cv2.Laplacian(gray, cv2.CV_64F).var()
+
+    edges = cv2.Canny(gray, 50, 150)
+    lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=100, maxLineGap=10)
+    edge_density = np.sum(edges > 0) / edges.size
+
+    if lines is None or len(lines) <= 3 or edge_density >= 0.15:
+        return False
+
+    return legacy_count(lines) > 2
+
+
+def legacy_count(lines: np.ndarray) -> int:
+    """The previous per-line angle loop."""
+    linear_cracks = 0
+    for line in lines:
+        x1, y1, x2, y2 = line[0]
+        angle = np.arctan2(abs(y2 - y1), abs(x2 - x1)) * 180 / np.pi
+        if angle < 30 or angle > 60:
+            linear_cracks += 1
+    return linear_cracks
+
+
+def best_of(func, repeat: int) -> tuple:
+    """Return (best seconds, last result)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    photo = make_cracked_photo()
+    small = ImageBuffer(photo.copy()).resize(ANALYSIS_IMAGE_SIZE).enhance().gray
+    full = ImageBuffer(photo).gray
+
+    cases = [
+        ("legacy", lambda: legacy_detect(small)),
+        ("single-pass", lambda: _detect_issues_from_gray(small)["cracks_detected"]),
+        ("tiled", lambda: detect_issues_tiled(full))
+    ]
+
+    print(f"{'mode':>12} {'ms':>8} {'cracks':>7}")
+    for name, func in cases:
+        seconds, result = best_of(func, args.repeat)
+        cracks = result["cracks_detected"] if isinstance(result, dict) else result
+        print(f"{name:>12} {seconds * 1000:>8.1f} {str(cracks):>7}")
+
+    rng = np.random.default_rng(1)
+    lines = rng.integers(0, 1024, (2000, 1, 4), dtype=np.int32)
+    loop, _ = best_of(lambda: legacy_count(lines), args.repeat)
+    vectorized, _ = best_of(lambda: np.count_nonzero(_linear_crack_mask(lines.reshape(-1, 4))), args.repeat)
+    print(f"\nAngle filter over {len(lines)} lines: loop {loop * 1000:.2f} ms, vectorized {vectorized * 1000:.3f} ms")
+
+    heatmap = detect_issues_tiled(full)["crack_heatmap"]
+    print(f"\nTiled heatmap ({heatmap['grid'][0]}x{heatmap['grid'][1]}):")
+    for row in heatmap["scores"]:
+        print("  " + " ".join(f"{score:.2f}" for score in row))
+
+
+if __name__ == "__main__":
+    main()
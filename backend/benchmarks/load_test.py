@@ -0,0 +1,318 @@
+"""
+End-to-end load test for /api/chat against the offline OpenAI stub.
+
+Starts the stub and the API server as subprocesses (or targets a running
+server with --url), drives /api/chat with a weighted mix of tenancy, issue,
+image and emergency traffic from concurrent virtual users, and reports
+throughput plus p50/p95/p99 latency per agent path.
+
+Results can be saved as a baseline and later runs compared against it, so
+regressions in the workflow or the image pipeline show up as numbers:
+
+    python -m benchmarks.load_test --save benchmarks/baselines/load_test.json
+    python -m benchmarks.load_test --baseline benchmarks/baselines/load_test.json
+
+Run from the backend directory. Latency comparisons are only meaningful
+between runs on the same machine with the same stub settings.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple
+
+import httpx
+
+from benchmarks.bench_image_pipeline import make_photo
+
+
+@dataclass
+class Scenario:
+    """One kind of traffic and the agent path it should take."""
+    path: str
+    weight: float
+    messages: Tuple[str, ...]
+    with_image: bool = False
+
+
+SCENARIOS = [
+    Scenario("tenancy_faq", 0.4, (
+        "My landlord wants to raise the rent by 20 percent, is that allowed?",
+        "How much notice does my landlord need to give before ending the lease?",
+        "Can my landlord keep my security deposit for normal wear and tear?",
+        "Is my landlord allowed to enter the apartment without telling me?"
+    )),
+    Scenario("issue_text", 0.25, (
+        "There is a damp patch spreading on the bathroom ceiling",
+        "The kitchen tap keeps dripping even when fully closed",
+        "Black mould is growing around the bedroom window frame",
+        "The heating makes a banging noise every morning"
+    )),
+    Scenario("issue_image", 0.25, (
+        "What is wrong with this wall?",
+        "Is this crack something I should worry about?",
+        "Can you tell what caused this damage?"
+    ), with_image=True),
+    Scenario("emergency", 0.1, (
+        "I think there is a gas leak in the kitchen",
+        "There are exposed wires hanging from the ceiling",
+        "The basement is flooded after the pipe burst"
+    ))
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def observed_path(response: Dict[str, Any], with_image: bool) -> str:
+    """Agent path a response actually took."""
+    if response.get("is_emergency"):
+        return "emergency"
+    if response.get("agent_type") == "tenancy_faq":
+        return "tenancy_faq"
+    return "issue_image" if with_image else "issue_text"
+
+
+class LoadTest:
+    """Closed-loop load generator: each virtual user sends its next request when the last one returns."""
+
+    def __init__(self, url: str, concurrency: int, requests: int, warmup: int, seed: int, image: bytes):
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+        self.requests = requests
+        self.warmup = warmup
+        self.rng = random.Random(seed)
+        self.image = image
+        self.samples: List[Dict[str, Any]] = []
+        self._sent = 0
+
+    def _next_request(self) -> Tuple[Scenario, Dict[str, str]]:
+        scenario = self.rng.choices(SCENARIOS, weights=[s.weight for s in SCENARIOS])[0]
+        self._sent += 1
+        # A ticket reference keeps each message distinct, as real traffic is, so caches do not flatter the numbers
+        message = f"{self.rng.choice(scenario.messages)} (ticket {self._sent})"
+        return scenario, {"message": message, "session_id": f"load-{self._sent}"}
+
+    async def _send(self, client: httpx.AsyncClient, scenario: Scenario, form: Dict[str, str]) -> Dict[str, Any]:
+        files = {"file": ("photo.jpg", self.image, "image/jpeg")} if scenario.with_image else None
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{self.url}/api/chat", data=form, files=files)
+            latency = time.perf_counter() - start
+            ok = response.status_code == 200
+            body = response.json() if ok else {}
+        except httpx.HTTPError as e:
+            latency, ok, body = time.perf_counter() - start, False, {"error": str(e)}
+
+        return {
+            "path": scenario.path,
+            "ok": ok,
+            "latency": latency,
+            "observed": observed_path(body, scenario.with_image) if ok else None
+        }
+
+    async def _user(self, client: httpx.AsyncClient, remaining: List[int]):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            scenario, form = self._next_request()
+            self.samples.append(await self._send(client, scenario, form))
+
+    async def run(self) -> Dict[str, Any]:
+        """Run warm-up and measured phases and return the report."""
+        timeout = httpx.Timeout(120.0, connect=10.0)
+        limits = httpx.Limits(max_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            remaining = [self.warmup]
+            await asyncio.gather(*[self._user(client, remaining) for _ in range(self.concurrency)])
+            self.samples.clear()
+
+            remaining = [self.requests]
+            start = time.perf_counter()
+            await asyncio.gather(*[self._user(client, remaining) for _ in range(self.concurrency)])
+            elapsed = time.perf_counter() - start
+
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        """Summarize samples into throughput and latency percentiles per path."""
+        def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+            latencies = sorted(sample["latency"] * 1000 for sample in samples if sample["ok"])
+            return {
+                "requests": len(samples),
+                "errors": sum(1 for sample in samples if not sample["ok"]),
+                "misrouted": sum(1 for sample in samples if sample["ok"] and sample["observed"] != sample["path"]),
+                "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(percentile(latencies, 50), 1),
+                "p95_ms": round(percentile(latencies, 95), 1),
+                "p99_ms": round(percentile(latencies, 99), 1)
+            }
+
+        paths = {
+            scenario.path: summarize([sample for sample in self.samples if sample["path"] == scenario.path])
+            for scenario in SCENARIOS
+        }
+        return {"elapsed_s": round(elapsed, 2), "overall": summarize(self.samples), "paths": paths}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float = 100.0) -> List[str]:
+    """
+    List regressions of p95/p99 latency or throughput beyond the tolerance.
+
+    Latency increases smaller than min_delta_ms are ignored, so fast paths
+    such as emergency responses do not flag scheduling noise.
+    """
+    regressions = []
+    current_paths = {"overall": report["overall"], **report["paths"]}
+    baseline_paths = {"overall": baseline["overall"], **baseline["paths"]}
+
+    for path, stats in current_paths.items():
+        base = baseline_paths.get(path)
+        if not base:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if base[metric] and stats[metric] > max(base[metric] * (1 + tolerance), base[metric] + min_delta_ms):
+                regressions.append(f"{path} {metric}: {base[metric]} -> {stats[metric]}")
+        if base["throughput_rps"] and stats["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{path} throughput_rps: {base['throughput_rps']} -> {stats['throughput_rps']}")
+        if stats["errors"] > base["errors"]:
+            regressions.append(f"{path} errors: {base['errors']} -> {stats['errors']}")
+
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'path':>12} {'reqs':>5} {'err':>4} {'misr':>5} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for path, stats in {**report["paths"], "overall": report["overall"]}.items():
+        print(
+            f"{path:>12} {stats['requests']:>5} {stats['errors']:>4} {stats['misrouted']:>5} "
+            f"{stats['throughput_rps']:>7.2f} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}"
+        )
+
+
+def wait_until_ready(url: str, timeout: float = 60.0):
+    """Poll a URL until it answers or the timeout passes."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def start_servers(args) -> Tuple[List[subprocess.Popen], str]:
+    """Start the OpenAI stub and the API server; return the processes and the API URL."""
+    stub_cmd = [
+        sys.executable, "-m", "benchmarks.openai_stub",
+        "--port", str(args.stub_port),
+        "--router-latency", args.router_latency,
+        "--vision-latency", args.vision_latency,
+        "--text-latency", args.text_latency,
+        "--seed", str(args.seed)
+    ]
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-load-test",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.stub_port}/v1",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1"
+    }
+    api_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port), "--log-level", "warning"]
+
+    processes = [subprocess.Popen(stub_cmd)]
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.stub_port}/v1/models")
+        processes.append(subprocess.Popen(api_cmd, env=env))
+        url = f"http://127.0.0.1:{args.api_port}"
+        wait_until_ready(f"{url}/api/ready")
+    except BaseException:
+        stop_servers(processes)
+        raise
+
+    return processes, url
+
+
+def stop_servers(processes: List[subprocess.Popen]):
+    for process in reversed(processes):
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Target a running API server instead of starting one with the stub")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[2016, 1512], metavar=("W", "H"))
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--router-latency", default="fixed:0.3")
+    parser.add_argument("--vision-latency", default="lognormal:1.5,0.3")
+    parser.add_argument("--text-latency", default="lognormal:1.0,0.3")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a saved results file; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    parser.add_argument("--min-delta-ms", type=float, default=100.0, help="Ignore latency increases below this (default 100)")
+    args = parser.parse_args()
+
+    processes, url = ([], args.url) if args.url else start_servers(args)
+    try:
+        test = LoadTest(url, args.concurrency, args.requests, args.warmup, args.seed, make_photo(*args.image_size))
+        report = asyncio.run(test.run())
+    finally:
+        stop_servers(processes)
+
+    report["config"] = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "image_size": args.image_size,
+        "stub": None if args.url else {
+            "router_latency": args.router_latency,
+            "vision_latency": args.vision_latency,
+            "text_latency": args.text_latency
+        },
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count()
+    }
+
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved results to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%} of {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
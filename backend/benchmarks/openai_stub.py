@@ -0,0 +1,273 @@
+"""
+Offline OpenAI-compatible stub server for load tests and local benchmarks.
+
+Speaks enough of the chat-completions protocol for the agents: plain and
+streaming responses, vision payloads (image_url content parts), usage
+blocks and GET /v1/models. Latency is drawn per call from a configurable
+distribution, separately for routing, vision and text calls, and answers
+are canned so runs are reproducible.
+
+Latency specs are "fixed:SECONDS", "uniform:LOW,HIGH", "normal:MEAN,STD",
+"lognormal:MEDIAN,SIGMA" or "stall:MEDIAN,STALL_SECONDS,PROBABILITY" (a
+lognormal with sigma 0.2 where a fraction of calls stalls instead). With --capacity N the stub behaves like an
+overloaded upstream: beyond N requests in flight, every latency is scaled
+by in-flight / N. POST /outage {"mode": "hang"} makes every call hang
+until the client times out, {"mode": "error"} makes every call fail with
+HTTP 500, and {"mode": null} ends the outage. Run from the backend directory:
+
+    python -m benchmarks.openai_stub --port 9100 --vision-latency lognormal:1.5,0.4
+
+then point the API at it with OPENAI_API_BASE=http://127.0.0.1:9100/v1.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+DEFAULT_RESPONSES = {
+    "vision": (
+        "**Issue Identified:** Visible cracking and moisture staining on the wall surface.\n"
+        "**Severity:** Medium\n"
+        "**Likely Cause:** Water ingress behind the plaster, most likely from a slow leak.\n"
+        "**Recommended Actions:** Find and fix the moisture source, let the wall dry out, then repair and repaint the plaster.\n"
+        "**Professional Help:** A plumber for the leak and a plasterer for the repair."
+    ),
+    "text": (
+        "Here is some general guidance. Check your lease and the local tenancy rules first, "
+        "keep written records of all communication with your landlord, and give notice in "
+        "writing. If the problem is not resolved, contact your local tenant protection agency."
+    )
+}
+
+# Keywords the stub router uses to pick an agent, standing in for the model's judgement
+TENANCY_HINTS = ("rent", "landlord", "lease", "tenant", "deposit", "evict", "notice", "contract")
+
+
+@dataclass
+class LatencySpec:
+    """A latency distribution in seconds."""
+    kind: str = "fixed"
+    params: List[float] = field(default_factory=lambda: [0.3])
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencySpec":
+        """Parse "kind:a,b" (e.g. "lognormal:0.8,0.5") into a LatencySpec."""
+        kind, _, raw = spec.partition(":")
+        params = [float(value) for value in raw.split(",") if value]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "stall": 3}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(
+                f"Invalid latency spec {spec!r}; expected one of fixed:S, uniform:LO,HI, normal:MEAN,STD, "
+                "lognormal:MEDIAN,SIGMA, stall:MEDIAN,STALL,P"
+            )
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw one latency, never negative."""
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        elif self.kind == "stall":
+            median, stall, probability = self.params
+            value = stall if rng.random() < probability else rng.lognormvariate(math.log(median), 0.2)
+        else:
+            value = rng.lognormvariate(math.log(self.params[0]), self.params[1])
+        return max(0.0, value)
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(str(param) for param in self.params)}"
+
+
+@dataclass
+class StubConfig:
+    """Latencies and canned answers for the stub."""
+    router_latency: LatencySpec = field(default_factory=lambda: LatencySpec("fixed", [0.3]))
+    vision_latency: LatencySpec = field(default_factory=lambda: LatencySpec("lognormal", [1.5, 0.3]))
+    text_latency: LatencySpec = field(default_factory=lambda: LatencySpec("lognormal", [1.0, 0.3]))
+    token_interval: float = 0.01
+    responses: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_RESPONSES))
+    seed: Optional[int] = None
+    capacity: Optional[int] = None
+
+
+def _text_of(content: Any) -> str:
+    """Flatten a message content (string or list of parts) to its text."""
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def _has_image(messages: List[Dict[str, Any]]) -> bool:
+    return any(
+        isinstance(message.get("content"), list)
+        and any(isinstance(part, dict) and part.get("type") == "image_url" for part in message["content"])
+        for message in messages
+    )
+
+
+def classify_call(messages: List[Dict[str, Any]]) -> str:
+    """Tell routing, vision and plain text calls apart: "router", "vision" or "text"."""
+    if messages and "routing agent" in _text_of(messages[0].get("content", "")):
+        return "router"
+    if _has_image(messages):
+        return "vision"
+    return "text"
+
+
+def route_answer(messages: List[Dict[str, Any]]) -> str:
+    """Answer a routing call the way the router prompt asks."""
+    text = _text_of(messages[-1].get("content", "")).lower()
+    if any(hint in text for hint in TENANCY_HINTS):
+        return "TENANCY_FAQ"
+    return "ISSUE_DETECTION"
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    """Build the stub application."""
+    config = config or StubConfig()
+    rng = random.Random(config.seed)
+    latencies = {"router": config.router_latency, "vision": config.vision_latency, "text": config.text_latency}
+    counts = {"router": 0, "vision": 0, "text": 0}
+    load = {"in_flight": 0, "peak_in_flight": 0}
+    outage = {"mode": None}
+
+    app = FastAPI(title="OpenAI stub")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": name, "object": "model", "owned_by": "stub"} for name in ("gpt-4", "gpt-4o")]}
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": counts, "latency": {kind: str(spec) for kind, spec in latencies.items()}, "capacity": config.capacity, "outage": outage["mode"], **load}
+
+    @app.post("/outage")
+    async def set_outage(request: Request):
+        outage["mode"] = (await request.json()).get("mode")
+        return outage
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        kind = classify_call(messages)
+        counts[kind] += 1
+
+        if outage["mode"] == "hang":
+            await asyncio.sleep(3600)
+        elif outage["mode"] == "error":
+            return JSONResponse(status_code=500, content={"error": {"message": "Simulated outage", "type": "server_error"}})
+
+        answer = route_answer(messages) if kind == "router" else config.responses[kind]
+        prompt_tokens = sum(_estimate_tokens(_text_of(message.get("content", ""))) for message in messages)
+        if kind == "vision":
+            # Roughly what a detail=high 1024 px image costs
+            prompt_tokens += 765
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _estimate_tokens(answer),
+            "total_tokens": prompt_tokens + _estimate_tokens(answer)
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "gpt-4")
+
+        # Time to first token, slowed down beyond capacity
+        latency = latencies[kind].sample(rng)
+        load["in_flight"] += 1
+        load["peak_in_flight"] = max(load["peak_in_flight"], load["in_flight"])
+        if config.capacity:
+            latency *= max(1.0, load["in_flight"] / config.capacity)
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            load["in_flight"] -= 1
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": usage
+            }
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                **extra
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            words = answer.split(" ")
+            for i, word in enumerate(words):
+                yield chunk({"content": word if i == len(words) - 1 else word + " "})
+                await asyncio.sleep(config.token_interval)
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--router-latency", type=LatencySpec.parse, default=StubConfig().router_latency)
+    parser.add_argument("--vision-latency", type=LatencySpec.parse, default=StubConfig().vision_latency)
+    parser.add_argument("--text-latency", type=LatencySpec.parse, default=StubConfig().text_latency)
+    parser.add_argument("--token-interval", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--responses", help="JSON file overriding the canned 'vision' and 'text' answers")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--capacity", type=int, default=None, help="Requests in flight beyond which latency grows proportionally")
+    args = parser.parse_args()
+
+    responses = dict(DEFAULT_RESPONSES)
+    if args.responses:
+        with open(args.responses) as f:
+            responses.update(json.load(f))
+
+    config = StubConfig(
+        router_latency=args.router_latency,
+        vision_latency=args.vision_latency,
+        text_latency=args.text_latency,
+        token_interval=args.token_interval,
+        responses=responses,
+        seed=args.seed,
+        capacity=args.capacity
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,32 @@
 FastAPI backend using LangChain and LangGraph for multi-agent orchestration.
 """
 
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+import asyncio
+import base64
+import binascii
 import json
+import time
 import uuid
-from typing import Optional, List
-from PIL import Image
-import io
+from typing import Optional, List, Dict
 import os
 
-from models.schemas import ChatResponse
+from models.schemas import (
+    ChatResponse,
+    BatchChatItem,
+    BatchChatRequest,
+    BatchChatItemResult,
+    BatchChatResponse
+)
 from agents.langgraph_workflow import RealEstateWorkflow
+from utils.image_utils import ImageBuffer, ANALYSIS_IMAGE_SIZE, TILED_ANALYSIS
+from utils.cv_pool import get_cv_pool
+from utils.llm_clients import get_llm_clients
+from utils.llm_scheduler import LLMOverloadedError
+from utils.prompts import FAQ_TOPIC_KEYWORDS
+from utils.metrics import REQUEST_LATENCY, ERRORS_TOTAL, monitor_event_loop_lag, render_metrics, timed_stage
 
 app = FastAPI(title="Real Estate Multi-Agent Chatbot (LangGraph)", version="2.0.0")
 
@@ -28,7 +43,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Largest accepted image upload; Starlette spools uploads above 1 MB to a temp file
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+# Allowance for the text form fields that share the request body with the image
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+# Multipart upload routes; their bodies must declare a Content-Length
+UPLOAD_ROUTES = ("/api/chat", "/api/chat/stream")
+
+# Batch triage limits; the concurrency cap should be sized against the OpenAI rate limits
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Load OpenCV and spawn the CV workers at startup; text-only deployments can turn this off
+CV_WARMUP = os.getenv("CV_WARMUP", "true").lower() == "true"
+
 workflow: Optional[RealEstateWorkflow] = None
+loop_lag_monitor: Optional[asyncio.Task] = None
+cv_warmup: Optional[asyncio.Task] = None
+startup_timings: Dict[str, float] = {}
 
 def get_workflow() -> RealEstateWorkflow:
     """Get or initialize the LangGraph workflow."""
@@ -43,6 +78,144 @@ def get_workflow() -> RealEstateWorkflow:
         workflow = RealEstateWorkflow(openai_api_key)
     return workflow
 
+@app.on_event("startup")
+async def build_workflow():
+    """Build the agents and compile the LangGraph before the first request needs them."""
+    start = time.perf_counter()
+    try:
+        get_workflow()
+    except HTTPException as e:
+        print(f"Workflow initialization failed: {e.detail}")
+        return
+    startup_timings["workflow"] = time.perf_counter() - start
+
+@app.on_event("startup")
+async def start_cv_warmup():
+    """Warm OpenCV and the CV workers in the background; /api/ready waits for it."""
+    global cv_warmup
+    if CV_WARMUP:
+        cv_warmup = asyncio.create_task(_warm_cv_pool())
+
+async def _warm_cv_pool():
+    start = time.perf_counter()
+    try:
+        await get_cv_pool().warm()
+    except Exception as e:
+        # A failed warm-up only means the first image pays the cold start
+        print(f"CV warm-up failed: {e}")
+        ERRORS_TOTAL.labels("cv_warmup").inc()
+        return
+    startup_timings["cv_warmup"] = time.perf_counter() - start
+
+@app.on_event("startup")
+async def warm_llm_connections():
+    """Open a pooled connection to the OpenAI API before the first request needs it."""
+    await get_llm_clients().warm(os.getenv("OPENAI_API_KEY"))
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    """Sample event-loop lag for the /metrics gauge."""
+    global loop_lag_monitor
+    loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+
+@app.on_event("shutdown")
+def stop_loop_lag_monitor():
+    """Stop sampling event-loop lag."""
+    if loop_lag_monitor is not None:
+        loop_lag_monitor.cancel()
+
+@app.on_event("shutdown")
+def shutdown_cv_pool():
+    """Stop the CV worker processes with the server."""
+    if cv_warmup is not None:
+        cv_warmup.cancel()
+    get_cv_pool().shutdown()
+
+@app.on_event("shutdown")
+def stop_history_compactor():
+    """Stop the background history summarizer."""
+    if workflow is not None and workflow.session_store.compactor is not None:
+        workflow.session_store.compactor.shutdown()
+
+@app.on_event("shutdown")
+def close_session_store():
+    """Write out buffered session changes."""
+    if workflow is not None:
+        workflow.session_store.close()
+
+@app.on_event("shutdown")
+async def close_llm_connections():
+    """Close the pooled LLM connections with the server."""
+    await get_llm_clients().aclose()
+
+class BodySizeLimitMiddleware:
+    """
+    Cap request bodies while they stream in, before the multipart parser spools them.
+
+    A declared Content-Length over the limit is refused before any of the body
+    is read, and upload routes must declare one. The bytes actually received are
+    counted as well, so a body that outgrows its declared length is cut off with
+    a 413 after at most one chunk past the limit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        path = scope["path"]
+        if path == "/api/chat/batch":
+            limit, detail = BATCH_MAX_BYTES, f"Batch request exceeds the {BATCH_MAX_BYTES // (1024 * 1024)} MB limit"
+        else:
+            limit, detail = MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES, _upload_too_large_message()
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is None and scope["method"] == "POST" and path in UPLOAD_ROUTES:
+            response = JSONResponse(status_code=411, content={"detail": "Uploads must declare a Content-Length"})
+            await response(scope, receive, send)
+            return
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing, which FastAPI passes through as the response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(BodySizeLimitMiddleware)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record request latency per route; streamed responses are timed until their headers are sent."""
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        ERRORS_TOTAL.labels("http").inc()
+        raise
+    
+    # Label by route template, never by raw path, to keep the label set bounded
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    REQUEST_LATENCY.labels(request.method, path, str(response.status_code)).observe(time.perf_counter() - start)
+    if response.status_code >= 500:
+        ERRORS_TOTAL.labels("http").inc()
+    return response
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -65,23 +238,19 @@ async def chat_endpoint(
     location: Optional[str] = Form(None),
     session_id: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
-    conversation_history: str = Form("[]")
+    conversation_history: Optional[str] = Form(None)
 ):
     """Unified endpoint to handle both text and image requests using LangGraph workflow."""
     try:
         workflow_instance = get_workflow()
         
-        try:
-            parsed_history = json.loads(conversation_history) if conversation_history else []
-        except json.JSONDecodeError:
-            parsed_history = []
+        _check_admission(workflow_instance, message)
+        
+        parsed_history = await asyncio.to_thread(_parse_history, workflow_instance, session_id, conversation_history)
         
-        image = None
-        if file and file.content_type and file.content_type.startswith('image/'):
-            image_data = await file.read()
-            image = Image.open(io.BytesIO(image_data))
+        image = await _load_upload_image(file)
         
-        result = workflow_instance.process_request(
+        result = await workflow_instance.process_request_async(
             user_text=message,
             session_id=session_id or str(uuid.uuid4()),
             image=image,
@@ -89,25 +258,249 @@ async def chat_endpoint(
             conversation_history=parsed_history
         )
         
-        return ChatResponse(
-            agent_type=result["agent_type"],
-            message=result["message"],
-            confidence=result["confidence"],
-            is_emergency=result["is_emergency"],
-            session_id=result["session_id"],
-            follow_up_questions=result["follow_up_questions"]
-        )
+        return _build_chat_response(result)
         
+    except HTTPException:
+        raise
+    except LLMOverloadedError as e:
+        raise _overloaded_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(
+    message: str = Form(...),
+    location: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    conversation_history: Optional[str] = Form(None)
+):
+    """Stream router decisions and answer tokens as server-sent events."""
+    workflow_instance = get_workflow()
+    
+    _check_admission(workflow_instance, message)
+    
+    parsed_history = await asyncio.to_thread(_parse_history, workflow_instance, session_id, conversation_history)
+    
+    image = await _load_upload_image(file)
+    
+    async def event_stream():
+        try:
+            async for event in workflow_instance.stream_request(
+                user_text=message,
+                session_id=session_id or str(uuid.uuid4()),
+                image=image,
+                location=location,
+                conversation_history=parsed_history
+            ):
+                data = event["data"]
+                if event["event"] == "final":
+                    data = _build_chat_response(data).model_dump()
+                yield _format_sse(event["event"], data)
+        except LLMOverloadedError as e:
+            yield _format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield _format_sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/chat/batch", response_model=BatchChatResponse)
+async def chat_batch_endpoint(request: BatchChatRequest):
+    """
+    Run many chat messages through the workflow concurrently, e.g. for bulk ticket triage.
+
+    Items run under a concurrency limit and their results come back in request
+    order. A failing item reports its error without failing the batch.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch contains no items")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the {BATCH_MAX_ITEMS} item limit")
+    
+    workflow_instance = get_workflow()
+    
+    concurrency = max(1, min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        _run_batch_item(workflow_instance, semaphore, index, item)
+        for index, item in enumerate(request.items)
+    ])
+    total_ms = (time.perf_counter() - start) * 1000
+    
+    succeeded = sum(1 for result in results if result.ok)
+    
+    return BatchChatResponse(
+        results=results,
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        concurrency=concurrency,
+        total_ms=total_ms
+    )
+
+async def _run_batch_item(
+    workflow_instance: RealEstateWorkflow,
+    semaphore: asyncio.Semaphore,
+    index: int,
+    item: BatchChatItem
+) -> BatchChatItemResult:
+    """Run one batch item, capturing its error and timings."""
+    submitted = time.perf_counter()
+    
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            image = await _decode_batch_image(item.image_base64) if item.image_base64 else None
+            
+            result = await workflow_instance.process_request_async(
+                user_text=item.message,
+                session_id=item.session_id or str(uuid.uuid4()),
+                image=image,
+                location=item.location
+            )
+            response, error = _build_chat_response(result), None
+        except Exception as e:
+            response, error = None, str(e.detail if isinstance(e, HTTPException) else e)
+        finished = time.perf_counter()
+    
+    return BatchChatItemResult(
+        index=index,
+        ok=error is None,
+        response=response,
+        error=error,
+        queued_ms=(started - submitted) * 1000,
+        latency_ms=(finished - started) * 1000
+    )
+
+async def _decode_batch_image(image_base64: str) -> ImageBuffer:
+    """Decode a base64 batch image under the same size limit as uploads."""
+    try:
+        data = base64.b64decode(image_base64, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="image_base64 is not valid base64")
+    
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=_upload_too_large_message())
+    
+    max_size = None if TILED_ANALYSIS else ANALYSIS_IMAGE_SIZE
+    try:
+        return await asyncio.to_thread(ImageBuffer.from_bytes, data, max_size)
+    except (OSError, ValueError) as e:
+        print(f"Error decoding batch image: {e}")
+        raise HTTPException(status_code=400, detail="Could not decode the uploaded image")
+
+def _parse_history(
+    workflow_instance: RealEstateWorkflow,
+    session_id: Optional[str],
+    conversation_history: Optional[str]
+) -> List[dict]:
+    """
+    Parse a client-posted conversation history.
+
+    The server keeps its own session history, so the posted blob is only used to
+    seed routing context for sessions the server has not seen (e.g. after a restart).
+    Reads the session store, so async callers run it on a worker thread.
+    """
+    if not conversation_history:
+        return []
+    
+    if session_id and workflow_instance.session_store.get(session_id) is not None:
+        return []
+    
+    try:
+        with timed_stage("parse_history"):
+            return json.loads(conversation_history)
+    except json.JSONDecodeError:
+        return []
+
+async def _load_upload_image(file: Optional[UploadFile]) -> Optional[ImageBuffer]:
+    """
+    Decode an uploaded image straight from its spooled temp file.
+
+    JPEGs are decoded at reduced scale close to the analysis size, or at full
+    resolution when tiled analysis is enabled.
+
+    Raises:
+        HTTPException: 413 if the upload exceeds MAX_UPLOAD_BYTES, 400 if it cannot be decoded
+    """
+    if not (file and file.content_type and file.content_type.startswith('image/')):
+        return None
+    
+    size = file.size
+    if size is None:
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+    
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=_upload_too_large_message())
+    
+    await file.seek(0)
+    
+    try:
+        max_size = None if TILED_ANALYSIS else ANALYSIS_IMAGE_SIZE
+        return await asyncio.to_thread(ImageBuffer.from_file, file.file, max_size)
+    except (OSError, ValueError) as e:
+        print(f"Error decoding uploaded image: {e}")
+        raise HTTPException(status_code=400, detail="Could not decode the uploaded image")
+
+def _check_admission(workflow_instance: RealEstateWorkflow, message: str):
+    """
+    Answer 503 right away when the LLM wait queue is full or too slow.
+
+    Emergencies are answered without an LLM call, so they are always admitted.
+    """
+    scheduler = workflow_instance.llm_clients.scheduler
+    if scheduler is None or workflow_instance.router_agent.is_emergency(message):
+        return
+    
+    try:
+        scheduler.check_admission()
+    except LLMOverloadedError as e:
+        raise _overloaded_error(e)
+
+def _overloaded_error(error: LLMOverloadedError) -> HTTPException:
+    """503 with a Retry-After header for a request refused by LLM admission control."""
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
+def _upload_too_large_message() -> str:
+    """Error detail for uploads above MAX_UPLOAD_BYTES."""
+    return f"Image upload exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"
+
+def _build_chat_response(result: dict) -> ChatResponse:
+    """Build the API response model from a workflow result."""
+    return ChatResponse(
+        agent_type=result["agent_type"],
+        message=result["message"],
+        confidence=result["confidence"],
+        is_emergency=result["is_emergency"],
+        session_id=result["session_id"],
+        follow_up_questions=result["follow_up_questions"],
+        usage=result.get("usage"),
+        session_usage=result.get("session_usage")
+    )
+
+def _format_sse(event: str, data: dict) -> str:
+    """Format a server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint."""
+    """
+    Liveness check endpoint; see /api/ready for readiness.
+
+    Reports "degraded" while any agent's circuit breaker is open or probing.
+    The service still answers then, with keyword routing and canned guidance.
+    """
     try:
         workflow_instance = get_workflow()
+        breakers = workflow_instance.llm_clients.breaker_stats()
         return {
-            "status": "healthy",
+            "status": "degraded" if any(breaker["state"] != "closed" for breaker in breakers.values()) else "healthy",
             "framework": "LangChain + LangGraph",
             "agents": {
                 "router": "LangChainRouterAgent",
@@ -120,11 +513,86 @@ async def health_check():
                 "conversation_memory": True,
                 "state_management": True,
                 "unified_endpoint": True
-            }
+            },
+            "circuit_breakers": breakers
         }
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the workflow is built and the CV warm-up has finished."""
+    cv_ready = cv_warmup is None or cv_warmup.done()
+    ready = workflow is not None and cv_ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "workflow": workflow is not None,
+            "cv_warmup": "disabled" if cv_warmup is None else ("done" if cv_ready else "running"),
+            "startup_seconds": {name: round(seconds, 3) for name, seconds in startup_timings.items()}
+        }
+    )
+
+@app.get("/api/router/stats")
+async def router_stats():
+    """Report local classifier hit rate, agreement with the LLM router and speculation hit rate."""
+    workflow = get_workflow()
+    router_agent = workflow.router_agent
+    return {
+        "classifier_loaded": router_agent.classifier is not None,
+        "local_threshold": router_agent.local_threshold,
+        "shadow_rate": router_agent.shadow_rate,
+        **router_agent.routing_stats.snapshot(),
+        "speculation": {"enabled": workflow.speculative_routing, **workflow.speculation_stats.snapshot()}
+    }
+
+@app.get("/api/sessions/stats")
+def session_stats():
+    """Report resident sessions and the memory they hold."""
+    return get_workflow().session_store.stats()
+
+@app.get("/api/cv/stats")
+async def cv_stats():
+    """Report CV worker pool size, queue depth and task outcomes."""
+    return get_cv_pool().stats()
+
+@app.get("/api/cv/cache/stats")
+async def cv_cache_stats():
+    """Report image analysis cache size and hit/miss counters."""
+    return get_workflow().issue_agent.image_cache.stats()
+
+@app.get("/api/faq/cache/stats")
+async def faq_cache_stats():
+    """Report FAQ answer cache size and hit/miss counters."""
+    return get_workflow().faq_agent.answer_cache.stats()
+
+@app.delete("/api/faq/cache")
+async def invalidate_faq_cache(location: Optional[str] = None, topic: Optional[str] = None):
+    """
+    Drop cached FAQ answers, e.g. after a tenancy law change.
+
+    Args:
+        location: Only drop answers for this location; every location if omitted
+        topic: Only drop answers touching this topic (rent, increase, eviction, deposit, repair)
+    """
+    if topic is not None and topic not in FAQ_TOPIC_KEYWORDS:
+        raise HTTPException(status_code=400, detail=f"Unknown topic '{topic}'. Expected one of: {', '.join(FAQ_TOPIC_KEYWORDS)}")
+    
+    invalidated = get_workflow().faq_agent.answer_cache.invalidate(location=location, topic=topic)
+    return {"invalidated": invalidated, "location": location, "topic": topic}
+
+@app.get("/api/llm/stats")
+async def llm_stats():
+    """Report the shared LLM connection pool settings and per-agent limits."""
+    return get_llm_clients().stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: node, LLM, image stage and request latencies, routing counters, loop lag."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Union
+from typing import Optional, List, Dict, Union
 from enum import Enum
 
 class AgentType(str, Enum):
@@ -42,10 +42,48 @@ class TenancyQuery(BaseModel):
     location: Optional[str] = None
     context: Optional[str] = None
 
+class TokenUsage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    image_tokens: int = 0  # estimated share of prompt_tokens spent on images
+    llm_calls: int = 0
+    cost_usd: float = 0.0
+
+class UsageReport(TokenUsage):
+    agents: Dict[str, TokenUsage] = {}
+
 class ChatResponse(BaseModel):
     agent_type: str
     message: str
     confidence: float
     is_emergency: bool = False
     session_id: str
-    follow_up_questions: Optional[List[str]] = None
\ No newline at end of file
+    follow_up_questions: Optional[List[str]] = None
+    usage: Optional[UsageReport] = None
+    session_usage: Optional[UsageReport] = None
+
+class BatchChatItem(BaseModel):
+    message: str
+    location: Optional[str] = None
+    session_id: Optional[str] = None
+    image_base64: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+    concurrency: Optional[int] = None
+
+class BatchChatItemResult(BaseModel):
+    index: int
+    ok: bool
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+    queued_ms: float
+    latency_ms: float
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItemResult]
+    succeeded: int
+    failed: int
+    concurrency: int
+    total_ms: float
\ No newline at end of file
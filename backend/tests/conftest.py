@@ -0,0 +1,11 @@
+"""
+Test setup shared by the backend tests.
+
+Run from backend/ with: python -m pytest -q tests
+"""
+
+import os
+import sys
+
+# The backend modules import each other as top-level packages (utils, agents)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
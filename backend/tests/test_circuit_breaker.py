@@ -0,0 +1,105 @@
+"""Tests for CircuitBreaker: which errors count, tripping and half-open probes."""
+
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from upstream_errors import api_error, api_timeout
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+
+
+def _breaker(**overrides) -> CircuitBreaker:
+    settings = dict(
+        slow_call_seconds=10.0,
+        failure_rate=0.5,
+        min_calls=2,
+        window_calls=4,
+        window_seconds=60.0,
+        open_seconds=0.05,
+        half_open_probes=2
+    )
+    settings.update(overrides)
+    return CircuitBreaker("test", **settings)
+
+
+def _fail(breaker: CircuitBreaker, error: Exception):
+    with pytest.raises(type(error)):
+        with breaker.guard() as call:
+            call.begin()
+            raise error
+
+
+def _succeed(breaker: CircuitBreaker):
+    with breaker.guard() as call:
+        call.begin()
+
+
+def _trip(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        _fail(breaker, api_timeout())
+    assert breaker.state == OPEN
+
+
+def test_client_errors_do_not_count():
+    breaker = _breaker()
+    for _ in range(5):
+        _fail(breaker, api_error(400))
+    stats = breaker.stats()
+    assert (stats["state"], stats["failures"], stats["calls"]) == (CLOSED, 0, 0)
+
+
+@pytest.mark.parametrize("error", [api_timeout(), api_error(429), api_error(500), api_error(503)])
+def test_upstream_failures_trip_the_breaker(error):
+    breaker = _breaker()
+    _fail(breaker, error)
+    _fail(breaker, error)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        _succeed(breaker)
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_admits_only_the_probes():
+    breaker = _breaker()
+    _trip(breaker)
+    time.sleep(breaker.open_seconds)
+
+    with ExitStack() as probes:
+        for _ in range(breaker.half_open_probes):
+            probes.enter_context(breaker.guard()).begin()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            _succeed(breaker)
+
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = _breaker()
+    _trip(breaker)
+    time.sleep(breaker.open_seconds)
+
+    _succeed(breaker)
+    assert breaker.state == HALF_OPEN
+    _fail(breaker, api_error(503))
+
+    assert breaker.state == OPEN
+    assert breaker.stats()["trips"] == 1
+
+
+def test_probe_that_never_began_is_given_back():
+    breaker = _breaker(half_open_probes=1)
+    _trip(breaker)
+    time.sleep(breaker.open_seconds)
+
+    # Refused by admission control before reaching the upstream
+    with pytest.raises(RuntimeError):
+        with breaker.guard():
+            raise RuntimeError("not admitted")
+    # A 400 probe says nothing about the upstream either
+    _fail(breaker, api_error(400))
+
+    assert breaker.state == HALF_OPEN
+    _succeed(breaker)
+    assert breaker.state == CLOSED
@@ -0,0 +1,101 @@
+"""Tests for RequestHedger: when hedges fire and how the losing attempt is charged."""
+
+import asyncio
+
+from utils.hedging import RequestHedger
+
+
+def _hedger() -> RequestHedger:
+    return RequestHedger("test", percentile=0.5, budget=1.0, max_burst=5, min_samples=3, window_calls=10)
+
+
+async def _warm_up(hedger: RequestHedger):
+    """Record enough fast calls for the hedge delay to be known."""
+    async def fast():
+        await asyncio.sleep(0.01)
+        return "fast"
+
+    for _ in range(hedger.min_samples):
+        await hedger.run(fast, lambda: True)
+
+
+def _attempts(*behaviours):
+    """A call whose successive attempts sleep and then return, or raise if given an exception."""
+    remaining = list(behaviours)
+
+    async def call():
+        seconds, outcome = remaining.pop(0)
+        await asyncio.sleep(seconds)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return call
+
+
+def test_no_hedge_before_min_samples():
+    async def scenario():
+        hedger = _hedger()
+        result = await hedger.run(_attempts((0.05, "primary")), lambda: True)
+        assert result == "primary"
+        assert hedger.delay() is None
+        assert hedger.stats()["fired"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_loser_is_charged():
+    async def scenario():
+        hedger = _hedger()
+        await _warm_up(hedger)
+        charged = []
+
+        def on_loser(winner, loser):
+            charged.append((winner, loser))
+            return 7
+
+        result = await hedger.run(_attempts((1.0, "primary"), (0.01, "hedge")), lambda: True, on_loser)
+
+        assert result == "hedge"
+        # The slow original call was still running, so it is charged as cancelled
+        assert charged == [("hedge", None)]
+        stats = hedger.stats()
+        assert (stats["fired"], stats["won"], stats["wasted_tokens"]) == (1, 1, 7)
+
+    asyncio.run(scenario())
+
+
+def test_failed_loser_is_not_charged():
+    async def scenario():
+        hedger = _hedger()
+        await _warm_up(hedger)
+        charged = []
+
+        def on_loser(winner, loser):
+            charged.append((winner, loser))
+            return 7
+
+        call = _attempts((0.1, TimeoutError("primary timed out")), (0.2, "hedge"))
+        result = await hedger.run(call, lambda: True, on_loser)
+
+        assert result == "hedge"
+        assert charged == []
+        assert hedger.stats()["wasted_tokens"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_denied_hedge_waits_for_primary():
+    async def scenario():
+        hedger = _hedger()
+        await _warm_up(hedger)
+        charged = []
+
+        result = await hedger.run(_attempts((0.1, "primary")), lambda: False, lambda *args: charged.append(args) or 7)
+
+        assert result == "primary"
+        assert charged == []
+        stats = hedger.stats()
+        assert (stats["fired"], stats["denied"]) == (0, 1)
+
+    asyncio.run(scenario())
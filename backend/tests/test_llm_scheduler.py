@@ -0,0 +1,132 @@
+"""Tests for LLMScheduler: shedding, queue timeouts and what adapts the limit."""
+
+import asyncio
+
+import pytest
+
+from upstream_errors import api_error
+from utils.llm_scheduler import LLMScheduler, LLMOverloadedError, Lane
+
+
+def _single_slot(**overrides) -> LLMScheduler:
+    """A scheduler pinned to one slot, so every further call queues."""
+    settings = dict(initial_limit=1, min_limit=1, max_limit=1, max_queue=1, queue_timeout=5.0)
+    settings.update(overrides)
+    return LLMScheduler(**settings)
+
+
+async def _hold(scheduler: LLMScheduler, lane: Lane, release: asyncio.Event):
+    async with scheduler.slot(lane, "test"):
+        await release.wait()
+    return lane
+
+
+def test_full_queue_sheds_lower_lane_for_higher():
+    async def scenario():
+        scheduler = _single_slot()
+        release = asyncio.Event()
+
+        holder = asyncio.create_task(_hold(scheduler, Lane.TEXT, release))
+        await asyncio.sleep(0)
+        background = asyncio.create_task(_hold(scheduler, Lane.BACKGROUND, release))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(_hold(scheduler, Lane.INTERACTIVE, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(LLMOverloadedError) as shed:
+            await background
+        assert shed.value.reason == "shed"
+
+        # A lower-priority call finds the queue full and is refused outright
+        with pytest.raises(LLMOverloadedError) as refused:
+            await _hold(scheduler, Lane.VISION, release)
+        assert refused.value.reason == "queue_full"
+
+        release.set()
+        assert await holder == Lane.TEXT
+        assert await interactive == Lane.INTERACTIVE
+        assert scheduler.in_flight == 0
+        assert scheduler.rejected == {"shed": 1, "queue_full": 1}
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_leaves_no_slot_behind():
+    async def scenario():
+        scheduler = _single_slot(queue_timeout=0.05)
+        release = asyncio.Event()
+
+        holder = asyncio.create_task(_hold(scheduler, Lane.TEXT, release))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloadedError) as timed_out:
+            await _hold(scheduler, Lane.INTERACTIVE, release)
+        assert timed_out.value.reason == "queue_timeout"
+        assert scheduler.stats()["queue_depth"]["interactive"] == 0
+
+        release.set()
+        await holder
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancel_racing_a_grant_hands_the_slot_back():
+    async def scenario():
+        scheduler = _single_slot()
+        release = asyncio.Event()
+
+        holding = scheduler.slot(Lane.TEXT, "test")
+        await holding.__aenter__()
+        waiter = asyncio.create_task(_hold(scheduler, Lane.TEXT, release))
+        await asyncio.sleep(0)
+
+        # The slot is granted to the waiter, which is cancelled before it can run
+        await holding.__aexit__(None, None, None)
+        assert scheduler.in_flight == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert scheduler.in_flight == 0
+        async with scheduler.slot(Lane.TEXT, "test"):
+            assert scheduler.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_timeout_racing_a_grant_keeps_the_slot():
+    scheduler = _single_slot()
+    with scheduler.slot_sync(Lane.TEXT, "test"):
+        waiter = scheduler._admit(Lane.TEXT, None)
+    assert waiter.state == "granted"
+
+    # The wait timed out just as the grant arrived; the call proceeds on its slot
+    scheduler._abandon(waiter, timed_out=True)
+    scheduler._finish_wait(waiter)
+    assert scheduler.in_flight == 1
+
+    scheduler._release("test", 0.01, False)
+    assert scheduler.in_flight == 0
+
+
+def _fail(scheduler: LLMScheduler, error: Exception):
+    with pytest.raises(type(error)):
+        with scheduler.slot_sync(Lane.TEXT, "test"):
+            raise error
+
+
+def test_client_errors_do_not_adapt_the_limit():
+    scheduler = LLMScheduler(initial_limit=16, min_limit=2, max_limit=64, max_queue=8, queue_timeout=1.0)
+    for _ in range(10):
+        _fail(scheduler, api_error(400))
+    assert scheduler.limit == 16
+    assert scheduler.decreases == 0
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_congestion_cuts_the_limit_once_per_round_trip(status_code):
+    scheduler = LLMScheduler(initial_limit=16, min_limit=2, max_limit=64, max_queue=8, queue_timeout=1.0, backoff=0.75)
+    for _ in range(10):
+        _fail(scheduler, api_error(status_code))
+    assert scheduler.limit == 12
+    assert scheduler.decreases == 1
@@ -0,0 +1,129 @@
+"""Tests for SingleFlight: a cancelled leader must not fail its followers."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def test_follower_survives_cancelled_leader():
+    async def scenario():
+        flight = SingleFlight()
+        runs = []
+
+        async def answer():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.create_task(flight.do("key", answer))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", answer))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+        assert await follower == ("answer", False)
+        assert len(runs) == 1
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_call_cancelled_once_every_caller_has_gone():
+    async def scenario():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def answer():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "stale"
+
+        async def fresh():
+            return "fresh"
+
+        callers = [asyncio.create_task(flight.do("key", answer)) for _ in range(3)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert flight.stats()["in_flight"] == 0
+        # The abandoned call cannot be joined; the next caller starts afresh
+        assert await flight.do("key", fresh) == ("fresh", True)
+
+    asyncio.run(scenario())
+
+
+def test_sync_follower_gives_up_at_its_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    results = []
+
+    def slow():
+        release.wait(5)
+        return "answer"
+
+    leader = threading.Thread(target=lambda: results.append(flight.do_sync("key", slow)))
+    leader.start()
+    while flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+
+    with pytest.raises(TimeoutError):
+        flight.do_sync("key", slow, timeout=0.05)
+
+    release.set()
+    leader.join(5)
+    assert results == [("answer", True)]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_sync_follower_gets_leader_error():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream failed")
+
+    def leader():
+        try:
+            flight.do_sync("key", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(5)
+
+    follower_errors = []
+
+    def follower():
+        try:
+            flight.do_sync("key", failing, timeout=5)
+        except ValueError as e:
+            follower_errors.append(e)
+
+    follower_thread = threading.Thread(target=follower)
+    follower_thread.start()
+    while flight.stats()["followers"] == 0:
+        time.sleep(0.001)
+    release.set()
+    thread.join(5)
+    follower_thread.join(5)
+
+    assert len(errors) == 1
+    assert follower_errors == errors
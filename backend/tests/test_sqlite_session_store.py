@@ -0,0 +1,62 @@
+"""Tests for SqliteSessionStore: writes from several worker processes are replayed, never lost."""
+
+import multiprocessing
+
+from utils.sqlite_session_store import SqliteSessionStore
+
+
+WORKERS = 4
+TURNS_PER_WORKER = 50
+
+# Large enough that no cap drops the turns under test
+LIMITS = dict(max_turns=1000, max_session_bytes=10_000_000)
+
+
+def _append_turns(path: str, worker: int, start):
+    """Worker process: append turns to one shared session, committing after each like a request does."""
+    store = SqliteSessionStore(path=path, **LIMITS)
+    start.wait()
+    for turn in range(TURNS_PER_WORKER):
+        store.append_turn("shared", f"worker {worker} question {turn}", f"answer {turn}", "tenancy_faq")
+        store.flush()
+    store.close()
+
+
+def test_concurrent_workers_lose_no_turns(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    workers = [context.Process(target=_append_turns, args=(path, worker, start)) for worker in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    store = SqliteSessionStore(path=path, **LIMITS)
+    try:
+        turns = store.get("shared").turns
+    finally:
+        store.close()
+
+    assert len(turns) == 2 * WORKERS * TURNS_PER_WORKER
+    questions = [turn["content"] for turn in turns if turn["role"] == "user"]
+    for worker in range(WORKERS):
+        # Each worker's turns are all there, in the order it made them
+        own = [question for question in questions if question.startswith(f"worker {worker} ")]
+        assert own == [f"worker {worker} question {turn}" for turn in range(TURNS_PER_WORKER)]
+
+
+def test_other_process_writes_are_seen_through_the_cache(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    reader = SqliteSessionStore(path=path, **LIMITS)
+    writer = SqliteSessionStore(path=path, **LIMITS)
+    try:
+        assert reader.get("shared") is None
+        writer.append_turn("shared", "hello", "hi", "tenancy_faq")
+        writer.flush()
+        assert [turn["content"] for turn in reader.get("shared").turns] == ["hello", "hi"]
+    finally:
+        writer.close()
+        reader.close()
@@ -0,0 +1,22 @@
+"""OpenAI errors as the client raises them, for tests of error classification."""
+
+import httpx
+import openai
+
+
+_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def api_error(status_code: int) -> openai.APIStatusError:
+    """The error the client raises for an HTTP status."""
+    response = httpx.Response(status_code, request=_REQUEST)
+    error_class = {
+        400: openai.BadRequestError,
+        429: openai.RateLimitError
+    }.get(status_code, openai.InternalServerError if status_code >= 500 else openai.APIStatusError)
+    return error_class(f"HTTP {status_code}", response=response, body=None)
+
+
+def api_timeout() -> openai.APITimeoutError:
+    """The error the client raises on a read timeout."""
+    return openai.APITimeoutError(request=_REQUEST)
@@ -0,0 +1,279 @@
+"""
+Per-agent circuit breakers for upstream LLM calls.
+
+During an OpenAI outage every request would otherwise wait out its full
+read timeout, and its retries, before the agents fall back. A breaker
+watches the last few calls of one agent and opens when too many of them
+fail or run slower than the agent's slow-call threshold; counting calls
+rather than minutes means a long stretch of normal traffic does not delay
+the trip. While it is open, calls fail at once with CircuitOpenError, and
+the agents answer in degraded mode: keyword routing and canned guidance.
+After a cool-down the breaker lets a few probe calls through (half-open).
+If they succeed it closes again; if any fails it opens for another cool-down.
+
+Only errors that say the upstream is unhealthy count as failures: timeouts,
+connection errors, 429 and 5xx. A 400 for an unsupported image or an
+over-long prompt is the caller's problem, and must not degrade every tenant.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
+
+import openai
+
+from utils.metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS_TOTAL
+
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Gauge values for circuit_breaker_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+UPSTREAM_FAILURES = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    TimeoutError
+)
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether an LLM call's error says the upstream is unhealthy (timeout, connection error, 429 or 5xx)."""
+    if isinstance(error, UPSTREAM_FAILURES):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def is_congestion(error: BaseException) -> bool:
+    """Whether an LLM call's error says the upstream is overloaded (timeout, 429 or 5xx), not just unreachable."""
+    if isinstance(error, openai.APIConnectionError) and not isinstance(error, openai.APITimeoutError):
+        return False
+    return is_upstream_failure(error)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making an LLM call while the agent's circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"The {name} model is unavailable (circuit open). Retrying in {retry_after} s.")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BreakerCall:
+    """
+    One guarded call.
+
+    The call is admitted before it queues for an admission slot, but only
+    the upstream request itself is timed: begin() starts the clock once the
+    slot is granted. Streams mark() their first chunk, since the time to the
+    first token is what shows a slow upstream.
+    """
+
+    __slots__ = ("probe", "started_at", "marked_at")
+
+    def __init__(self, probe: bool = False):
+        self.probe = probe
+        self.started_at: Optional[float] = None
+        self.marked_at: Optional[float] = None
+
+    def begin(self):
+        """Start the latency clock as the upstream request goes out."""
+        self.started_at = time.perf_counter()
+
+    def mark(self):
+        """Stop the latency clock, e.g. at the first streamed chunk."""
+        if self.marked_at is None:
+            self.marked_at = time.perf_counter()
+
+    def latency(self) -> float:
+        return (self.marked_at or time.perf_counter()) - self.started_at
+
+
+class CircuitBreaker:
+    """
+    Error-rate and slow-call circuit breaker for one agent.
+
+    Thresholds come from the environment: CIRCUIT_FAILURE_RATE,
+    CIRCUIT_MIN_CALLS, CIRCUIT_WINDOW_CALLS, CIRCUIT_WINDOW_SECONDS,
+    CIRCUIT_OPEN_SECONDS and CIRCUIT_HALF_OPEN_PROBES.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_seconds: float,
+        failure_rate: Optional[float] = None,
+        min_calls: Optional[int] = None,
+        window_calls: Optional[int] = None,
+        window_seconds: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        half_open_probes: Optional[int] = None
+    ):
+        """Initialize a closed breaker, reading unset thresholds from the environment."""
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.failure_rate = failure_rate or float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+        self.min_calls = min_calls or int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+        self.window_calls = window_calls or int(os.getenv("CIRCUIT_WINDOW_CALLS", "10"))
+        self.window_seconds = window_seconds or float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+        self.open_seconds = open_seconds or float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+        self.half_open_probes = half_open_probes or int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "2"))
+
+        self.state = CLOSED
+        # (finished at, failed or slow) for the last window_calls calls within window_seconds, oldest first
+        self._outcomes: deque = deque(maxlen=self.window_calls)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.trips = 0
+
+        CIRCUIT_STATE.labels(name).set(STATE_VALUES[CLOSED])
+
+    @contextmanager
+    def guard(self) -> Iterator[BreakerCall]:
+        """
+        Admit one upstream call and count its outcome.
+
+        Enter it before queueing for an admission slot, so an open breaker
+        never makes a request wait. Upstream failures (see is_upstream_failure)
+        and calls slower than slow_call_seconds count as failures. Calls that
+        never began (refused by admission control) count as nothing, and so
+        do other errors, such as a 400 for a bad request, and cancelled calls
+        unless they had already run past slow_call_seconds.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with all probes out
+        """
+        call = BreakerCall(self._acquire())
+        try:
+            yield call
+        except Exception as e:
+            if call.started_at is None or not is_upstream_failure(e):
+                self._abandon(call)
+            else:
+                self._record(call, failed=True)
+            raise
+        except BaseException:
+            # A deadline or a winning hedge cancelled the call; only a slow one says something
+            if call.started_at is not None and call.latency() > self.slow_call_seconds:
+                self._record(call, failed=False)
+            else:
+                self._abandon(call)
+            raise
+        if call.started_at is None:
+            self._abandon(call)
+        else:
+            self._record(call, failed=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Report state, the failure rate over the window and lifetime counters."""
+        with self._lock:
+            now = time.monotonic()
+            self._refresh_locked(now)
+            failed = sum(1 for _, bad in self._outcomes if bad)
+            return {
+                "state": self.state,
+                "failure_rate": round(failed / len(self._outcomes), 3) if self._outcomes else 0.0,
+                "window_calls": len(self._outcomes),
+                "slow_call_seconds": self.slow_call_seconds,
+                "retry_in_seconds": round(max(0.0, self._opened_at + self.open_seconds - now), 1) if self.state == OPEN else 0,
+                "calls": self.calls,
+                "failures": self.failures,
+                "slow_calls": self.slow_calls,
+                "rejected": self.rejected,
+                "trips": self.trips
+            }
+
+    def _acquire(self) -> bool:
+        """Admit a call; returns whether it is a half-open probe."""
+        with self._lock:
+            self._refresh_locked(time.monotonic())
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            error = self._open_error_locked()
+        raise error
+
+    def _record(self, call: BreakerCall, failed: bool):
+        latency = call.latency()
+        slow = not failed and latency > self.slow_call_seconds
+        bad = failed or slow
+        now = time.monotonic()
+
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            self.slow_calls += slow
+
+            if call.probe:
+                self._probes_in_flight -= 1
+                if self.state != HALF_OPEN:
+                    return
+                if bad:
+                    self._transition_locked(OPEN, now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._transition_locked(CLOSED, now)
+                return
+
+            if self.state != CLOSED:
+                # A call admitted before the breaker opened says nothing new
+                return
+
+            self._outcomes.append((now, bad))
+            self._trim_locked(now)
+            failed_calls = sum(1 for _, outcome in self._outcomes if outcome)
+            if len(self._outcomes) >= self.min_calls and failed_calls / len(self._outcomes) >= self.failure_rate:
+                self._transition_locked(OPEN, now)
+
+    def _abandon(self, call: BreakerCall):
+        """Give back the probe of a call that never reached the upstream or was cancelled."""
+        if call.probe:
+            with self._lock:
+                self._probes_in_flight -= 1
+
+    def _refresh_locked(self, now: float):
+        """Move from open to half-open once the cool-down has passed."""
+        if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition_locked(HALF_OPEN, now)
+
+    def _trim_locked(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _transition_locked(self, state: str, now: float):
+        if state == OPEN:
+            self._opened_at = now
+            if self.state == CLOSED:
+                self.trips += 1
+                print(f"Circuit breaker for {self.name} opened")
+        elif state == CLOSED:
+            print(f"Circuit breaker for {self.name} closed")
+        self.state = state
+        self._outcomes.clear()
+        self._probe_successes = 0
+        CIRCUIT_STATE.labels(self.name).set(STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS_TOTAL.labels(self.name, state).inc()
+
+    def _open_error_locked(self) -> CircuitOpenError:
+        self.rejected += 1
+        retry_after = max(1, int(self._opened_at + self.open_seconds - time.monotonic() + 0.999))
+        return CircuitOpenError(self.name, retry_after)
@@ -0,0 +1,316 @@
+"""
+Process pool for OpenCV image analysis.
+
+Resize, CLAHE, issue detection and JPEG encoding run in worker processes so
+large photos never hold up the event loop or other requests. Pixels are
+handed over through shared memory, so only the segment name and the small
+results cross the process boundary.
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple, Dict, Any, List
+
+import numpy as np
+from PIL import Image
+
+from utils.image_utils import (
+    ImageBuffer,
+    ImageInput,
+    ANALYSIS_IMAGE_SIZE,
+    TILED_ANALYSIS,
+    detect_issues_tiled,
+    to_image_buffer
+)
+from utils.lazy_import import lazy_import
+from utils.metrics import collect_stage_timings, observe_stages
+
+cv2 = lazy_import("cv2")
+
+
+def _init_worker():
+    """Configure a freshly spawned worker process."""
+    # Parallelism comes from the pool; per-call OpenCV threads would oversubscribe cores
+    cv2.setNumThreads(1)
+
+    # Workers only attach to segments the parent creates and unlinks. Keep them out of
+    # the resource tracker, which would otherwise unlink them when a worker exits.
+    register = resource_tracker.register
+
+    def register_except_shared_memory(name, rtype):
+        if rtype != "shared_memory":
+            register(name, rtype)
+
+    resource_tracker.register = register_except_shared_memory
+
+
+def analyze_image(
+    image: ImageInput,
+    max_size: Tuple[int, int] = ANALYSIS_IMAGE_SIZE,
+    quality: Optional[str] = None,
+    tiled: Optional[bool] = None
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Run the analysis pipeline in the calling thread.
+
+    Args:
+        image: Image to analyze
+        max_size: Size the image is resized to fit
+        quality: Resize quality mode, see ImageBuffer.resize
+        tiled: Detect cracks over full-resolution tiles; defaults to IMAGE_TILED_ANALYSIS
+
+    Returns:
+        Tuple of (cv_issues, base64 JPEG for the vision API)
+    """
+    if tiled is None:
+        tiled = TILED_ANALYSIS
+
+    buffer = to_image_buffer(image)
+
+    # Tiles see the original resolution, so they run before the resize
+    tiled_issues = detect_issues_tiled(buffer.gray) if tiled else None
+
+    buffer.resize(max_size, quality).enhance()
+    issues = buffer.detect_issues()
+
+    if tiled_issues:
+        issues.update(tiled_issues)
+
+    return issues, buffer.encode_jpeg()
+
+
+def _warmup_image() -> ImageBuffer:
+    """Decode a small gray JPEG, loading OpenCV in the calling process."""
+    data = io.BytesIO()
+    Image.new("RGB", (64, 64), (128, 128, 128)).save(data, format="JPEG")
+    return ImageBuffer.from_bytes(data.getvalue())
+
+
+def _analyze_shared(
+    name: str,
+    shape: Tuple[int, ...],
+    max_size: Tuple[int, int],
+    quality: Optional[str],
+    tiled: Optional[bool]
+) -> Tuple[Dict[str, Any], str, List[Tuple[str, float]]]:
+    """
+    Worker entry point: analyze pixels held in a shared memory segment.
+
+    Stage timings are returned with the result because metrics recorded in
+    the worker process never reach the server's /metrics.
+    """
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        with collect_stage_timings() as timings:
+            issues, encoded = analyze_image(ImageBuffer(np.ndarray(shape, dtype=np.uint8, buffer=segment.buf)), max_size, quality, tiled)
+        return issues, encoded, timings
+    finally:
+        try:
+            segment.close()
+        except BufferError:
+            # A failed analysis can leave views alive in its traceback; they are released with it
+            pass
+
+
+class CVWorkerPool:
+    """
+    Managed process pool behind an async analysis API.
+
+    The pool is started lazily on first use. Setting CV_POOL_WORKERS=0 disables
+    it, and analysis then runs in a thread of the calling process instead.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, task_timeout: Optional[float] = None):
+        """Initialize the pool, reading unset limits from the environment."""
+        if max_workers is None:
+            max_workers = int(os.getenv("CV_POOL_WORKERS", str(os.cpu_count() or 1)))
+        self.max_workers = max_workers
+        self.task_timeout = task_timeout or float(os.getenv("CV_TASK_TIMEOUT_SECONDS", "10"))
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def analyze(
+        self,
+        image: ImageInput,
+        max_size: Tuple[int, int] = ANALYSIS_IMAGE_SIZE,
+        quality: Optional[str] = None,
+        tiled: Optional[bool] = None
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Analyze an image in a worker process.
+
+        Args:
+            image: Image to analyze
+            max_size: Size the image is resized to fit
+            quality: Resize quality mode, see ImageBuffer.resize
+            tiled: Detect cracks over full-resolution tiles; defaults to IMAGE_TILED_ANALYSIS
+
+        Returns:
+            Tuple of (cv_issues, base64 JPEG for the vision API)
+
+        Raises:
+            asyncio.TimeoutError: If the task does not finish within task_timeout
+        """
+        self._record_start()
+        try:
+            if self.max_workers <= 0:
+                result = await asyncio.wait_for(
+                    asyncio.to_thread(analyze_image, image, max_size, quality, tiled),
+                    self.task_timeout
+                )
+            else:
+                result = await self._analyze_in_pool(to_image_buffer(image).bgr, max_size, quality, tiled)
+        except asyncio.TimeoutError:
+            self._record_end(timeout=True)
+            raise
+        except Exception:
+            self._record_end(failed=True)
+            raise
+
+        self._record_end()
+        return result
+
+    async def _analyze_in_pool(
+        self,
+        pixels: np.ndarray,
+        max_size: Tuple[int, int],
+        quality: Optional[str],
+        tiled: Optional[bool]
+    ) -> Tuple[Dict[str, Any], str]:
+        """Hand pixels to a worker through shared memory and await the result."""
+        # Filling a fresh segment page-faults in every page; keep that off the event loop
+        segment, future = await asyncio.to_thread(self._submit_shared, pixels, max_size, quality, tiled)
+        try:
+            issues, encoded, timings = await asyncio.wait_for(asyncio.wrap_future(future), self.task_timeout)
+            observe_stages(timings)
+            return issues, encoded
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise
+        finally:
+            # A worker still running after a timeout keeps its own mapping; unlinking only drops the name
+            segment.close()
+            segment.unlink()
+
+    def _submit_shared(self, pixels: np.ndarray, max_size: Tuple[int, int], quality: Optional[str], tiled: Optional[bool]):
+        """Copy pixels into a new shared segment and submit the analysis task."""
+        segment = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+        try:
+            np.ndarray(pixels.shape, dtype=np.uint8, buffer=segment.buf)[...] = pixels
+            future = self._get_executor().submit(_analyze_shared, segment.name, pixels.shape, max_size, quality, tiled)
+        except BaseException:
+            segment.close()
+            segment.unlink()
+            raise
+
+        return segment, future
+
+    async def warm(self):
+        """
+        Load OpenCV and start the workers before the first image arrives.
+
+        A tiny JPEG is decoded in this process, as uploads are, then analyzed
+        once per worker so every worker is spawned and has imported OpenCV.
+        Warm-up runs are not counted in the task stats.
+        """
+        image = await asyncio.to_thread(_warmup_image)
+
+        if self.max_workers <= 0:
+            await asyncio.to_thread(analyze_image, image)
+        else:
+            await asyncio.gather(*(
+                self._analyze_in_pool(image.bgr, ANALYSIS_IMAGE_SIZE, None, None)
+                for _ in range(self.max_workers)
+            ))
+
+    def stats(self) -> Dict[str, Any]:
+        """Report pool size, queue depth and task outcomes."""
+        with self._lock:
+            workers = max(self.max_workers, 0)
+            return {
+                "workers": workers,
+                "started": self._executor is not None,
+                "task_timeout": self.task_timeout,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - workers) if workers else 0,
+                "peak_in_flight": self.peak_in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts
+            }
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the server process runs threads that must not be forked mid-lock
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        """Drop a broken executor so the next task starts fresh workers."""
+        print("CV worker pool broke; restarting workers on next task")
+        self.shutdown()
+
+    def _record_start(self):
+        with self._lock:
+            self.submitted += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _record_end(self, failed: bool = False, timeout: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if timeout:
+                self.timeouts += 1
+            elif failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+
+_pool: Optional[CVWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_cv_pool() -> CVWorkerPool:
+    """Return the process-wide CV worker pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CVWorkerPool()
+        return _pool
+
+
+async def analyze_image_async(
+    image: ImageInput,
+    max_size: Tuple[int, int] = ANALYSIS_IMAGE_SIZE,
+    quality: Optional[str] = None,
+    tiled: Optional[bool] = None
+) -> Tuple[Dict[str, Any], str]:
+    """Analyze an image on the shared worker pool. See CVWorkerPool.analyze."""
+    return await get_cv_pool().analyze(image, max_size, quality, tiled)
@@ -0,0 +1,255 @@
+"""
+Semantic answer cache for tenancy questions.
+
+Tenancy questions repeat with small wording changes ("can my landlord raise
+my rent" / "can the landlord increase the rent"), and each one would otherwise
+pay for a full GPT-4 answer. Questions are embedded with the same hashed
+n-gram featurizer the routing classifier uses, after dropping filler words and
+mapping FAQ topic synonyms onto one word. Each normalized location keeps its
+own NumPy matrix of question vectors, so a lookup is one matrix-vector product
+against the answers given for that jurisdiction.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from utils.keyword_matcher import split_words
+from utils.prompts import FAQ_TOPIC_KEYWORDS
+from utils.text_features import hashed_ngrams
+
+
+# Words that change the phrasing but not the question. Negations and
+# question words (how, when, why...) are deliberately kept.
+STOPWORDS = frozenset("""
+    a an the my our your their his her its i we you they me us them
+    is are was were be been am do does did can could would should will shall may might must
+    to of in on at for from by with about as and or so that this these those it
+    any some just get got please
+""".split())
+
+# Topic keywords mapped to their topic, so "raise" and "increase" embed alike
+TOPIC_SYNONYMS = {keyword: topic for topic, keywords in FAQ_TOPIC_KEYWORDS.items() for keyword in keywords}
+
+# Apostrophes are dropped rather than split on, so "won't" and "wont" are one word
+_APOSTROPHES = str.maketrans("", "", "'\u2019")
+
+DEFAULT_N_FEATURES = 1024
+
+
+@dataclass
+class CachedFAQAnswer:
+    """A model answer, without disclaimer, for one question in one location."""
+    question: str
+    location_key: str
+    answer: str
+    topics: Tuple[str, ...]
+    created_at: float = field(default_factory=time.time)
+
+
+def normalize_location(location: Optional[str]) -> str:
+    """Lowercase and strip punctuation, so "Toronto, ON" and "toronto on" share an index."""
+    return " ".join(split_words(location or ""))
+
+
+def normalize_question(question: str) -> str:
+    """Drop filler words and map topic synonyms onto their topic."""
+    return " ".join(
+        TOPIC_SYNONYMS.get(word, word)
+        for word in split_words((question or "").translate(_APOSTROPHES))
+        if word not in STOPWORDS
+    )
+
+
+def embed_question(question: str, n_features: int = DEFAULT_N_FEATURES) -> np.ndarray:
+    """L2-normalized hashed unigrams and bigrams of the normalized question."""
+    return hashed_ngrams(normalize_question(question), n_features, (1, 2))
+
+
+class _LocationIndex:
+    """Question vectors and answers for one location, row i of the matrix belonging to entries[i]."""
+
+    def __init__(self, n_features: int):
+        self.vectors = np.zeros((0, n_features), dtype=np.float32)
+        self.entries: List[CachedFAQAnswer] = []
+
+    def keep(self, mask: np.ndarray) -> int:
+        """Keep only the rows where mask is True; return how many were dropped."""
+        dropped = len(self.entries) - int(mask.sum())
+        if dropped:
+            self.vectors = self.vectors[mask]
+            self.entries = [entry for entry, kept in zip(self.entries, mask) if kept]
+        return dropped
+
+
+class FAQAnswerCache:
+    """
+    TTL cache of FAQ answers with one similarity index per location.
+
+    A lookup embeds the question and returns the most similar unexpired answer
+    for the same normalized location if its cosine similarity reaches the
+    threshold. Answers for different jurisdictions never mix.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: Optional[float] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries_per_location: Optional[int] = None,
+        n_features: int = DEFAULT_N_FEATURES,
+        enabled: Optional[bool] = None
+    ):
+        """Initialize the cache, reading unset limits from the environment."""
+        self.similarity_threshold = similarity_threshold or float(os.getenv("FAQ_CACHE_SIMILARITY", "0.8"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("FAQ_CACHE_TTL_SECONDS", "604800"))
+        self.max_entries_per_location = max_entries_per_location or int(os.getenv("FAQ_CACHE_MAX_ENTRIES", "512"))
+        if enabled is None:
+            enabled = os.getenv("FAQ_CACHE_ENABLED", "true").lower() == "true"
+        self.enabled = enabled
+        self.n_features = n_features
+
+        self._indexes: Dict[str, _LocationIndex] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidated = 0
+
+    def get(self, question: str, location: Optional[str]) -> Optional[CachedFAQAnswer]:
+        """
+        Look up a cached answer.
+
+        Args:
+            question: User's tenancy question
+            location: User's location, or None for answers given without one
+
+        Returns:
+            The most similar cached answer, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        vector = embed_question(question, self.n_features)
+
+        with self._lock:
+            index = self._indexes.get(normalize_location(location))
+            if index is not None:
+                self._expire_locked(index, time.time())
+
+            if index is None or not index.entries or not vector.any():
+                self.misses += 1
+                return None
+
+            similarities = index.vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if similarities[best] >= 0.999:
+                self.exact_hits += 1
+            return index.entries[best]
+
+    def put(self, question: str, location: Optional[str], answer: str, topics: Tuple[str, ...] = ()):
+        """
+        Store an answer, replacing a cached answer to the same question.
+
+        The oldest entries of the location are evicted beyond max_entries_per_location.
+        """
+        if not self.enabled or not answer:
+            return
+
+        vector = embed_question(question, self.n_features)
+        if not vector.any():
+            return
+
+        location_key = normalize_location(location)
+        entry = CachedFAQAnswer(question, location_key, answer, tuple(topics))
+
+        with self._lock:
+            index = self._indexes.setdefault(location_key, _LocationIndex(self.n_features))
+            self._expire_locked(index, entry.created_at)
+
+            if index.entries:
+                index.keep(index.vectors @ vector < self.similarity_threshold)
+
+            index.vectors = np.vstack([index.vectors, vector[None, :]])
+            index.entries.append(entry)
+
+            overflow = len(index.entries) - self.max_entries_per_location
+            if overflow > 0:
+                mask = np.ones(len(index.entries), dtype=bool)
+                mask[:overflow] = False
+                self.evictions += index.keep(mask)
+
+    def invalidate(self, location: Optional[str] = None, topic: Optional[str] = None) -> int:
+        """
+        Drop cached answers, e.g. after a law change.
+
+        Args:
+            location: Only drop answers for this location; all locations if None
+            topic: Only drop answers touching this FAQ topic (see FAQ_TOPIC_KEYWORDS)
+
+        Returns:
+            Number of answers dropped
+        """
+        with self._lock:
+            if location is None:
+                location_keys = list(self._indexes)
+            else:
+                location_keys = [normalize_location(location)]
+
+            dropped = 0
+            for location_key in location_keys:
+                index = self._indexes.get(location_key)
+                if index is None:
+                    continue
+                if topic is None:
+                    dropped += len(index.entries)
+                    del self._indexes[location_key]
+                else:
+                    dropped += index.keep(np.array([topic not in entry.topics for entry in index.entries], dtype=bool))
+                    if not index.entries:
+                        del self._indexes[location_key]
+
+            self.invalidated += dropped
+            return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """Report size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": sum(len(index.entries) for index in self._indexes.values()),
+                "locations": len(self._indexes),
+                "similarity_threshold": self.similarity_threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries_per_location": self.max_entries_per_location,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidated": self.invalidated
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(index.entries) for index in self._indexes.values())
+
+    def _expire_locked(self, index: _LocationIndex, now: float):
+        """Drop entries older than the TTL; entries are in insertion order, so only a prefix can expire."""
+        expired = 0
+        while expired < len(index.entries) and now - index.entries[expired].created_at > self.ttl_seconds:
+            expired += 1
+        if expired:
+            mask = np.ones(len(index.entries), dtype=bool)
+            mask[:expired] = False
+            self.evictions += index.keep(mask)
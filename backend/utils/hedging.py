@@ -0,0 +1,220 @@
+"""
+Hedged requests for short LLM calls.
+
+Most router and FAQ completions arrive in a second or two, but now and then
+one upstream call stalls for many times that and sets the p99. A hedger
+remembers how long the agent's recent calls took. When a call has not
+answered by a high percentile of that (the hedge delay), it sends the same
+request once more and uses whichever answer arrives first. The other one
+is cancelled.
+
+Hedges are paid for from a budget: every call earns a fraction of a hedge
+(LLM_HEDGE_BUDGET, default 0.1, so at most about 10% extra calls), and a
+hedge that finds no credit left is not sent. With the default 95th
+percentile about 5% of calls are due a hedge; the headroom keeps a burst
+of slow calls from using up the budget before the stalled ones come.
+Callers also veto hedges while the upstream is congested, when duplicates
+would only make it worse.
+
+The losing attempt was still sent and billed, so callers are told about it
+and charge its tokens to the request, as for a cancelled speculative call.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Callable, Awaitable, TypeVar
+
+from utils.metrics import LLM_HEDGE_TOTAL, LLM_HEDGE_DELAY
+
+
+T = TypeVar("T")
+
+
+def _retrieve(task: asyncio.Task):
+    """Mark a losing attempt's error as seen, so asyncio does not log it."""
+    if not task.cancelled():
+        task.exception()
+
+
+class RequestHedger:
+    """
+    Latency-percentile request hedging with a budget, for one agent.
+
+    Settings come from the environment: LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_BUDGET, LLM_HEDGE_MAX_BURST, LLM_HEDGE_MIN_SAMPLES and
+    LLM_HEDGE_WINDOW_CALLS.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: Optional[float] = None,
+        budget: Optional[float] = None,
+        max_burst: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        window_calls: Optional[int] = None
+    ):
+        """Initialize the hedger, reading unset settings from the environment."""
+        self.name = name
+        self.percentile = percentile or float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+        self.budget = budget or float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+        self.max_burst = max_burst or float(os.getenv("LLM_HEDGE_MAX_BURST", "5"))
+        self.min_samples = min_samples or int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        window_calls = window_calls or int(os.getenv("LLM_HEDGE_WINDOW_CALLS", "200"))
+
+        # Durations of recent attempts, hedges included
+        self._latencies: deque = deque(maxlen=window_calls)
+        self._credits = 0.0
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.fired = 0
+        self.won = 0
+        self.denied = 0
+        self.wasted_tokens = 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging: the configured percentile of recent latency, None until enough calls."""
+        with self._lock:
+            return self._delay_locked()
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        can_hedge: Callable[[], bool],
+        on_loser: Optional[Callable[[T, Optional[T]], int]] = None
+    ) -> T:
+        """
+        Make a call, hedging it if it is slower than the hedge delay.
+
+        Args:
+            call: Starts one attempt; called again for the hedge
+            can_hedge: Whether a hedge may be sent right now, asked only when one is due
+            on_loser: Charges the losing attempt of a hedged call; called with the winning
+                result and the loser's result, or None if the loser is being cancelled.
+                Returns the tokens charged. Losers that failed are not charged
+
+        Returns:
+            The first successful attempt's result; if both fail, the original call's error
+        """
+        with self._lock:
+            self.calls += 1
+            self._credits = min(self.max_burst, self._credits + self.budget)
+            delay = self._delay_locked()
+
+        primary = self._attempt(call)
+        tasks = [primary]
+        outcome = None
+        try:
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+            if primary.done() or delay is None:
+                outcome = "primary"
+                return await primary
+
+            if not (can_hedge() and self._spend()):
+                outcome = "denied"
+                return await primary
+
+            tasks.append(self._attempt(call))
+            winner = await self._first_success(tasks)
+            outcome = "won" if winner is not primary else "lost"
+            if on_loser is not None:
+                self._charge_loser(on_loser, winner.result(), tasks[1] if winner is primary else primary)
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            if outcome is not None:
+                self._count(outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        """Report the hedge delay, how often hedges fired and how often they beat the original call."""
+        with self._lock:
+            delay = self._delay_locked()
+            return {
+                "delay_seconds": None if delay is None else round(delay, 3),
+                "percentile": self.percentile,
+                "budget": self.budget,
+                "credits": round(self._credits, 2),
+                "calls": self.calls,
+                "fired": self.fired,
+                "won": self.won,
+                "denied": self.denied,
+                "wasted_tokens": self.wasted_tokens,
+                "fire_rate": round(self.fired / self.calls, 4) if self.calls else 0.0,
+                "win_rate": round(self.won / self.fired, 4) if self.fired else 0.0
+            }
+
+    def _attempt(self, call: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        """Start one attempt as a task that records its duration when it succeeds or is cancelled."""
+        async def timed() -> T:
+            start = time.perf_counter()
+            try:
+                result = await call()
+            except asyncio.CancelledError:
+                # A losing attempt took at least this long; leaving it out would bias the delay low
+                self._observe(time.perf_counter() - start)
+                raise
+            self._observe(time.perf_counter() - start)
+            return result
+
+        task = asyncio.ensure_future(timed())
+        task.add_done_callback(_retrieve)
+        return task
+
+    async def _first_success(self, tasks: list) -> asyncio.Task:
+        """Wait for the first attempt to succeed; raise the original call's error if none does."""
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Prefer the original call if both finished in the same iteration
+            for task in sorted(done, key=tasks.index):
+                if task.exception() is None:
+                    return task
+        raise tasks[0].exception()
+
+    def _charge_loser(self, on_loser: Callable[[T, Optional[T]], int], result: T, loser: asyncio.Task):
+        """Charge the attempt that lost, unless it failed."""
+        if not loser.done():
+            tokens = on_loser(result, None)
+        elif loser.exception() is None:
+            tokens = on_loser(result, loser.result())
+        else:
+            return
+        with self._lock:
+            self.wasted_tokens += tokens
+
+    def _spend(self) -> bool:
+        """Take one hedge's worth of budget, if there is one."""
+        with self._lock:
+            if self._credits < 1:
+                return False
+            self._credits -= 1
+            return True
+
+    def _observe(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _delay_locked(self) -> Optional[float]:
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def _count(self, outcome: str):
+        with self._lock:
+            if outcome in ("won", "lost"):
+                self.fired += 1
+                self.won += outcome == "won"
+            elif outcome == "denied":
+                self.denied += 1
+            delay = self._delay_locked()
+        LLM_HEDGE_TOTAL.labels(self.name, outcome).inc()
+        if delay is not None:
+            LLM_HEDGE_DELAY.labels(self.name).set(delay)
@@ -0,0 +1,194 @@
+"""
+Rolling-summary compaction for per-agent session memories.
+
+Each agent's memory keeps its last few exchanges verbatim. Older exchanges
+are folded into a rolling summary by a background worker, so building a
+prompt never waits on summarization and the history handed to an agent
+stays within its token budget however long the session runs. Summaries
+cost a model call each, so they are only written for agents given a token
+budget (HISTORY_TOKEN_BUDGET_<AGENT>), i.e. agents whose prompt carries
+their history. The other memories just drop their old turns.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Set, Tuple, TYPE_CHECKING
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+
+if TYPE_CHECKING:
+    from utils.session_store import SessionStore
+
+
+# Environment prefix for the tokens of history (summary plus recent turns) an agent's prompt
+# may carry, e.g. HISTORY_TOKEN_BUDGET_TENANCY_FAQ=1200. No prompt carries history today, so
+# no agent has a budget by default and every memory keeps only its verbatim tail.
+TOKEN_BUDGET_ENV_PREFIX = "HISTORY_TOKEN_BUDGET_"
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a tenant and a real estate assistant.
+Merge the new exchanges into the existing summary. Keep facts that matter for later questions:
+the user's location, the property, the dispute or issue, dates, amounts, notices served and advice already given.
+Write plain prose, at most {max_words} words.
+
+Existing summary:
+{summary}
+
+New exchanges:
+{exchanges}
+
+Updated summary:"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+class HistoryCompactor:
+    """
+    Keeps agent memories to a verbatim tail plus a rolling summary.
+
+    After every exchange, entries older than the last keep_turns exchanges are
+    moved to a pending list. If the agent has a token budget, a summary refresh
+    is queued on a single background thread; until it lands, pending entries
+    are still offered to prompts as long as the budget allows. Otherwise the
+    pending entries are dropped.
+
+    Settings come from the environment when not given: HISTORY_KEEP_TURNS,
+    HISTORY_SUMMARY_MAX_TOKENS and HISTORY_TOKEN_BUDGET_<AGENT>.
+    """
+
+    def __init__(
+        self,
+        store: "SessionStore",
+        llm: Optional[BaseChatModel] = None,
+        keep_turns: Optional[int] = None,
+        token_budgets: Optional[Dict[str, int]] = None,
+        summary_tokens: Optional[int] = None
+    ):
+        """
+        Initialize the compactor.
+
+        Args:
+            store: Session store holding the memories
+            llm: Model that writes summaries; without one, old turns are dropped instead
+            keep_turns: Exchanges kept verbatim per agent
+            token_budgets: History token budget per agent name
+            summary_tokens: Maximum summary length in tokens
+        """
+        self.store = store
+        self.llm = llm
+        self.keep_turns = keep_turns or int(os.getenv("HISTORY_KEEP_TURNS", "3"))
+        self.summary_tokens = summary_tokens or int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "250"))
+        self.token_budgets = token_budgets or {
+            name[len(TOKEN_BUDGET_ENV_PREFIX):].lower(): int(value)
+            for name, value in os.environ.items()
+            if name.startswith(TOKEN_BUDGET_ENV_PREFIX)
+        }
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+        self._scheduled: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self.summaries = 0
+        self.failures = 0
+
+    def after_exchange(self, session_id: str, agent: str):
+        """Fold exchanges beyond the verbatim tail, queueing a summary refresh if the agent has a budget."""
+        pending = self.store.fold_memory(session_id, agent, 2 * self.keep_turns)
+        if not pending:
+            return
+
+        if self.llm is None or agent not in self.token_budgets:
+            self.store.apply_summary(session_id, agent, None, pending)
+            return
+
+        self._schedule(session_id, agent)
+
+    def context(self, session_id: str, agent: str) -> List[BaseMessage]:
+        """
+        History for an agent's prompt: the summary, then the newest entries that fit the budget.
+
+        Args:
+            session_id: Session identifier
+            agent: Agent name, used to pick the token budget
+
+        Returns:
+            Messages in chronological order
+        """
+        summary, pending, recent = self.store.get_compacted_memory(session_id, agent)
+        budget = self.token_budgets.get(agent, 0)
+
+        messages: List[BaseMessage] = []
+        if summary:
+            summary_message = SystemMessage(content=f"Summary of the earlier conversation: {summary}")
+            budget -= estimate_tokens(summary_message.content)
+
+        kept: List[BaseMessage] = []
+        for entry in reversed(pending + recent):
+            cost = estimate_tokens(entry["content"])
+            if cost > budget:
+                break
+            budget -= cost
+            kept.append(HumanMessage(content=entry["content"]) if entry["role"] == "human" else AIMessage(content=entry["content"]))
+
+        if summary:
+            messages.append(summary_message)
+        messages.extend(reversed(kept))
+        return messages
+
+    def stats(self) -> Dict[str, Any]:
+        """Report summary refreshes and queue state."""
+        with self._lock:
+            return {
+                "keep_turns": self.keep_turns,
+                "token_budgets": dict(self.token_budgets),
+                "summaries": self.summaries,
+                "failures": self.failures,
+                "queued": len(self._scheduled)
+            }
+
+    def shutdown(self):
+        """Stop the background worker, dropping queued refreshes."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self, session_id: str, agent: str):
+        key = (session_id, agent)
+        with self._lock:
+            if key in self._scheduled:
+                # The queued refresh picks up everything pending when it runs
+                return
+            self._scheduled.add(key)
+        self._executor.submit(self._refresh_summary, session_id, agent)
+
+    def _refresh_summary(self, session_id: str, agent: str):
+        """Fold the pending entries into the summary (runs on the background thread)."""
+        key = (session_id, agent)
+        with self._lock:
+            self._scheduled.discard(key)
+
+        summary, pending = self.store.pending_memory(session_id, agent)
+        if not pending:
+            return
+
+        exchanges = "\n".join(
+            f"{'User' if entry['role'] == 'human' else 'Assistant'}: {entry['content']}" for entry in pending
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_tokens * 3 // 4,
+            summary=summary or "(none yet)",
+            exchanges=exchanges
+        )
+
+        try:
+            new_summary = self.llm.invoke(prompt).content.strip()
+        except Exception as e:
+            print(f"History summary refresh failed for session {session_id}: {e}")
+            with self._lock:
+                self.failures += 1
+            return
+
+        self.store.apply_summary(session_id, agent, new_summary, len(pending))
+        with self._lock:
+            self.summaries += 1
@@ -0,0 +1,168 @@
+"""
+Perceptual-hash cache for image issue analyses.
+
+Repeat uploads of the same photo, or a rescaled / recompressed copy of it,
+with the same question reuse the earlier CV results and vision answer
+instead of paying for the pipeline and a GPT-4o call again.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Set, Tuple
+
+from utils.keyword_matcher import split_words
+
+
+@dataclass
+class CachedImageAnalysis:
+    """A cached CV result and vision answer for one image and question."""
+    image_hash: int
+    text_key: str
+    cv_issues: Dict[str, bool]
+    analysis: str
+    created_at: float = field(default_factory=time.time)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip punctuation and extra whitespace so trivially different wordings share a key."""
+    return " ".join(split_words(text or ""))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+
+class ImageAnalysisCache:
+    """
+    LRU + TTL cache keyed by (perceptual image hash, normalized user text).
+
+    Exact hash matches are a dict lookup. Otherwise the entries sharing the
+    normalized text are scanned for a hash within max_distance bits, so
+    near-duplicate photos hit too.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_distance: Optional[int] = None
+    ):
+        """Initialize the cache, reading unset limits from the environment."""
+        self.max_entries = max_entries or int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "1024"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("IMAGE_CACHE_TTL_SECONDS", "86400"))
+        if max_distance is None:
+            max_distance = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "6"))
+        self.max_distance = max_distance
+
+        self._entries: "OrderedDict[Tuple[str, int], CachedImageAnalysis]" = OrderedDict()
+        self._hashes_by_text: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, image_hash: int, user_text: str) -> Optional[CachedImageAnalysis]:
+        """
+        Look up a cached analysis.
+
+        Args:
+            image_hash: Perceptual hash of the uploaded image
+            user_text: User's message sent with the image
+
+        Returns:
+            The cached analysis, or None on a miss
+        """
+        text_key = normalize_text(user_text)
+        now = time.time()
+
+        with self._lock:
+            entry = self._get_locked((text_key, image_hash), now)
+            if entry is not None:
+                self.hits += 1
+                return entry
+
+            candidates = sorted(
+                (hamming_distance(image_hash, cached_hash), cached_hash)
+                for cached_hash in self._hashes_by_text.get(text_key, ())
+            )
+            for distance, cached_hash in candidates:
+                if distance > self.max_distance:
+                    break
+                entry = self._get_locked((text_key, cached_hash), now)
+                if entry is not None:
+                    self.hits += 1
+                    self.near_hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, image_hash: int, user_text: str, cv_issues: Dict[str, bool], analysis: str):
+        """Store an analysis, evicting the least recently used entries beyond max_entries."""
+        text_key = normalize_text(user_text)
+        key = (text_key, image_hash)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+
+            self._entries[key] = CachedImageAnalysis(image_hash, text_key, dict(cv_issues), analysis)
+            self._hashes_by_text.setdefault(text_key, set()).add(image_hash)
+
+            while len(self._entries) > self.max_entries:
+                self._remove_locked(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._hashes_by_text.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Report size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _get_locked(self, key: Tuple[str, int], now: float) -> Optional[CachedImageAnalysis]:
+        """Look up an entry, dropping it if expired and marking it recently used."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if now - entry.created_at > self.ttl_seconds:
+            self._remove_locked(key)
+            self.evictions += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove_locked(self, key: Tuple[str, int]):
+        """Remove an entry and its text index slot."""
+        del self._entries[key]
+        hashes = self._hashes_by_text.get(key[0])
+        if hashes is not None:
+            hashes.discard(key[1])
+            if not hashes:
+                del self._hashes_by_text[key[0]]
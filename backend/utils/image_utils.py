@@ -1,63 +1,348 @@
-import cv2
 import numpy as np
 from PIL import Image
 import base64
 import io
-from typing import Tuple, Optional
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, List, Tuple, Optional, Union
+
+from utils.lazy_import import lazy_import
+from utils.metrics import timed_stage
+
+# Loaded on first use, so text-only workers never pay for OpenCV
+cv2 = lazy_import("cv2")
+
+# OpenCV flag names, resolved when first used
+RESIZE_INTERPOLATION = {
+    "fast": "INTER_AREA",
+    "lanczos": "INTER_LANCZOS4"
+}
+
+DEFAULT_RESIZE_QUALITY = os.getenv("IMAGE_RESIZE_QUALITY", "lanczos")
+
+# Images are analyzed and sent to the vision model at most this size
+ANALYSIS_IMAGE_SIZE = (1024, 1024)
+
+# Opt-in crack detection over overlapping tiles of the original-resolution image
+TILED_ANALYSIS = os.getenv("IMAGE_TILED_ANALYSIS", "false").lower() == "true"
+TILE_SIZE = 1024
+TILE_OVERLAP = 64
+
+
+class ImageBuffer:
+    """
+    A decoded image held as one BGR ndarray through the whole analysis pipeline.
+
+    Upload bytes are decoded once, then resized, enhanced, analyzed and encoded
+    in place. The grayscale and LAB planes are computed at most once per pixel
+    state and shared by every stage that needs them.
+    """
+
+    def __init__(self, bgr: np.ndarray):
+        """
+        Wrap a BGR uint8 array.
+
+        Args:
+            bgr: Array of shape (height, width, 3)
+        """
+        self.bgr = bgr
+        self._gray: Optional[np.ndarray] = None
+        self._lab: Optional[np.ndarray] = None
+
+    @classmethod
+    @timed_stage("image_decode")
+    def from_bytes(cls, data: bytes, max_size: Optional[Tuple[int, int]] = None) -> "ImageBuffer":
+        """
+        Decode encoded image bytes straight into a BGR array.
+
+        Args:
+            data: Encoded image (JPEG, PNG, WebP, ...)
+            max_size: If given, decode at the largest reduced scale (1/2, 1/4, 1/8)
+                that still covers this size after a later resize()
+
+        Returns:
+            ImageBuffer holding the decoded pixels
+        """
+        flags = _reduced_decode_flag(data, max_size) if max_size else cv2.IMREAD_COLOR
+        bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+        if bgr is None:
+            # Formats OpenCV cannot decode (e.g. GIF) go through PIL once
+            return cls.from_pil(Image.open(io.BytesIO(data)))
+
+        return cls(bgr)
+
+    @classmethod
+    @timed_stage("image_decode")
+    def from_file(cls, file: BinaryIO, max_size: Optional[Tuple[int, int]] = None) -> "ImageBuffer":
+        """
+        Decode an image from a (spooled) file object at reduced scale.
+
+        The compressed bytes are never copied: OpenCV decodes from the buffer
+        of an in-memory spool, or from a read-only mmap of one rolled over to
+        disk. JPEGs are decoded by libjpeg at the largest DCT scale (1/2, 1/4,
+        1/8) that still covers max_size, so a 12 MP photo is never
+        materialized at full resolution.
+
+        Args:
+            file: Binary file positioned at the start of the image
+            max_size: Size the image will later be resized to fit
+
+        Returns:
+            ImageBuffer holding the decoded pixels
+        """
+        start = file.tell()
+        flags = _reduced_decode_flag(file, max_size) if max_size else cv2.IMREAD_COLOR
+        file.seek(start)
+
+        with _file_view(file) as view:
+            if view is None:
+                data = file.read()
+                view = memoryview(data)
+            encoded = np.frombuffer(view, dtype=np.uint8)[start:]
+            bgr = cv2.imdecode(encoded, flags) if encoded.size else None
+            # The view cannot be released while an array still points into it
+            del encoded
+
+        if bgr is None:
+            file.seek(start)
+            return cls.from_pil(Image.open(file))
+
+        return cls(bgr)
+
+    @classmethod
+    def from_pil(cls, image: Image.Image) -> "ImageBuffer":
+        """Convert a PIL image into an ImageBuffer."""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        pixels = np.array(image)
+        cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR, dst=pixels)
+
+        return cls(pixels)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Image size as (width, height)."""
+        height, width = self.bgr.shape[:2]
+        return width, height
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Grayscale plane of the current pixels, computed once."""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def lab(self) -> np.ndarray:
+        """LAB representation of the current pixels, computed once."""
+        if self._lab is None:
+            self._lab = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2LAB)
+        return self._lab
+
+    @timed_stage("image_resize")
+    def resize(self, max_size: Tuple[int, int] = ANALYSIS_IMAGE_SIZE, quality: Optional[str] = None) -> "ImageBuffer":
+        """
+        Shrink the image to fit within max_size, preserving aspect ratio.
+
+        Args:
+            max_size: Maximum dimensions (width, height)
+            quality: "fast" (area averaging) or "lanczos"; defaults to IMAGE_RESIZE_QUALITY
+
+        Returns:
+            self, for chaining
+        """
+        width, height = self.size
+        scale = min(max_size[0] / width, max_size[1] / height)
+
+        if scale < 1:
+            target = (max(1, round(width * scale)), max(1, round(height * scale)))
+            interpolation = getattr(cv2, RESIZE_INTERPOLATION.get(quality or DEFAULT_RESIZE_QUALITY, "INTER_LANCZOS4"))
+            self._set_pixels(cv2.resize(self.bgr, target, interpolation=interpolation))
+
+        return self
+
+    @timed_stage("image_enhance")
+    def enhance(self) -> "ImageBuffer":
+        """
+        Apply CLAHE to the lightness channel in place.
+
+        Returns:
+            self, for chaining
+        """
+        lab = self.lab
+
+        lightness = np.ascontiguousarray(lab[:, :, 0])
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        clahe.apply(lightness, dst=lightness)
+        lab[:, :, 0] = lightness
+
+        cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=self.bgr)
+        self._gray = None
+
+        return self
+
+    @timed_stage("image_dhash")
+    def dhash(self, hash_size: int = 8) -> int:
+        """Perceptual difference hash of the current pixels. See image_dhash."""
+        return image_dhash(self.bgr, hash_size)
+
+    @timed_stage("image_detect")
+    def detect_issues(self) -> dict:
+        """Run basic issue detection on the current pixels. See detect_image_issues."""
+        return _detect_issues_from_gray(self.gray)
+
+    @timed_stage("image_encode")
+    def encode_jpeg(self, quality: int = 85) -> str:
+        """Encode the current pixels as a base64 JPEG string for the OpenAI API."""
+        ok, encoded = cv2.imencode(".jpg", self.bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("Failed to encode image as JPEG")
+        return base64.b64encode(encoded).decode('utf-8')
+
+    def to_pil(self) -> Image.Image:
+        """Convert the current pixels to a PIL image."""
+        return Image.fromarray(cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB))
+
+    def _set_pixels(self, bgr: np.ndarray):
+        """Replace the pixel array and drop derived planes."""
+        self.bgr = bgr
+        self._gray = None
+        self._lab = None
+
+
+def image_dhash(bgr: np.ndarray, hash_size: int = 8) -> int:
+    """
+    Compute a difference hash (dHash) of an image.
+
+    The image is shrunk to (hash_size + 1) x hash_size grayscale pixels and
+    each bit records whether a pixel is brighter than its right neighbour.
+    Rescaled, recompressed or slightly edited copies of a photo hash to the
+    same or nearby values.
+
+    Args:
+        bgr: BGR uint8 array
+        hash_size: Bits per row; the hash has hash_size ** 2 bits
+
+    Returns:
+        Hash as a non-negative integer
+    """
+    # Area-averaging over every pixel keeps the hash stable under noise and recompression
+    small = cv2.resize(bgr, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+REDUCED_DECODE_FLAGS = (
+    (8, "IMREAD_REDUCED_COLOR_8"),
+    (4, "IMREAD_REDUCED_COLOR_4"),
+    (2, "IMREAD_REDUCED_COLOR_2")
+)
+
+
+@contextmanager
+def _file_view(file: BinaryIO) -> Iterator[Optional[memoryview]]:
+    """
+    Zero-copy view of a file's whole contents, or None if it has none.
+
+    A SpooledTemporaryFile holds a BytesIO until it rolls over to a real
+    temp file; the first is viewed through its buffer, the second mapped.
+    """
+    inner = getattr(file, "_file", file)
+
+    if hasattr(inner, "getbuffer"):
+        view = inner.getbuffer()
+    else:
+        try:
+            view = memoryview(mmap.mmap(inner.fileno(), 0, access=mmap.ACCESS_READ))
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            # No file descriptor, or an empty file, which mmap refuses
+            view = None
+
+    try:
+        yield view
+    finally:
+        if view is not None:
+            obj = view.obj
+            view.release()
+            if isinstance(obj, mmap.mmap):
+                obj.close()
+
+
+def _reduced_decode_flag(data: Union[bytes, BinaryIO], max_size: Tuple[int, int]) -> int:
+    """Pick the cheapest imdecode flag whose output is still at least the final resize target."""
+    try:
+        # Only parses the header; pixels are not decoded
+        width, height = Image.open(data if hasattr(data, "read") else io.BytesIO(data)).size
+    except Exception:
+        return cv2.IMREAD_COLOR
+
+    scale = min(max_size[0] / width, max_size[1] / height)
+
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if factor * scale <= 1:
+            return getattr(cv2, flag)
+
+    return cv2.IMREAD_COLOR
+
+
+ImageInput = Union[ImageBuffer, Image.Image]
+
+
+def to_image_buffer(image: ImageInput) -> ImageBuffer:
+    """Return the image as an ImageBuffer, converting PIL images once."""
+    if isinstance(image, ImageBuffer):
+        return image
+    return ImageBuffer.from_pil(image)
+
+
+def encoded_image_size(encoded_image: str) -> Tuple[int, int]:
+    """(width, height) of a base64-encoded image, read from its header without decoding pixels."""
+    return Image.open(io.BytesIO(base64.b64decode(encoded_image))).size
+
 
 def preprocess_image(image: Image.Image, max_size: Tuple[int, int] = (1024, 1024)) -> Image.Image:
     """
     Preprocess image for AI analysis by resizing and optimizing.
-    
+
     Args:
         image: PIL Image object
         max_size: Maximum dimensions (width, height)
-    
+
     Returns:
         Preprocessed PIL Image
     """
     if image.mode != 'RGB':
         image = image.convert('RGB')
-    
+
     image.thumbnail(max_size, Image.Resampling.LANCZOS)
-    
+
     return image
 
 def enhance_image_for_analysis(image: Image.Image) -> Image.Image:
     """
     Enhance image quality for better issue detection.
-    
+
     Args:
         image: PIL Image object
-    
+
     Returns:
         Enhanced PIL Image
     """
-    # Convert PIL to OpenCV format
-    cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    
-    # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-    lab = cv2.cvtColor(cv_image, cv2.COLOR_BGR2LAB)
-    l_channel, a, b = cv2.split(lab)
-    
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    l_channel = clahe.apply(l_channel)
-    
-    lab = cv2.merge((l_channel, a, b))
-    enhanced = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
-    
-    # Convert back to PIL
-    enhanced_pil = Image.fromarray(cv2.cvtColor(enhanced, cv2.COLOR_BGR2RGB))
-    
-    return enhanced_pil
+    return ImageBuffer.from_pil(image).enhance().to_pil()
 
 def encode_image_for_openai(image: Image.Image) -> str:
     """
     Encode image to base64 string for OpenAI API.
-    
+
     Args:
         image: PIL Image object
-    
+
     Returns:
         Base64 encoded string
     """
@@ -69,55 +354,231 @@ def encode_image_for_openai(image: Image.Image) -> str:
 def detect_image_issues(image: Image.Image) -> dict:
     """
     Basic computer vision analysis to detect obvious issues.
-    
+
     Args:
         image: PIL Image object
-    
+
     Returns:
         Dictionary with detected issues
     """
-    cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    
+    return ImageBuffer.from_pil(image).detect_issues()
+
+def _detect_issues_from_gray(gray: np.ndarray) -> dict:
+    """Detect darkness, blur and crack-like lines from a grayscale plane."""
+
     issues = {
         "darkness": False,
         "blur": False,
         "moisture_indicators": False,
         "cracks_detected": False
     }
-    
+
     # Check for darkness
-    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-    mean_brightness = np.mean(gray)
+    mean_brightness = cv2.mean(gray)[0]
     issues["darkness"] = mean_brightness < 50
-    
-    # Check for blur
-    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-   
-    if laplacian_var > 1:       
+
+    # Check for blur (variance of the Laplacian, without numpy temporaries)
+    laplacian_var = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_64F))[1][0, 0] ** 2
+
+    if laplacian_var > 1:
         issues["blur"] = laplacian_var < 100
     else:
         issues["blur"] = False
-    
+
     edges = cv2.Canny(gray, 50, 150)
-    
+
     # Use Hough Line Transform to detect actual lines (potential cracks)
     lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=100, maxLineGap=10)
-    
-    edge_density = np.sum(edges > 0) / edges.size
-    
+
+    edge_density = cv2.countNonZero(edges) / edges.size
+
     if lines is not None and len(lines) > 3 and edge_density < 0.15:
         # Additional check: lines should be somewhat vertical or horizontal (typical crack patterns)
-        linear_cracks = 0
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            # Calculate angle
-            angle = np.arctan2(abs(y2 - y1), abs(x2 - x1)) * 180 / np.pi
-            # Count lines that are roughly vertical (0-30° or 60-90°) or horizontal (80-90°)
-            if angle < 30 or angle > 60:
-                linear_cracks += 1
-        
-        issues["cracks_detected"] = linear_cracks > 2
+        issues["cracks_detected"] = bool(np.count_nonzero(_linear_crack_mask(lines.reshape(-1, 4))) > 2)
     else:
         issues["cracks_detected"] = False
-    
-    return issues 
\ No newline at end of file
+
+    return issues
+
+
+def _linear_crack_mask(segments: np.ndarray) -> np.ndarray:
+    """
+    Flag segments that are roughly horizontal or vertical (typical crack patterns).
+
+    Args:
+        segments: Array of shape (n, 4) holding x1, y1, x2, y2
+
+    Returns:
+        Boolean array of shape (n,)
+    """
+    segments = segments.astype(np.float32)
+    angles = np.degrees(np.arctan2(np.abs(segments[:, 3] - segments[:, 1]), np.abs(segments[:, 2] - segments[:, 0])))
+
+    # Within 30° of horizontal or vertical
+    return (angles < 30) | (angles > 60)
+
+
+@timed_stage("image_tiled_detect")
+def detect_issues_tiled(
+    gray: np.ndarray,
+    tile_size: int = TILE_SIZE,
+    overlap: int = TILE_OVERLAP,
+    max_workers: Optional[int] = None
+) -> dict:
+    """
+    Detect crack-like lines over overlapping tiles of a full-resolution image.
+
+    Hairline cracks that vanish when the image is shrunk to 1024 px survive at
+    native resolution. Tiles are enhanced and analyzed in parallel threads
+    (OpenCV releases the GIL), then line segments are merged across tile
+    borders before the same crack rule as detect_image_issues is applied.
+
+    Args:
+        gray: Full-resolution grayscale plane
+        tile_size: Tile side in pixels
+        overlap: Pixels shared by neighbouring tiles; should exceed the Hough max line gap
+        max_workers: Threads to use; defaults to IMAGE_TILE_WORKERS or the CPU count
+
+    Returns:
+        Dictionary with "cracks_detected" and a "crack_heatmap" of per-tile scores in [0, 1]
+    """
+    height, width = gray.shape
+    step = tile_size - overlap
+    row_starts = _tile_starts(height, tile_size, step)
+    col_starts = _tile_starts(width, tile_size, step)
+    origins = [(y, x) for y in row_starts for x in col_starts]
+
+    workers = max_workers or int(os.getenv("IMAGE_TILE_WORKERS", str(os.cpu_count() or 1)))
+    with ThreadPoolExecutor(max_workers=min(workers, len(origins))) as executor:
+        results = list(executor.map(lambda origin: _analyze_tile(gray, origin, tile_size), origins))
+
+    segments = merge_line_segments(np.concatenate([result[0] for result in results]))
+    edge_density = sum(result[1] for result in results) / sum(result[2] for result in results)
+
+    linear = segments[_linear_crack_mask(segments)]
+
+    # Heatmap: length of linear segments attributed to the tile whose centre is nearest their midpoint
+    heat = np.zeros((len(row_starts), len(col_starts)), dtype=np.float64)
+    if len(linear):
+        midpoints = (linear[:, :2] + linear[:, 2:]) / 2
+        lengths = np.hypot(linear[:, 2] - linear[:, 0], linear[:, 3] - linear[:, 1])
+        rows = _nearest_tile(midpoints[:, 1], row_starts, tile_size)
+        cols = _nearest_tile(midpoints[:, 0], col_starts, tile_size)
+        np.add.at(heat, (rows, cols), lengths)
+        heat /= heat.max()
+
+    return {
+        "cracks_detected": bool(len(segments) > 3 and edge_density < 0.15 and len(linear) > 2),
+        "crack_heatmap": {
+            "grid": [len(row_starts), len(col_starts)],
+            "tile_size": tile_size,
+            "overlap": overlap,
+            "scores": np.round(heat, 3).tolist()
+        }
+    }
+
+
+def merge_line_segments(
+    segments: np.ndarray,
+    max_gap: float = 10,
+    angle_tolerance: float = 3.0,
+    offset_tolerance: float = 4.0
+) -> np.ndarray:
+    """
+    Merge collinear segments that overlap or nearly touch.
+
+    Segments are bucketed by direction and perpendicular offset, then joined
+    along their direction when the gap between them is at most max_gap. This
+    removes the duplicates found in tile overlaps and re-joins lines cut at
+    tile borders.
+
+    Args:
+        segments: Array of shape (n, 4) holding x1, y1, x2, y2
+        max_gap: Largest gap, in pixels, bridged between collinear segments
+        angle_tolerance: Direction bucket width in degrees
+        offset_tolerance: Perpendicular offset bucket width in pixels
+
+    Returns:
+        Array of shape (m, 4) with m <= n
+    """
+    if len(segments) < 2:
+        return segments.reshape(-1, 4).astype(np.float32)
+
+    start = segments[:, :2].astype(np.float64)
+    end = segments[:, 2:].astype(np.float64)
+
+    theta = np.arctan2(end[:, 1] - start[:, 1], end[:, 0] - start[:, 0]) % np.pi
+    direction = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    normal = np.stack([-direction[:, 1], direction[:, 0]], axis=1)
+
+    offset = np.einsum("ij,ij->i", start, normal)
+    t_start = np.einsum("ij,ij->i", start, direction)
+    t_end = np.einsum("ij,ij->i", end, direction)
+
+    # Orient every segment along its direction so start has the smaller projection
+    flipped = t_start > t_end
+    start[flipped], end[flipped] = end[flipped], start[flipped]
+    t_start, t_end = np.minimum(t_start, t_end), np.maximum(t_start, t_end)
+
+    angle_bucket = np.round(np.degrees(theta) / angle_tolerance).astype(np.int64)
+    offset_bucket = np.round(offset / offset_tolerance).astype(np.int64)
+    order = np.lexsort((t_start, offset_bucket, angle_bucket))
+
+    merged: List[np.ndarray] = []
+    current_key = None
+    current_start = current_end = None
+    current_reach = 0.0
+
+    for index in order:
+        key = (angle_bucket[index], offset_bucket[index])
+
+        if key == current_key and t_start[index] <= current_reach + max_gap:
+            if t_end[index] > current_reach:
+                current_reach = t_end[index]
+                current_end = end[index]
+            continue
+
+        if current_key is not None:
+            merged.append(np.concatenate([current_start, current_end]))
+
+        current_key = key
+        current_start, current_end = start[index], end[index]
+        current_reach = t_end[index]
+
+    merged.append(np.concatenate([current_start, current_end]))
+
+    return np.array(merged, dtype=np.float32)
+
+
+def _tile_starts(length: int, tile_size: int, step: int) -> List[int]:
+    """Offsets of tiles along one axis; the last tile is aligned to the far edge."""
+    if length <= tile_size:
+        return [0]
+
+    starts = list(range(0, length - tile_size + 1, step))
+    if starts[-1] + tile_size < length:
+        starts.append(length - tile_size)
+    return starts
+
+
+def _nearest_tile(positions: np.ndarray, starts: List[int], tile_size: int) -> np.ndarray:
+    """Index of the tile whose centre is nearest each position along one axis."""
+    centres = np.asarray(starts, dtype=np.float64) + tile_size / 2
+    return np.abs(positions[:, None] - centres[None, :]).argmin(axis=1)
+
+
+def _analyze_tile(gray: np.ndarray, origin: Tuple[int, int], tile_size: int) -> Tuple[np.ndarray, int, int]:
+    """Enhance one tile and find its line segments in full-image coordinates."""
+    y, x = origin
+    tile = np.ascontiguousarray(gray[y:y + tile_size, x:x + tile_size])
+
+    tile = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(tile)
+    edges = cv2.Canny(tile, 50, 150)
+    lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=100, maxLineGap=10)
+
+    if lines is None:
+        segments = np.empty((0, 4), dtype=np.int32)
+    else:
+        segments = lines.reshape(-1, 4) + np.array([x, y, x, y], dtype=np.int32)
+
+    return segments, cv2.countNonZero(edges), edges.size
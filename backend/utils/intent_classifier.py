@@ -0,0 +1,310 @@
+"""
+Local fast-path intent classifier for the router agent.
+
+A multinomial logistic regression over hashed word n-grams, the fallback
+keyword scores and the previous agent. It is trained offline from logged
+router decisions and shipped as a small .npz artifact, so confident text
+turns can be routed without a GPT-4 round trip.
+
+Train from a decision log written by the router (ROUTER_DECISION_LOG):
+
+    python -m utils.intent_classifier train decisions.jsonl --output artifacts/router_classifier.npz
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+
+from utils.text_features import hashed_ngrams, routing_keyword_scores
+
+
+LABELS = ["ISSUE_DETECTION", "TENANCY_FAQ", "CLARIFY"]
+AGENT_CONTEXT = ["issue_detection", "tenancy_faq", "router", "None"]
+DEFAULT_N_FEATURES = 4096
+DEFAULT_CLASSIFIER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "artifacts", "router_classifier.npz")
+
+_log_lock = threading.Lock()
+
+
+class IntentClassifier:
+    """
+    Linear softmax classifier over hashed text features.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, n_features: int = DEFAULT_N_FEATURES, labels: Optional[List[str]] = None):
+        """Initialize from trained parameters."""
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.n_features = n_features
+        self.labels = labels or list(LABELS)
+
+    @staticmethod
+    def featurize(text: str, last_agent: Optional[str], n_features: int = DEFAULT_N_FEATURES) -> np.ndarray:
+        """
+        Build the feature vector for a routing request.
+
+        Args:
+            text: User's message
+            last_agent: Previous agent, or None
+            n_features: Size of the hashed n-gram block
+
+        Returns:
+            Float32 vector of hashed n-grams, keyword scores and previous-agent one-hot
+        """
+        issue_score, tenancy_score = routing_keyword_scores(text)
+        keyword_block = np.log1p(np.array([issue_score, tenancy_score], dtype=np.float32))
+
+        context_block = np.zeros(len(AGENT_CONTEXT), dtype=np.float32)
+        context = last_agent if last_agent in AGENT_CONTEXT else "None"
+        context_block[AGENT_CONTEXT.index(context)] = 1.0
+
+        return np.concatenate([
+            hashed_ngrams(text, n_features),
+            keyword_block,
+            [keyword_block[0] - keyword_block[1]],
+            context_block
+        ]).astype(np.float32)
+
+    def predict_proba(self, text: str, last_agent: Optional[str] = None) -> np.ndarray:
+        """Return class probabilities in the order of self.labels."""
+        logits = self.featurize(text, last_agent, self.n_features) @ self.weights + self.bias
+        return _softmax(logits[None, :])[0]
+
+    def predict(self, text: str, last_agent: Optional[str] = None) -> Tuple[str, float]:
+        """
+        Predict the routing label.
+
+        Returns:
+            Tuple of (label, confidence)
+        """
+        probabilities = self.predict_proba(text, last_agent)
+        index = int(np.argmax(probabilities))
+        return self.labels[index], float(probabilities[index])
+
+    @classmethod
+    def train(
+        cls,
+        examples: List[Dict[str, Any]],
+        n_features: int = DEFAULT_N_FEATURES,
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4
+    ) -> "IntentClassifier":
+        """
+        Fit the classifier with full-batch gradient descent.
+
+        Args:
+            examples: Dicts with "user_text", "label" and optional "last_agent"
+            n_features: Size of the hashed n-gram block
+            epochs: Number of gradient steps
+            learning_rate: Gradient descent step size
+            l2: L2 regularization strength
+
+        Returns:
+            Trained classifier
+        """
+        examples = [example for example in examples if example.get("label") in LABELS]
+        if not examples:
+            raise ValueError("No labelled examples to train on")
+
+        features = np.stack([cls.featurize(example["user_text"], example.get("last_agent"), n_features) for example in examples])
+        targets = np.zeros((len(examples), len(LABELS)), dtype=np.float32)
+        targets[np.arange(len(examples)), [LABELS.index(example["label"]) for example in examples]] = 1.0
+
+        weights = np.zeros((features.shape[1], len(LABELS)), dtype=np.float32)
+        bias = np.zeros(len(LABELS), dtype=np.float32)
+
+        for _ in range(epochs):
+            error = (_softmax(features @ weights + bias) - targets) / len(examples)
+            weights -= learning_rate * (features.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        return cls(weights, bias, n_features)
+
+    def save(self, path: str):
+        """Write the model as a compressed .npz artifact."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float16),
+            bias=self.bias,
+            n_features=np.array(self.n_features),
+            labels=np.array(self.labels)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        """Load a model written by save()."""
+        with np.load(path) as artifact:
+            return cls(
+                weights=artifact["weights"],
+                bias=artifact["bias"],
+                n_features=int(artifact["n_features"]),
+                labels=[str(label) for label in artifact["labels"]]
+            )
+
+
+class RoutingStats:
+    """
+    Thread-safe counters for tuning the local routing threshold.
+
+    Agreement between the local prediction and the LLM is bucketed by local
+    confidence, so the threshold can be set where agreement is high enough.
+    """
+
+    def __init__(self, buckets: int = 10):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self.requests = 0
+        self.local_hits = 0
+        self.llm_calls = 0
+        self.shadow_checks = 0
+        self.shadow_agreements = 0
+        self._compared = [0] * buckets
+        self._agreed = [0] * buckets
+
+    def record_local_hit(self):
+        """Count a request answered by the local classifier."""
+        with self._lock:
+            self.requests += 1
+            self.local_hits += 1
+
+    def record_llm_call(self, local: Optional[Tuple[str, float]], llm_label: str):
+        """Count a request answered by the LLM, comparing it with the local prediction."""
+        with self._lock:
+            self.requests += 1
+            self.llm_calls += 1
+            if local:
+                self._record_comparison_locked(local, llm_label)
+
+    def record_shadow(self, local: Tuple[str, float], llm_label: str):
+        """Count a sampled LLM check of a locally answered request."""
+        with self._lock:
+            self.shadow_checks += 1
+            self.shadow_agreements += int(local[0] == llm_label)
+            self._record_comparison_locked(local, llm_label)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return hit-rate and agreement metrics."""
+        with self._lock:
+            compared = sum(self._compared)
+            agreed = sum(self._agreed)
+            width = 1.0 / self._buckets
+
+            return {
+                "requests": self.requests,
+                "local_hits": self.local_hits,
+                "llm_calls": self.llm_calls,
+                "hit_rate": self.local_hits / self.requests if self.requests else 0.0,
+                "compared": compared,
+                "agreement_rate": agreed / compared if compared else None,
+                "shadow_checks": self.shadow_checks,
+                "shadow_agreement_rate": self.shadow_agreements / self.shadow_checks if self.shadow_checks else None,
+                "agreement_by_confidence": [
+                    {
+                        "min_confidence": round(i * width, 2),
+                        "compared": self._compared[i],
+                        "agreement_rate": self._agreed[i] / self._compared[i] if self._compared[i] else None
+                    }
+                    for i in range(self._buckets)
+                ]
+            }
+
+    def _record_comparison_locked(self, local: Tuple[str, float], llm_label: str):
+        bucket = min(int(local[1] * self._buckets), self._buckets - 1)
+        self._compared[bucket] += 1
+        self._agreed[bucket] += int(local[0] == llm_label)
+
+
+def load_default_classifier() -> Optional[IntentClassifier]:
+    """Load the classifier from ROUTER_CLASSIFIER_PATH, or None if no artifact is present."""
+    path = os.getenv("ROUTER_CLASSIFIER_PATH", DEFAULT_CLASSIFIER_PATH)
+
+    if not os.path.exists(path):
+        return None
+
+    try:
+        return IntentClassifier.load(path)
+    except Exception as e:
+        print(f"Could not load router classifier from {path}: {e}")
+        return None
+
+
+def log_decision(user_text: str, last_agent: Optional[str], label: str, source: str):
+    """Append a routing decision to ROUTER_DECISION_LOG, if configured, for later training."""
+    path = os.getenv("ROUTER_DECISION_LOG")
+    if not path:
+        return
+
+    record = {
+        "timestamp": time.time(),
+        "user_text": user_text,
+        "last_agent": last_agent,
+        "label": label,
+        "source": source
+    }
+
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as log_file:
+            log_file.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not write router decision log: {e}")
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="Train the local router classifier from logged decisions.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Train a classifier artifact")
+    train_parser.add_argument("log", help="JSONL decision log written via ROUTER_DECISION_LOG")
+    train_parser.add_argument("--output", default=DEFAULT_CLASSIFIER_PATH, help="Where to write the .npz artifact")
+    train_parser.add_argument("--n-features", type=int, default=DEFAULT_N_FEATURES)
+    train_parser.add_argument("--epochs", type=int, default=300)
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of examples held out for evaluation")
+
+    args = parser.parse_args()
+
+    with open(args.log, encoding="utf-8") as log_file:
+        examples = [json.loads(line) for line in log_file if line.strip()]
+
+    # Only learn from LLM decisions so the classifier never trains on its own output
+    examples = [example for example in examples if example.get("source") == "llm"]
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(examples))
+    split = int(len(examples) * (1 - args.holdout))
+    train_examples = [examples[i] for i in order[:split]]
+    holdout_examples = [examples[i] for i in order[split:]]
+
+    classifier = IntentClassifier.train(train_examples, n_features=args.n_features, epochs=args.epochs)
+    classifier.save(args.output)
+
+    print(f"Trained on {len(train_examples)} decisions, wrote {args.output}")
+
+    if holdout_examples:
+        predictions = [classifier.predict(example["user_text"], example.get("last_agent")) for example in holdout_examples]
+        correct = [label == example["label"] for (label, _), example in zip(predictions, holdout_examples)]
+        print(f"Holdout accuracy: {sum(correct) / len(correct):.3f} on {len(correct)} decisions")
+
+        for threshold in (0.7, 0.8, 0.9, 0.95):
+            confident = [ok for (_, confidence), ok in zip(predictions, correct) if confidence >= threshold]
+            if confident:
+                print(
+                    f"  threshold {threshold:.2f}: hit rate {len(confident) / len(correct):.3f}, "
+                    f"agreement {sum(confident) / len(confident):.3f}"
+                )
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,175 @@
+"""
+Precompiled multi-pattern keyword matcher with word-boundary semantics.
+
+All keyword lists in utils/prompts.py are compiled once at import into a
+single word-level trie, so one scan of a message reports every category hit
+instead of one substring search per keyword.
+"""
+
+import string
+from typing import Dict, Iterable, List, Tuple
+
+from utils.prompts import (
+    EMERGENCY_KEYWORDS,
+    ISSUE_KEYWORDS,
+    TENANCY_KEYWORDS,
+    SEVERITY_KEYWORDS,
+    FAQ_TOPIC_KEYWORDS
+)
+
+
+PLURAL_SUFFIXES = ("s", "es")
+
+# Everything except letters and digits separates words
+_SEPARATORS = str.maketrans({
+    char: " " for char in string.punctuation + string.whitespace + "\u2018\u2019\u201c\u201d\u2013\u2014\u2026\u00a0"
+})
+
+
+def split_words(text: str) -> List[str]:
+    """Lowercase text and split it into words on anything that is not a letter or digit."""
+    return text.lower().translate(_SEPARATORS).split()
+
+
+class KeywordMatcher:
+    """
+    Word-level trie over every keyword, tagged with its category.
+
+    Keywords match whole words only, so "fire" does not match "fired" and
+    "water" does not match "waterproof". Each word of a keyword also matches
+    its plural form. Multi-word keywords ("gas leak") match consecutive words.
+
+    Matching splits the text once and intersects its words with the trie's
+    vocabulary in C, so the Python-level work is proportional to the number
+    of keyword hits rather than to the length of the message.
+    """
+
+    def __init__(self):
+        self._children: List[Dict[str, int]] = [{}]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+        self._vocabulary = set()
+
+    def add_category(self, category: str, keywords: Iterable[str]) -> "KeywordMatcher":
+        """
+        Add keywords under a category name.
+
+        Args:
+            category: Name reported in match results
+            keywords: Words or phrases to match
+
+        Returns:
+            The matcher, for chaining
+        """
+        for keyword in keywords:
+            words = split_words(keyword)
+            if not words:
+                continue
+
+            for surface in self._surface_forms(words):
+                self._insert(surface, (category, keyword))
+
+        return self
+
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """
+        Find every keyword in the text.
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            Mapping of category to the distinct keywords found
+        """
+        words = split_words(text)
+        present = self._vocabulary.intersection(words)
+        if not present:
+            return {}
+
+        children, output = self._children, self._output
+        root = children[0]
+        hits: Dict[str, List[str]] = {}
+
+        for word in present:
+            node = root.get(word)
+            if node is None:
+                continue
+
+            self._collect(output[node], hits)
+
+            if not children[node]:
+                continue
+
+            # Only phrase-initial words need their occurrences walked
+            start = -1
+            while True:
+                try:
+                    start = words.index(word, start + 1)
+                except ValueError:
+                    break
+
+                child = node
+                position = start + 1
+                while position < len(words):
+                    child = children[child].get(words[position])
+                    if child is None:
+                        break
+                    self._collect(output[child], hits)
+                    position += 1
+
+        return hits
+
+    def _insert(self, words: Tuple[str, ...], output: Tuple[str, str]):
+        node = 0
+        for word in words:
+            self._vocabulary.add(word)
+            child = self._children[node].get(word)
+            if child is None:
+                child = len(self._children)
+                self._children[node][word] = child
+                self._children.append({})
+                self._output.append([])
+            node = child
+
+        if output not in self._output[node]:
+            self._output[node].append(output)
+
+    @staticmethod
+    def _collect(outputs: List[Tuple[str, str]], hits: Dict[str, List[str]]):
+        for category, keyword in outputs:
+            found = hits.setdefault(category, [])
+            if keyword not in found:
+                found.append(keyword)
+
+    @staticmethod
+    def _surface_forms(words: List[str]) -> List[Tuple[str, ...]]:
+        """Expand each word of a keyword into itself and its plural forms."""
+        forms = [()]
+        for word in words:
+            variants = [word] + [word + suffix for suffix in PLURAL_SUFFIXES]
+            forms = [form + (variant,) for form in forms for variant in variants]
+        return forms
+
+
+def build_default_matcher() -> KeywordMatcher:
+    """Compile every keyword list from utils/prompts.py into one matcher."""
+    matcher = KeywordMatcher()
+
+    matcher.add_category("emergency", EMERGENCY_KEYWORDS)
+    matcher.add_category("issue", ISSUE_KEYWORDS)
+    matcher.add_category("tenancy", TENANCY_KEYWORDS)
+
+    for tier, keywords in SEVERITY_KEYWORDS.items():
+        matcher.add_category(f"severity_{tier}", keywords)
+
+    for topic, keywords in FAQ_TOPIC_KEYWORDS.items():
+        matcher.add_category(f"topic_{topic}", keywords)
+
+    return matcher
+
+
+KEYWORD_MATCHER = build_default_matcher()
+
+
+def match_keywords(text: str) -> Dict[str, List[str]]:
+    """Scan text with the shared matcher. See KeywordMatcher.match."""
+    return KEYWORD_MATCHER.match(text)
@@ -0,0 +1,43 @@
+"""
+Deferred imports for heavy optional modules.
+
+OpenCV takes a noticeable part of a cold start, yet text-only requests never
+touch it. A lazily imported module is registered right away but only executed
+on its first attribute access, so workers that never see an image never load it.
+"""
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return a module that is loaded on first attribute access.
+
+    Args:
+        name: Absolute module name, e.g. "cv2"
+
+    Returns:
+        The module (already loaded, if something imported it before)
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        # Fail the normal way, with the usual ModuleNotFoundError
+        return importlib.import_module(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def is_loaded(module: ModuleType) -> bool:
+    """Whether a module from lazy_import has been executed yet."""
+    return not isinstance(module, importlib.util._LazyModule)
@@ -0,0 +1,580 @@
+"""
+Shared, pooled HTTP clients for every ChatOpenAI instance.
+
+All agents talk to the same OpenAI host, so they share one sync and one
+async httpx connection pool instead of each opening its own. Keep-alive
+connections are reused across turns and agents, and a warm-up request at
+startup pays for the TLS handshake before the first user does.
+"""
+
+import asyncio
+import copy
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator, Tuple
+from uuid import UUID
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult, ChatGenerationChunk
+from langchain_openai import ChatOpenAI
+
+from utils.metrics import LLM_LATENCY, ERRORS_TOTAL, LLM_COALESCED_TOTAL
+from utils.circuit_breaker import CLOSED, BreakerCall, CircuitBreaker, CircuitOpenError
+from utils.hedging import RequestHedger
+from utils.llm_scheduler import Lane, LLMScheduler, lane_for
+from utils.single_flight import SingleFlight
+from utils.usage import record_llm_usage, usage_from_llm_result
+
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+@dataclass
+class AgentLimits:
+    """Per-agent request limits applied on top of the shared pool."""
+    read_timeout: float
+    max_retries: int
+    # Calls slower than this count as failures for the agent's circuit breaker
+    slow_call_seconds: float
+    # Total time for one call, queueing, retries and hedges included
+    deadline_seconds: float
+
+
+# Routing must be quick; vision and long-form answers legitimately take longer
+DEFAULT_AGENT_LIMITS = {
+    "router": AgentLimits(read_timeout=15.0, max_retries=1, slow_call_seconds=5.0, deadline_seconds=20.0),
+    "issue_detection": AgentLimits(read_timeout=60.0, max_retries=2, slow_call_seconds=40.0, deadline_seconds=120.0),
+    "tenancy_faq": AgentLimits(read_timeout=45.0, max_retries=2, slow_call_seconds=30.0, deadline_seconds=90.0),
+    "summarizer": AgentLimits(read_timeout=30.0, max_retries=1, slow_call_seconds=20.0, deadline_seconds=60.0)
+}
+
+# Short calls worth duplicating when one is slow; see utils/hedging.py
+DEFAULT_HEDGE_AGENTS = "router,tenancy_faq"
+
+
+class LLMDeadlineError(Exception):
+    """Raised when an LLM call, retries and queueing included, runs past its agent's deadline."""
+
+    def __init__(self, agent: str, deadline_seconds: float):
+        super().__init__(f"The {agent} model did not answer within its {deadline_seconds:g} s deadline.")
+        self.agent = agent
+        self.deadline_seconds = deadline_seconds
+
+
+def openai_base_url() -> str:
+    """Base URL for the OpenAI API, honouring OPENAI_BASE_URL / OPENAI_API_BASE."""
+    return (os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE") or DEFAULT_BASE_URL).rstrip("/")
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """LangChain callback recording the duration, outcome and token usage of every LLM call."""
+
+    # Handlers are cheap; run them inline rather than on an executor in async chains
+    run_inline = True
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._starts: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        if is_coalesced(response):
+            # The leader's call already recorded the tokens
+            self._observe(run_id, "coalesced")
+            return
+        self._observe(run_id, "success")
+        record_llm_usage(self.agent, *usage_from_llm_result(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        if isinstance(error, CircuitOpenError):
+            # Refused without a request; the breaker already counted the failures that opened it
+            self._observe(run_id, "circuit_open")
+            return
+        self._observe(run_id, "deadline" if isinstance(error, LLMDeadlineError) else "error")
+        ERRORS_TOTAL.labels(f"llm_{self.agent}").inc()
+
+    def _observe(self, run_id: UUID, outcome: str):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            LLM_LATENCY.labels(self.agent, outcome).observe(time.perf_counter() - start)
+
+
+def is_coalesced(response: Any) -> bool:
+    """Whether an LLMResult was shared from another caller's in-flight request."""
+    return any(
+        getattr(generation, "message", None) is not None and generation.message.response_metadata.get("coalesced")
+        for generations in response.generations
+        for generation in generations
+    )
+
+
+def _chat_result_usage(result: ChatResult) -> Tuple[Optional[str], int, int]:
+    """(model, prompt_tokens, completion_tokens) reported in a ChatResult."""
+    llm_output = result.llm_output or {}
+    token_usage = llm_output.get("token_usage") or {}
+    return llm_output.get("model_name"), token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+
+
+def _has_image(messages: List[BaseMessage]) -> bool:
+    """Whether any message carries an image part."""
+    return any(
+        isinstance(part, dict) and part.get("type") == "image_url"
+        for message in messages
+        if isinstance(message.content, list)
+        for part in message.content
+    )
+
+
+class ManagedChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose upstream requests are coalesced and admission-controlled.
+
+    Concurrent identical calls share one request. The single-flight key is a
+    hash of the exact request payload: model, settings and the rendered
+    messages, images included. Only calls that would send the same request
+    are coalesced, so a router prompt with different history or a FAQ
+    question for another location never is. Streaming calls are not coalesced.
+
+    Every request that does go upstream, streamed or not, first takes a slot
+    from the scheduler in its priority lane. The agent's circuit breaker
+    admits the call before it queues and counts the outcome of the request
+    itself.
+
+    Each call has a deadline covering coalescing, queueing, retries and
+    hedges. Async calls are cancelled when it passes; streams must deliver
+    their first chunk by then. Sync calls cannot be cancelled, so their
+    request timeout is cut to the time left when they are sent; only their
+    retries can overrun the deadline. Async calls of hedged agents send a
+    second request when the first is unusually slow.
+    """
+
+    single_flight: Optional[Any] = None
+    scheduler: Optional[Any] = None
+    breaker: Optional[Any] = None
+    hedger: Optional[Any] = None
+    deadline_seconds: Optional[float] = None
+    agent_name: str = "default"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        deadline_at = self._deadline_at()
+
+        def call() -> ChatResult:
+            return self._scheduled_generate(messages, deadline_at, stop=stop, run_manager=run_manager, **kwargs)
+
+        if self.single_flight is None:
+            return call()
+
+        # A follower gives up on the leader at its own deadline, as the leader's call would
+        wait = None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+        try:
+            result, leader = self.single_flight.do_sync(self._coalescing_key(messages, stop, **kwargs), call, self.agent_name, timeout=wait)
+        except TimeoutError:
+            raise LLMDeadlineError(self.agent_name, self.deadline_seconds) from None
+        return self._caller_result(result, leader)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        async with self._deadline():
+            if self.single_flight is None:
+                return await self._upstream_agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+            def call():
+                return self._upstream_agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+            result, leader = await self.single_flight.do(self._coalescing_key(messages, stop, **kwargs), call, self.agent_name)
+            return self._caller_result(result, leader)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        deadline_at = self._deadline_at()
+        with self._breaker_guard() as call, self._slot_sync(messages, "stream"):
+            timeout = self._timeout_until(deadline_at)
+            call.begin()
+            for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **timeout, **kwargs):
+                # Only the time to the first token says whether the upstream is slow
+                call.mark()
+                yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        chunks = self._scheduled_astream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        try:
+            # The deadline bounds the wait for the first chunk; the read timeout then bounds each gap
+            async with self._deadline():
+                first = await anext(chunks, None)
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def _scheduled_astream(self, messages: List[BaseMessage], **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        """Stream the upstream response once the circuit breaker and the scheduler admit it."""
+        with self._breaker_guard() as call:
+            async with self._slot(messages, "stream"):
+                call.begin()
+                async for chunk in super()._astream(messages, **kwargs):
+                    call.mark()
+                    yield chunk
+
+    def _scheduled_generate(self, messages: List[BaseMessage], deadline_at: Optional[float], **kwargs: Any) -> ChatResult:
+        """Make the upstream request once the circuit breaker and the scheduler admit it."""
+        with self._breaker_guard() as call, self._slot_sync(messages, "call"):
+            timeout = self._timeout_until(deadline_at)
+            call.begin()
+            return ChatOpenAI._generate(self, messages, **timeout, **kwargs)
+
+    async def _upstream_agenerate(self, messages: List[BaseMessage], **kwargs: Any) -> ChatResult:
+        """Make the upstream request, hedged if the agent hedges its calls."""
+        if self.hedger is None:
+            return await self._scheduled_agenerate(messages, **kwargs)
+        return await self.hedger.run(lambda: self._scheduled_agenerate(messages, **kwargs), self._can_hedge, self._charge_losing_hedge)
+
+    def _charge_losing_hedge(self, winner: ChatResult, loser: Optional[ChatResult]) -> int:
+        """
+        Record the tokens of a hedged call's losing attempt; the callback only sees the winner's.
+
+        A cancelled attempt reports no usage. It sent the same prompt as the winner,
+        so it is charged the winner's prompt tokens; what it generated before it was
+        cancelled is unknown and not counted.
+
+        Returns:
+            Tokens charged
+        """
+        model, prompt_tokens, completion_tokens = _chat_result_usage(loser or winner)
+        if loser is None:
+            completion_tokens = 0
+        record_llm_usage(self.agent_name, model, prompt_tokens, completion_tokens)
+        return prompt_tokens + completion_tokens
+
+    async def _scheduled_agenerate(self, messages: List[BaseMessage], **kwargs: Any) -> ChatResult:
+        """Async variant of _scheduled_generate."""
+        with self._breaker_guard() as call:
+            async with self._slot(messages, "call"):
+                call.begin()
+                return await ChatOpenAI._agenerate(self, messages, **kwargs)
+
+    def _slot(self, messages: List[BaseMessage], mode: str):
+        """The scheduler slot for an async upstream request, or a no-op without a scheduler."""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(lane_for(self.agent_name, _has_image(messages)), self._latency_kind(messages, mode))
+
+    def _slot_sync(self, messages: List[BaseMessage], mode: str):
+        """Blocking variant of _slot."""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot_sync(lane_for(self.agent_name, _has_image(messages)), self._latency_kind(messages, mode))
+
+    @asynccontextmanager
+    async def _deadline(self):
+        """Cancel the block when the agent's deadline passes, raising LLMDeadlineError."""
+        if self.deadline_seconds is None:
+            yield
+            return
+
+        timeout = asyncio.timeout(self.deadline_seconds)
+        try:
+            async with timeout:
+                yield
+        except TimeoutError:
+            if timeout.expired():
+                raise LLMDeadlineError(self.agent_name, self.deadline_seconds) from None
+            raise
+
+    def _deadline_at(self) -> Optional[float]:
+        """Monotonic time by which a sync call must finish."""
+        return None if self.deadline_seconds is None else time.monotonic() + self.deadline_seconds
+
+    def _timeout_until(self, deadline_at: Optional[float]) -> Dict[str, Any]:
+        """
+        Request timeout for a sync call, shortened so it ends at the deadline.
+
+        Raises:
+            LLMDeadlineError: If the deadline passed while the call waited for a slot
+        """
+        if deadline_at is None:
+            return {}
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineError(self.agent_name, self.deadline_seconds)
+        read_timeout = getattr(self.request_timeout, "read", self.request_timeout)
+        if read_timeout is not None and remaining >= read_timeout:
+            return {}
+        return {"timeout": remaining}
+
+    def _can_hedge(self) -> bool:
+        """Hedge only into spare capacity, and only calls someone is waiting for."""
+        if self.breaker is not None and self.breaker.state != CLOSED:
+            return False
+        if lane_for(self.agent_name) == Lane.BACKGROUND:
+            return False
+        return self.scheduler is None or self.scheduler.has_spare_slot()
+
+    def _breaker_guard(self):
+        """The breaker's guard around queueing and the upstream request, or a no-op without a breaker."""
+        return nullcontext(BreakerCall()) if self.breaker is None else self.breaker.guard()
+
+    def _latency_kind(self, messages: List[BaseMessage], mode: str) -> str:
+        """Calls of one kind share a latency baseline in the scheduler, e.g. "issue_detection:vision:call"."""
+        return f"{self.agent_name}:{'vision' if _has_image(messages) else 'text'}:{mode}"
+
+    def _coalescing_key(self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any) -> str:
+        """Hash of the request payload this call would send."""
+        payload = self._get_request_payload(messages, stop=stop, **kwargs)
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _caller_result(self, result: ChatResult, leader: bool) -> ChatResult:
+        """
+        Give each caller its own copy of the shared result.
+
+        LangChain stamps run ids and metadata onto the returned messages, so
+        callers must not share them. Followers' copies carry no token usage
+        and are marked as coalesced, so the tokens are only counted once.
+        """
+        LLM_COALESCED_TOTAL.labels(self.agent_name, "leader" if leader else "follower").inc()
+
+        result = copy.deepcopy(result)
+        if not leader:
+            result.llm_output = {**(result.llm_output or {}), "token_usage": {}}
+            for generation in result.generations:
+                generation.message.usage_metadata = None
+                generation.message.response_metadata = {**generation.message.response_metadata, "coalesced": True}
+        return result
+
+
+class LLMClients:
+    """
+    One sync and one async httpx client shared by all agents.
+
+    Pool size, keep-alive and connect timeout come from the environment:
+    LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE, LLM_KEEPALIVE_EXPIRY_SECONDS and
+    LLM_CONNECT_TIMEOUT_SECONDS. HTTP/2 is used when the optional h2 package
+    is installed (pip install "httpx[http2]") unless LLM_HTTP2=false.
+    Concurrent identical calls share one request unless LLM_COALESCING=false,
+    upstream calls go through the admission scheduler unless LLM_SCHEDULER=false,
+    and each agent has a circuit breaker unless CIRCUIT_BREAKERS=false.
+    Async calls of the agents in LLM_HEDGE_AGENTS are hedged when
+    LLM_HEDGING=true.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        http2: Optional[bool] = None,
+        coalescing: Optional[bool] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        circuit_breakers: Optional[bool] = None,
+        hedging: Optional[bool] = None
+    ):
+        """Create the shared clients, reading unset settings from the environment."""
+        self.base_url = base_url or openai_base_url()
+        self.max_connections = max_connections or int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+        self.max_keepalive = max_keepalive or int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+        self.keepalive_expiry = keepalive_expiry or float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+        self.connect_timeout = connect_timeout or float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+
+        if http2 is None:
+            http2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+
+        if coalescing is None:
+            coalescing = os.getenv("LLM_COALESCING", "true").lower() == "true"
+        self.coalescing = coalescing
+        self.single_flight = SingleFlight()
+
+        if scheduler is None and os.getenv("LLM_SCHEDULER", "true").lower() == "true":
+            scheduler = LLMScheduler()
+        self.scheduler = scheduler
+
+        if circuit_breakers is None:
+            circuit_breakers = os.getenv("CIRCUIT_BREAKERS", "true").lower() == "true"
+        self.circuit_breakers = circuit_breakers
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+
+        # Hedges cost extra upstream calls, so they are opt-in
+        if hedging is None:
+            hedging = os.getenv("LLM_HEDGING", "false").lower() == "true"
+        self.hedging = hedging
+        self.hedge_agents = {name.strip() for name in os.getenv("LLM_HEDGE_AGENTS", DEFAULT_HEDGE_AGENTS).split(",") if name.strip()}
+        self.hedgers: Dict[str, RequestHedger] = {}
+        self._hedgers_lock = threading.Lock()
+
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        # Per-request read timeouts are set per agent; this is only the fallback
+        timeout = httpx.Timeout(60.0, connect=self.connect_timeout)
+
+        self.sync_client = httpx.Client(limits=limits, timeout=timeout, http2=self.http2)
+        self.async_client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=self.http2)
+
+        # Overridable per agent, e.g. LLM_READ_TIMEOUT_ROUTER=10, LLM_MAX_RETRIES_TENANCY_FAQ=0 or LLM_DEADLINE_SECONDS_ROUTER=8
+        self.agent_limits: Dict[str, AgentLimits] = {
+            name: AgentLimits(
+                read_timeout=float(os.getenv(f"LLM_READ_TIMEOUT_{name.upper()}", str(defaults.read_timeout))),
+                max_retries=int(os.getenv(f"LLM_MAX_RETRIES_{name.upper()}", str(defaults.max_retries))),
+                slow_call_seconds=float(os.getenv(f"LLM_SLOW_CALL_SECONDS_{name.upper()}", str(defaults.slow_call_seconds))),
+                deadline_seconds=float(os.getenv(f"LLM_DEADLINE_SECONDS_{name.upper()}", str(defaults.deadline_seconds)))
+            )
+            for name, defaults in DEFAULT_AGENT_LIMITS.items()
+        }
+
+    def chat_model(self, agent_name: str, **kwargs: Any) -> ManagedChatOpenAI:
+        """
+        Build a ChatOpenAI bound to the shared clients and the agent's limits.
+
+        Args:
+            agent_name: Agent key in agent_limits (router, issue_detection, tenancy_faq)
+            **kwargs: Model settings such as model, temperature, max_tokens, api_key
+
+        Returns:
+            Configured ChatOpenAI instance, coalescing identical concurrent calls
+        """
+        limits = self._limits(agent_name)
+
+        return ManagedChatOpenAI(
+            single_flight=self.single_flight if self.coalescing else None,
+            scheduler=self.scheduler,
+            breaker=self.breaker(agent_name),
+            hedger=self.hedger(agent_name),
+            deadline_seconds=limits.deadline_seconds,
+            agent_name=agent_name,
+            base_url=self.base_url,
+            http_client=self.sync_client,
+            http_async_client=self.async_client,
+            timeout=httpx.Timeout(limits.read_timeout, connect=self.connect_timeout),
+            max_retries=limits.max_retries,
+            callbacks=[LLMMetricsCallback(agent_name)],
+            # Streams report token usage only when asked to
+            stream_usage=True,
+            **kwargs
+        )
+
+    def breaker(self, agent_name: str) -> Optional[CircuitBreaker]:
+        """The agent's circuit breaker, shared by all of its chat models; None when breakers are off."""
+        if not self.circuit_breakers:
+            return None
+        with self._breakers_lock:
+            if agent_name not in self.breakers:
+                self.breakers[agent_name] = CircuitBreaker(agent_name, self._limits(agent_name).slow_call_seconds)
+            return self.breakers[agent_name]
+
+    def breaker_stats(self) -> Dict[str, Any]:
+        """State and counters of each agent's circuit breaker."""
+        with self._breakers_lock:
+            breakers = dict(self.breakers)
+        return {name: breaker.stats() for name, breaker in breakers.items()}
+
+    def hedger(self, agent_name: str) -> Optional[RequestHedger]:
+        """The agent's request hedger, shared by all of its chat models; None if its calls are not hedged."""
+        if not self.hedging or agent_name not in self.hedge_agents:
+            return None
+        with self._hedgers_lock:
+            if agent_name not in self.hedgers:
+                self.hedgers[agent_name] = RequestHedger(agent_name)
+            return self.hedgers[agent_name]
+
+    def hedging_stats(self) -> Dict[str, Any]:
+        """Hedge delay, fire rate and win rate of each hedged agent."""
+        with self._hedgers_lock:
+            hedgers = dict(self.hedgers)
+        return {name: hedger.stats() for name, hedger in hedgers.items()}
+
+    def _limits(self, agent_name: str) -> AgentLimits:
+        return self.agent_limits.get(
+            agent_name,
+            AgentLimits(read_timeout=60.0, max_retries=2, slow_call_seconds=40.0, deadline_seconds=120.0)
+        )
+
+    async def warm(self, api_key: Optional[str] = None) -> bool:
+        """
+        Open a keep-alive connection to the API host ahead of the first request.
+
+        Returns:
+            True if the host answered, False otherwise (the error is logged, not raised)
+        """
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        try:
+            await self.async_client.get(f"{self.base_url}/models", headers=headers)
+            return True
+        except httpx.HTTPError as e:
+            print(f"LLM connection warm-up failed: {e}")
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Report the pool configuration, single-flight coalescing counts, admission control, circuit breakers and hedging."""
+        return {
+            "base_url": self.base_url,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "keepalive_expiry": self.keepalive_expiry,
+            "connect_timeout": self.connect_timeout,
+            "agents": {name: vars(limits) for name, limits in self.agent_limits.items()},
+            "coalescing": {"enabled": self.coalescing, **self.single_flight.stats()},
+            "scheduler": {"enabled": False} if self.scheduler is None else {"enabled": True, **self.scheduler.stats()},
+            "circuit_breakers": self.breaker_stats(),
+            "hedging": {"enabled": self.hedging, "agents": self.hedging_stats()}
+        }
+
+    async def aclose(self):
+        """Close both clients and their pooled connections."""
+        self.sync_client.close()
+        await self.async_client.aclose()
+
+
+_clients: Optional[LLMClients] = None
+_clients_lock = threading.Lock()
+
+
+def get_llm_clients() -> LLMClients:
+    """Return the process-wide shared LLM clients."""
+    global _clients
+    with _clients_lock:
+        if _clients is None:
+            _clients = LLMClients()
+        return _clients
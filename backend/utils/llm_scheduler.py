@@ -0,0 +1,465 @@
+"""
+Admission control for upstream LLM calls.
+
+When OpenAI slows down, every request keeps its LLM call open longer, new
+ones keep arriving, and without a limit they all time out together. Every
+upstream call instead takes a slot from one scheduler:
+
+- The number of slots adapts AIMD-style. It grows by one per window of
+  calls while the slots are in use and latency is normal. It is cut by a
+  constant factor, at most once per typical call duration, when a call
+  times out, gets a 429 or 5xx, or takes much longer than usual for its
+  kind. Other errors, such as a 400 for a bad image, free the slot without
+  adapting the limit.
+- Calls over the limit wait in a bounded queue, served by priority lane:
+  router calls (which also produce clarifications) first, then text
+  answers, then vision analyses, then background work such as summaries.
+- A full queue, or a wait beyond the queue timeout, fails fast with
+  LLMOverloadedError carrying a Retry-After estimate. If the queue is full
+  when a higher-priority call arrives, the newest call of the lowest
+  lane waiting is shed instead.
+
+Slots are shared by the async request path and by sync calls made from
+worker threads.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Optional, Dict, Any, List
+
+from utils.circuit_breaker import is_congestion
+from utils.metrics import (
+    LLM_QUEUE_DEPTH,
+    LLM_QUEUE_WAIT,
+    LLM_CONCURRENCY_LIMIT,
+    LLM_IN_FLIGHT,
+    LLM_REJECTED_TOTAL
+)
+
+
+class Lane(IntEnum):
+    """Priority lanes, lower values served first."""
+    INTERACTIVE = 0
+    TEXT = 1
+    VISION = 2
+    BACKGROUND = 3
+
+
+# Agents whose calls do not belong in the default text/vision lanes
+AGENT_LANES = {
+    "router": Lane.INTERACTIVE,
+    "summarizer": Lane.BACKGROUND
+}
+
+_lane_override: contextvars.ContextVar[Optional[Lane]] = contextvars.ContextVar("llm_lane", default=None)
+
+
+class LLMOverloadedError(Exception):
+    """Raised when an LLM call is not admitted; the request should be answered with 503."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"The assistant is overloaded ({reason.replace('_', ' ')}). Please retry in {retry_after} s.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@contextmanager
+def llm_lane(lane: Lane):
+    """Run LLM calls made inside the block in the given lane, e.g. background checks."""
+    token = _lane_override.set(lane)
+    try:
+        yield
+    finally:
+        _lane_override.reset(token)
+
+
+def lane_for(agent: str, has_image: bool = False) -> Lane:
+    """Lane of a call: an llm_lane() override, else by agent, with image calls in the vision lane."""
+    override = _lane_override.get()
+    if override is not None:
+        return override
+    if agent in AGENT_LANES:
+        return AGENT_LANES[agent]
+    return Lane.VISION if has_image else Lane.TEXT
+
+
+class _Waiter:
+    """A queued call, woken through its event loop or a threading event."""
+
+    __slots__ = ("lane", "enqueued_at", "state", "loop", "future", "event", "error")
+
+    def __init__(self, lane: Lane, loop: Optional[asyncio.AbstractEventLoop]):
+        self.lane = lane
+        self.enqueued_at = time.perf_counter()
+        self.state = "waiting"
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+        self.error: Optional[LLMOverloadedError] = None
+
+    def wake(self):
+        """Tell the waiting call it was granted a slot or rejected; see state and error."""
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Adaptive concurrency limit with a bounded, prioritized wait queue.
+
+    Limits come from the environment: LLM_CONCURRENCY_INITIAL, LLM_CONCURRENCY_MIN,
+    LLM_CONCURRENCY_MAX, LLM_QUEUE_MAX, LLM_QUEUE_TIMEOUT_SECONDS,
+    LLM_LATENCY_TOLERANCE, LLM_CONCURRENCY_BACKOFF and LLM_BASELINE_WINDOW_SECONDS.
+    """
+
+    def __init__(
+        self,
+        initial_limit: Optional[float] = None,
+        min_limit: Optional[float] = None,
+        max_limit: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        latency_tolerance: Optional[float] = None,
+        backoff: Optional[float] = None
+    ):
+        """Initialize the scheduler, reading unset limits from the environment."""
+        self.min_limit = min_limit or float(os.getenv("LLM_CONCURRENCY_MIN", "2"))
+        self.max_limit = max_limit or float(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+        self.limit = initial_limit or float(os.getenv("LLM_CONCURRENCY_INITIAL", "16"))
+        self.max_queue = max_queue or int(os.getenv("LLM_QUEUE_MAX", "64"))
+        self.queue_timeout = queue_timeout or float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+        # A call this many times slower than usual for its kind signals congestion. An occasional long
+        # answer costs at most one cut per round trip, which additive increase wins back
+        self.latency_tolerance = latency_tolerance or float(os.getenv("LLM_LATENCY_TOLERANCE", "2.0"))
+        self.backoff = backoff or float(os.getenv("LLM_CONCURRENCY_BACKOFF", "0.75"))
+        self.baseline_window = float(os.getenv("LLM_BASELINE_WINDOW_SECONDS", "60"))
+
+        self.in_flight = 0
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._waiting: Dict[Lane, int] = {lane: 0 for lane in Lane}
+        self._baselines: Dict[str, float] = {}
+        self._baseline_updated: Dict[str, float] = {}
+        self._mean_latency: Optional[float] = None
+        self._recent_wait = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {}
+        self.increases = 0
+        self.decreases = 0
+
+        LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+    @asynccontextmanager
+    async def slot(self, lane: Lane, kind: str):
+        """
+        Hold a slot for one upstream call.
+
+        Args:
+            lane: Priority lane of the call
+            kind: Latency class of the call (agent, vision, streaming); each has its own baseline
+
+        Raises:
+            LLMOverloadedError: If the queue is full or the wait exceeds queue_timeout
+        """
+        waiter = self._admit(lane, asyncio.get_running_loop())
+        if waiter is not None:
+            await self._await_turn(waiter)
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except asyncio.CancelledError:
+            # A caller that went away says nothing about upstream latency
+            start = None
+            raise
+        except Exception as e:
+            # Client errors come back fast and say nothing about capacity
+            failed = is_congestion(e)
+            if not failed:
+                start = None
+            raise
+        finally:
+            self._release(kind, None if start is None else time.perf_counter() - start, failed)
+
+    @contextmanager
+    def slot_sync(self, lane: Lane, kind: str):
+        """Blocking variant of slot() for calls made from worker threads."""
+        waiter = self._admit(lane, None)
+        if waiter is not None:
+            self._wait_turn(waiter)
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception as e:
+            failed = is_congestion(e)
+            if not failed:
+                start = None
+            raise
+        finally:
+            self._release(kind, None if start is None else time.perf_counter() - start, failed)
+
+    def check_admission(self):
+        """
+        Reject a new request up front when the queue is already full, or when
+        calls have lately been waiting more than half the queue timeout. A
+        request queues at least twice (router, then specialist), so it would
+        most likely time out after holding its place in the queue.
+
+        Raises:
+            LLMOverloadedError: If no more calls can be queued
+        """
+        with self._lock:
+            if sum(self._waiting.values()) >= self.max_queue:
+                error = LLMOverloadedError("queue_full", self._retry_after_locked())
+            elif any(self._waiting.values()) and self._recent_wait > self.queue_timeout / 2:
+                error = LLMOverloadedError("queue_slow", self._retry_after_locked())
+            else:
+                return
+        self._count_rejection(Lane.TEXT, error.reason)
+        raise error
+
+    def has_spare_slot(self) -> bool:
+        """Whether a call made now would get a slot without queueing."""
+        with self._lock:
+            return self.in_flight < self._capacity() and not any(self._waiting.values())
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying."""
+        with self._lock:
+            return self._retry_after_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        """Report the current limit, queue and admission counters."""
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self.in_flight,
+                "queue_depth": {lane.name.lower(): count for lane, count in self._waiting.items()},
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+                "recent_wait_seconds": round(self._recent_wait, 3),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": dict(self.rejected),
+                "limit_increases": self.increases,
+                "limit_decreases": self.decreases,
+                "baseline_seconds": {kind: round(seconds, 3) for kind, seconds in self._baselines.items()},
+                "retry_after": self._retry_after_locked()
+            }
+
+    def _admit(self, lane: Lane, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """Take a slot right away (returns None) or enqueue a waiter."""
+        shed = None
+        with self._lock:
+            # The heap may still hold abandoned entries; only live waiters go first
+            if self.in_flight < self._capacity() and not any(self._waiting.values()):
+                self.in_flight += 1
+                self.admitted += 1
+                LLM_IN_FLIGHT.set(self.in_flight)
+                LLM_QUEUE_WAIT.labels(lane.name.lower()).observe(0.0)
+                self._record_wait_locked(0.0)
+                return None
+
+            if sum(self._waiting.values()) >= self.max_queue:
+                shed = self._lowest_waiter_locked()
+                if shed is None or shed.lane <= lane:
+                    error = LLMOverloadedError("queue_full", self._retry_after_locked())
+                    shed = None
+                else:
+                    error = None
+                    self._reject_locked(shed, "shed")
+            else:
+                error = None
+
+            if error is None:
+                waiter = _Waiter(lane, loop)
+                heapq.heappush(self._queue, (lane, next(self._sequence), waiter))
+                self._set_waiting_locked(lane, 1)
+                self.queued += 1
+
+        if shed is not None:
+            shed.wake()
+        if error is not None:
+            self._count_rejection(lane, error.reason)
+            raise error
+        return waiter
+
+    async def _await_turn(self, waiter: _Waiter):
+        """Wait for a grant; clean up on timeout or cancellation."""
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter, timed_out=True)
+        except asyncio.CancelledError:
+            self._abandon(waiter, timed_out=False)
+            raise
+        self._finish_wait(waiter)
+
+    def _wait_turn(self, waiter: _Waiter):
+        """Blocking variant of _await_turn."""
+        if not waiter.event.wait(self.queue_timeout):
+            self._abandon(waiter, timed_out=True)
+        self._finish_wait(waiter)
+
+    def _abandon(self, waiter: _Waiter, timed_out: bool):
+        """
+        Leave the queue after a timeout or cancellation.
+
+        A grant may have raced the timeout; a timed-out call then just proceeds,
+        and a cancelled one hands its slot straight back.
+        """
+        with self._lock:
+            if waiter.state == "waiting":
+                waiter.state = "abandoned"
+                self._set_waiting_locked(waiter.lane, -1)
+                if timed_out:
+                    self._record_wait_locked(self.queue_timeout)
+                    waiter.error = LLMOverloadedError("queue_timeout", self._retry_after_locked())
+                    waiter.state = "rejected"
+                return
+            granted = waiter.state == "granted"
+
+        if granted and not timed_out:
+            self._release(None, None, False)
+
+    def _finish_wait(self, waiter: _Waiter):
+        """Raise for a rejected waiter, record the wait of a granted one."""
+        if waiter.state == "rejected":
+            self._count_rejection(waiter.lane, waiter.error.reason)
+            raise waiter.error
+        LLM_QUEUE_WAIT.labels(waiter.lane.name.lower()).observe(time.perf_counter() - waiter.enqueued_at)
+
+    def _release(self, kind: Optional[str], latency: Optional[float], failed: bool):
+        """Free a slot, adapt the limit from the call's outcome and grant slots to waiters."""
+        granted = []
+        with self._lock:
+            self.in_flight -= 1
+            if kind is not None:
+                self._adapt_locked(kind, latency, failed)
+
+            while self._queue and self.in_flight < self._capacity():
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.state != "waiting":
+                    continue
+                waiter.state = "granted"
+                self._record_wait_locked(time.perf_counter() - waiter.enqueued_at)
+                self._set_waiting_locked(waiter.lane, -1)
+                self.in_flight += 1
+                self.admitted += 1
+                granted.append(waiter)
+
+            LLM_IN_FLIGHT.set(self.in_flight)
+            LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+        for waiter in granted:
+            waiter.wake()
+
+    def _adapt_locked(self, kind: str, latency: Optional[float], failed: bool):
+        """Additive increase on normal calls while the slots are in use, multiplicative decrease on congestion."""
+        if latency is None:
+            return
+
+        now = time.perf_counter()
+        baseline = self._baselines.get(kind)
+        congested = failed or (baseline is not None and latency > baseline * self.latency_tolerance)
+
+        if not failed:
+            self._update_baseline_locked(kind, latency, now)
+            self._mean_latency = latency if self._mean_latency is None else self._mean_latency * 0.9 + latency * 0.1
+
+        if congested:
+            # One cut per round trip, however many slow or failed calls completed in it. A fast
+            # 429 or 5xx is timed by the typical call (1 s before any succeeded), so a burst of
+            # them costs one cut as well
+            if now - self._last_decrease > max(latency, self._mean_latency or 1.0):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+        elif self.in_flight + 1 >= self._capacity():
+            previous = self._capacity()
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            if self._capacity() > previous:
+                self.increases += 1
+
+    def _update_baseline_locked(self, kind: str, latency: float, now: float):
+        """
+        Track the usual latency of a kind of call.
+
+        Faster calls pull the baseline down at once, halfway per call. Slower
+        calls raise it only in proportion to the wall time elapsed over
+        baseline_window seconds, however many complete meanwhile: a queue
+        building up at the provider reads as congestion instead of becoming
+        the new normal, while a model that stays slower is accepted after a while.
+        """
+        baseline = self._baselines.get(kind)
+        if baseline is None:
+            self._baselines[kind] = latency
+        elif latency < baseline:
+            self._baselines[kind] = (baseline + latency) / 2
+        else:
+            weight = min(1.0, (now - self._baseline_updated[kind]) / self.baseline_window)
+            self._baselines[kind] = baseline + (latency - baseline) * weight
+        self._baseline_updated[kind] = now
+
+    def _capacity(self) -> int:
+        return max(1, int(self.limit))
+
+    def _lowest_waiter_locked(self) -> Optional[_Waiter]:
+        """The newest waiter of the lowest-priority lane that has any."""
+        candidates = [(lane, sequence, waiter) for lane, sequence, waiter in self._queue if waiter.state == "waiting"]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda item: (item[0], item[1]))[2]
+
+    def _reject_locked(self, waiter: _Waiter, reason: str):
+        waiter.state = "rejected"
+        waiter.error = LLMOverloadedError(reason, self._retry_after_locked())
+        self._set_waiting_locked(waiter.lane, -1)
+
+    def _set_waiting_locked(self, lane: Lane, delta: int):
+        self._waiting[lane] += delta
+        LLM_QUEUE_DEPTH.labels(lane.name.lower()).set(self._waiting[lane])
+
+    def _record_wait_locked(self, seconds: float):
+        """Moving average of how long recent calls waited for a slot."""
+        self._recent_wait = self._recent_wait * 0.8 + seconds * 0.2
+
+    def _expected_wait_locked(self) -> float:
+        """Seconds until a call queued now would be granted, at the current limit and mean latency."""
+        waiting = sum(self._waiting.values())
+        if not waiting:
+            return 0.0
+        return (waiting + 1) / self._capacity() * (self._mean_latency or 1.0)
+
+    def _retry_after_locked(self) -> int:
+        """Time for the current queue to drain, 1 to 30 seconds."""
+        return int(min(30, max(1, math.ceil(self._expected_wait_locked()))))
+
+    def _count_rejection(self, lane: Lane, reason: str):
+        LLM_REJECTED_TOTAL.labels(lane.name.lower(), reason).inc()
+        with self._lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
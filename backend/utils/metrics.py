@@ -0,0 +1,165 @@
+"""
+Prometheus metrics for the chat service.
+
+Timings are kept as histograms for every LangGraph node, every LLM call,
+every image pipeline stage and every HTTP request. Counters cover routing
+decisions, speculative runs, emergencies, fallback routing and errors, and
+a gauge tracks event-loop lag. Everything is exposed at /metrics in the
+Prometheus text format. Recording a sample costs a few microseconds, so
+metrics stay on in production.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from contextlib import ContextDecorator, contextmanager
+from typing import List, Tuple, Callable, Iterator
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+
+# Latency buckets from 1 ms to 2 min cover CV stages through slow vision calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+NODE_LATENCY = Histogram(
+    "workflow_node_duration_seconds",
+    "Time spent in each LangGraph workflow node",
+    ["node"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "llm_call_duration_seconds",
+    "Time spent in each LLM call, by agent and outcome",
+    ["agent", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds",
+    "Time spent in image pipeline stages and request parsing",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds",
+    "Time LLM calls waited for an admission slot, by lane",
+    ["lane"],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by path and status code",
+    ["method", "path", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+ROUTED_TOTAL = Counter("routed_requests_total", "Requests routed to each agent", ["agent"])
+EMERGENCY_TOTAL = Counter("emergency_detections_total", "Requests answered with the emergency response")
+FALLBACK_ROUTING_TOTAL = Counter("fallback_routing_total", "Keyword fallback routings after an LLM router failure")
+ERRORS_TOTAL = Counter("errors_total", "Errors by component", ["component"])
+LLM_TOKENS_TOTAL = Counter("llm_tokens_total", "LLM tokens by agent and kind (prompt, completion, image_estimate)", ["agent", "kind"])
+LLM_COST_USD_TOTAL = Counter("llm_cost_usd_total", "Estimated LLM spend in USD by agent", ["agent"])
+SPECULATION_TOTAL = Counter("speculative_runs_total", "Specialist calls started before routing finished, by agent and outcome (hit, miss)", ["agent", "outcome"])
+SPECULATION_WASTED_TOKENS = Counter("speculative_wasted_tokens_total", "Tokens reported by mispredicted speculative calls", ["agent"])
+LLM_COALESCED_TOTAL = Counter("llm_single_flight_calls_total", "LLM calls by agent and single-flight role (leader: sent upstream, follower: shared an identical in-flight call)", ["agent", "role"])
+CIRCUIT_TRANSITIONS_TOTAL = Counter("circuit_breaker_transitions_total", "Circuit breaker state changes by agent and new state (open, half_open, closed)", ["agent", "state"])
+DEGRADED_RESPONSES_TOTAL = Counter("degraded_responses_total", "Keyword routings and canned answers given while an agent's circuit breaker was open", ["agent"])
+LLM_HEDGE_TOTAL = Counter("llm_hedge_calls_total", "Hedgeable LLM calls by agent and outcome (primary: answered before the hedge delay, won/lost: a hedge was sent and beat/lost to the original, denied: no budget or capacity for a hedge)", ["agent", "outcome"])
+LLM_REJECTED_TOTAL = Counter("llm_admission_rejections_total", "LLM calls refused by admission control, by lane and reason (queue_full, queue_slow, queue_timeout, shed)", ["lane", "reason"])
+
+EVENT_LOOP_LAG = Gauge("event_loop_lag_seconds", "Most recent event-loop scheduling delay")
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "LLM calls waiting for an admission slot, by lane", ["lane"])
+LLM_IN_FLIGHT = Gauge("llm_in_flight", "LLM calls holding an admission slot")
+LLM_CONCURRENCY_LIMIT = Gauge("llm_concurrency_limit", "Current adaptive limit on concurrent LLM calls")
+LLM_HEDGE_DELAY = Gauge("llm_hedge_delay_seconds", "Current delay before an LLM call is hedged, by agent", ["agent"])
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "Circuit breaker state by agent (0 closed, 1 half-open, 2 open)", ["agent"])
+
+
+_collector = threading.local()
+
+
+class StageTimer(ContextDecorator):
+    """
+    Time a pipeline stage, as a decorator or a with block.
+
+    Stages run inside CV worker processes too, whose metrics never reach the
+    server. Inside collect_stage_timings() samples are also recorded into a
+    list the worker returns, and the server replays them with observe_stages.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def _recreate_cm(self):
+        # A decorated function may run in several threads at once; each call needs its own start time
+        return StageTimer(self.stage)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        STAGE_LATENCY.labels(self.stage).observe(elapsed)
+        timings = getattr(_collector, "timings", None)
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+def timed_stage(stage: str) -> StageTimer:
+    """Time a pipeline stage; see StageTimer."""
+    return StageTimer(stage)
+
+
+@contextmanager
+def collect_stage_timings() -> Iterator[List[Tuple[str, float]]]:
+    """Collect the stage timings recorded in this thread while the block runs."""
+    _collector.timings = []
+    try:
+        yield _collector.timings
+    finally:
+        _collector.timings = None
+
+
+def observe_stages(timings: List[Tuple[str, float]]):
+    """Record stage timings collected in another process."""
+    for stage, elapsed in timings:
+        STAGE_LATENCY.labels(stage).observe(elapsed)
+
+
+def timed_node(node: str, func: Callable) -> Callable:
+    """Wrap a workflow node function, sync or async, to record its duration."""
+    histogram = NODE_LATENCY.labels(node)
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Sample event-loop lag every interval seconds until cancelled."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.set(max(0.0, time.perf_counter() - start - interval))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Return the current metrics and their content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
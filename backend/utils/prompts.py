@@ -125,9 +125,62 @@ TENANCY_FAQ_FOLLOWUPS = [
     "Have you checked your lease agreement for relevant clauses?"
 ]
 
+# Canned guidance for degraded mode, while the agent's circuit breaker is open
+DEGRADED_ISSUE_NOTICE = """**Our AI analysis service is temporarily unavailable**, so this is an automatic assessment based on the keywords in your description. Please ask again in a few minutes for a detailed analysis."""
+
+DEGRADED_ISSUE_GUIDANCE = """**General guidance:**
+- Take photos of the issue and note when you first noticed it
+- Report it to your landlord or property manager in writing and keep a copy
+- Limit further damage if it is safe to do so, e.g. shut off the water supply to a leaking fixture
+- If there is any risk of fire, gas, flooding or electrical hazard, leave the area and call emergency services"""
+
+DEGRADED_FAQ_NOTICE = """**Our legal information service is temporarily unavailable**, so this is general guidance rather than an answer to your specific question. Please ask again in a few minutes for guidance specific to your situation."""
+
+# Most specific topics first; a rent increase question gets the increase guidance
+DEGRADED_FAQ_TOPIC_GUIDANCE = {
+    "increase": "**Rent increases:** Landlords usually have to give written notice well in advance, often 60 to 90 days, and many places limit how often or by how much rent can go up. Check your lease and your local rent board's rules before agreeing to an increase.",
+    "eviction": "**Evictions:** A landlord generally needs a valid legal reason and a formal written notice, and only a court or tribunal order can force you to leave. Do not ignore eviction papers: note every deadline and contact a tenant rights organization right away.",
+    "deposit": "**Security deposits:** Most jurisdictions cap deposit amounts and set a deadline for returning them after you move out, with an itemized list of any deductions. Keep your move-in and move-out photos and ask for the return in writing.",
+    "repair": "**Repairs:** Landlords are generally responsible for keeping the unit in good repair and meeting health and safety standards. Report problems in writing, keep copies, and contact your local housing or property standards office if repairs are not made.",
+    "rent": "**Rent payments:** Your lease and local tenancy law set the due date, accepted payment methods and any late fees. Pay on time where you can and keep receipts for every payment."
+}
+
+DEGRADED_FAQ_GUIDANCE = """For help now, contact your local tenant rights organization or housing authority. Keep copies of your lease and of all written communication with your landlord."""
+
+# Keyword lists are matched on whole words by utils.keyword_matcher.
+# Plurals match automatically ("leak" also matches "leaks"); list other
+# inflections explicitly so that e.g. "fire" never matches "fired".
+
+# Fallback routing keywords
+ISSUE_KEYWORDS = [
+    "damage", "damaged", "broken", "leak", "leaking", "crack", "cracked", "mold", "water",
+    "repair", "fix", "maintenance", "issue", "problem", "wall", "ceiling"
+]
+
+TENANCY_KEYWORDS = [
+    "landlord", "tenant", "rent", "rental", "lease", "eviction", "evict", "deposit",
+    "notice", "agreement", "legal", "rights", "law"
+]
+
+# Severity tiers for issue assessment
+SEVERITY_KEYWORDS = {
+    "high": ["structural", "electrical", "gas", "flood", "flooding", "fire", "collapse"],
+    "medium": ["leak", "leaking", "crack", "cracked", "mold", "damage", "damaged", "malfunction"],
+    "low": ["wear", "maintenance", "cosmetic", "minor"]
+}
+
+# Topics that select tenancy follow-up questions
+FAQ_TOPIC_KEYWORDS = {
+    "rent": ["rent"],
+    "increase": ["increase", "increased", "increasing", "raise", "raised", "raising"],
+    "eviction": ["eviction", "evict", "evicted", "evicting"],
+    "deposit": ["deposit"],
+    "repair": ["repair", "repaired", "maintenance"]
+}
+
 # Emergency detection keywords
 EMERGENCY_KEYWORDS = [
-    "gas leak", "electrical fire", "fire", "flood", "flooding", "structural collapse",
+    "gas leak", "electrical fire", "fire", "flood", "flooding", "flooded", "structural collapse",
     "carbon monoxide", "exposed wires", "sewage backup", "roof collapse",
     "foundation crack", "water heater leak", "electrical burning smell"
 ]
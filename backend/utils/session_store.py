@@ -0,0 +1,448 @@
+"""
+Server-side conversation session store keyed by session_id.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Tuple, TYPE_CHECKING
+
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+
+from utils.usage import UsageCounts, UsageTracker
+
+if TYPE_CHECKING:
+    from utils.history_compactor import HistoryCompactor
+
+
+# Rough per-entry bookkeeping cost (dict, strings, list slot) on top of the text itself
+ENTRY_OVERHEAD_BYTES = 200
+
+# Appended to a message cut short to keep its session under SESSION_MAX_BYTES
+TRUNCATION_MARKER = " [truncated]"
+
+
+@dataclass
+class Session:
+    """Conversation state kept on the server for a single session."""
+    session_id: str
+    turns: List[Dict[str, Any]] = field(default_factory=list)
+    memories: Dict[str, List[Dict[str, str]]] = field(default_factory=dict)
+    last_agent: Optional[str] = None
+    last_active: float = field(default_factory=time.time)
+    size_bytes: int = 0
+    usage: Dict[str, UsageCounts] = field(default_factory=dict)
+    summaries: Dict[str, str] = field(default_factory=dict)
+    pending: Dict[str, List[Dict[str, str]]] = field(default_factory=dict)
+
+
+class SessionMemory:
+    """
+    Per-agent view over the session store, replacing a process-global LangChain buffer.
+    """
+
+    def __init__(self, store: "SessionStore", agent_name: str):
+        self.store = store
+        self.agent_name = agent_name
+
+    def add_exchange(self, session_id: str, user_message: str, ai_message: str):
+        """Record one user/agent exchange for the session."""
+        self.store.add_memory(session_id, self.agent_name, user_message, ai_message)
+        if self.store.compactor is not None:
+            self.store.compactor.after_exchange(session_id, self.agent_name)
+
+    def messages(self, session_id: str) -> List[BaseMessage]:
+        """Return the session's memory for this agent as LangChain messages, compacted if a compactor is attached."""
+        if self.store.compactor is not None:
+            return self.store.compactor.context(session_id, self.agent_name)
+        return [
+            HumanMessage(content=entry["content"]) if entry["role"] == "human" else AIMessage(content=entry["content"])
+            for entry in self.store.get_memory(session_id, self.agent_name)
+        ]
+
+    def clear(self, session_id: str):
+        """Forget this agent's memory for the session."""
+        self.store.clear_memory(session_id, self.agent_name)
+
+
+class SessionStore:
+    """
+    In-process session store with LRU and idle-TTL eviction.
+
+    Each session keeps a bounded number of recent turns plus the last agent that
+    answered, so routing continuity does not require the client to re-upload
+    the whole conversation on every request. Agent memories live here too,
+    partitioned per session and capped in both turns and bytes. The byte cap
+    is hard and covers history summaries too: old exchanges are dropped
+    first, then the largest remaining message or summary is truncated.
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_turns: Optional[int] = None,
+        max_session_bytes: Optional[int] = None
+    ):
+        """Initialize the store, reading unset limits from the environment."""
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+        self.max_turns = max_turns or int(os.getenv("SESSION_MAX_TURNS", "20"))
+        self.max_session_bytes = max_session_bytes or int(os.getenv("SESSION_MAX_BYTES", "65536"))
+
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._evicted_sessions = 0
+        self.compactor: Optional["HistoryCompactor"] = None
+
+    def memory(self, agent_name: str) -> SessionMemory:
+        """Return a per-session memory view for an agent."""
+        return SessionMemory(self, agent_name)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Return the session if it exists and has not expired."""
+        with self._lock:
+            return self._get_locked(session_id, time.time())
+
+    def get_last_agent(self, session_id: str) -> Optional[str]:
+        """Return the last agent that answered in this session."""
+        session = self.get(session_id)
+        return session.last_agent if session else None
+
+    def get_history(self, session_id: str) -> List[Dict[str, Any]]:
+        """Return a copy of the recent turns for this session."""
+        session = self.get(session_id)
+        return list(session.turns) if session else []
+
+    def append_turn(
+        self,
+        session_id: str,
+        user_message: str,
+        agent_response: str,
+        agent_type: Optional[str]
+    ) -> Session:
+        """
+        Record a user message and the agent's reply.
+
+        Args:
+            session_id: Session identifier
+            user_message: Message sent by the user
+            agent_response: Reply returned to the user
+            agent_type: Agent that produced the reply
+
+        Returns:
+            The updated session
+        """
+        now = time.time()
+
+        with self._lock:
+            session = self._get_or_create_locked(session_id, now)
+
+            self._append_locked(
+                session,
+                session.turns,
+                [
+                    {"role": "user", "content": user_message},
+                    {"role": "assistant", "content": agent_response, "agent_type": agent_type}
+                ]
+            )
+
+            if agent_type:
+                session.last_agent = agent_type
+
+            self._evict_locked(now)
+
+            return session
+
+    def add_usage(self, session_id: str, tracker: UsageTracker) -> Dict[str, Any]:
+        """
+        Add a request's token usage to the session's running totals.
+
+        Args:
+            session_id: Session identifier
+            tracker: Usage recorded while handling the request
+
+        Returns:
+            The session's cumulative usage, with the per-agent breakdown
+        """
+        now = time.time()
+
+        with self._lock:
+            session = self._get_or_create_locked(session_id, now)
+            for agent, counts in tracker.snapshot().items():
+                session.usage.setdefault(agent, UsageCounts()).add(counts)
+
+            total = UsageCounts()
+            for counts in session.usage.values():
+                total.add(counts)
+
+            return {**total.to_dict(), "agents": {agent: counts.to_dict() for agent, counts in session.usage.items()}}
+
+    def add_memory(self, session_id: str, agent_name: str, user_message: str, ai_message: str):
+        """Record an exchange in an agent's memory for the session."""
+        now = time.time()
+
+        with self._lock:
+            session = self._get_or_create_locked(session_id, now)
+            entries = session.memories.setdefault(agent_name, [])
+
+            self._append_locked(
+                session,
+                entries,
+                [
+                    {"role": "human", "content": user_message},
+                    {"role": "ai", "content": ai_message}
+                ]
+            )
+
+            self._evict_locked(now)
+
+    def get_memory(self, session_id: str, agent_name: str) -> List[Dict[str, str]]:
+        """Return a copy of an agent's memory for the session."""
+        with self._lock:
+            session = self._get_locked(session_id, time.time())
+            return list(session.memories.get(agent_name, [])) if session else []
+
+    def clear_memory(self, session_id: str, agent_name: str):
+        """Forget an agent's memory for the session."""
+        with self._lock:
+            session = self._get_locked(session_id, time.time())
+            if session is None:
+                return
+
+            entries = session.memories.pop(agent_name, []) + session.pending.pop(agent_name, [])
+            freed = sum(self._entry_size(entry) for entry in entries)
+            freed += self._summary_size(session.summaries.pop(agent_name, None))
+            session.size_bytes -= freed
+            self._total_bytes -= freed
+
+    def fold_memory(self, session_id: str, agent_name: str, keep_entries: int) -> int:
+        """
+        Move an agent's memory entries beyond the newest keep_entries to its pending list.
+
+        Returns:
+            Number of entries now pending summarization
+        """
+        with self._lock:
+            session = self._get_locked(session_id, time.time())
+            if session is None:
+                return 0
+
+            entries = session.memories.get(agent_name, [])
+            pending = session.pending.setdefault(agent_name, [])
+            if len(entries) > keep_entries:
+                pending.extend(entries[:-keep_entries] if keep_entries else entries)
+                del entries[:len(entries) - keep_entries]
+
+            # If summaries keep failing, old entries are dropped as they were before compaction
+            while len(pending) > 2 * self.max_turns:
+                self._resize_locked(session, -self._entry_size(pending.pop(0)))
+
+            return len(pending)
+
+    def get_compacted_memory(self, session_id: str, agent_name: str) -> Tuple[Optional[str], List[Dict[str, str]], List[Dict[str, str]]]:
+        """Return copies of an agent's (summary, pending entries, recent entries) for the session."""
+        with self._lock:
+            session = self._get_locked(session_id, time.time())
+            if session is None:
+                return None, [], []
+            return (
+                session.summaries.get(agent_name),
+                list(session.pending.get(agent_name, [])),
+                list(session.memories.get(agent_name, []))
+            )
+
+    def pending_memory(self, session_id: str, agent_name: str) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """Return the agent's current summary and a copy of its pending entries."""
+        with self._lock:
+            session = self._get_locked(session_id, time.time())
+            if session is None:
+                return None, []
+            return session.summaries.get(agent_name), list(session.pending.get(agent_name, []))
+
+    def apply_summary(self, session_id: str, agent_name: str, summary: Optional[str], folded: int):
+        """
+        Replace an agent's summary and drop the pending entries it now covers.
+
+        Args:
+            session_id: Session identifier
+            agent_name: Agent whose memory was summarized
+            summary: New summary, or None to just drop the entries
+            folded: Number of oldest pending entries the summary covers
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+
+            pending = session.pending.get(agent_name, [])
+            for entry in pending[:folded]:
+                self._resize_locked(session, -self._entry_size(entry))
+            del pending[:folded]
+
+            if summary is not None:
+                self._resize_locked(session, self._summary_size(summary) - self._summary_size(session.summaries.get(agent_name)))
+                session.summaries[agent_name] = summary
+                self._enforce_byte_cap_locked(session)
+
+    def flush(self):
+        """Persist buffered writes; the in-process store has none."""
+
+    def close(self):
+        """Release resources held by the store."""
+
+    def delete(self, session_id: str):
+        """Forget a session."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_bytes -= session.size_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """Report resident sessions and memory usage."""
+        with self._lock:
+            self._evict_locked(time.time())
+
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._total_bytes,
+                "evicted_sessions": self._evicted_sessions,
+                "max_sessions": self.max_sessions,
+                "max_session_bytes": self.max_session_bytes,
+                "max_turns": self.max_turns,
+                "ttl_seconds": self.ttl_seconds,
+                "compaction": self.compactor.stats() if self.compactor is not None else None
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _get_locked(self, session_id: str, now: float) -> Optional[Session]:
+        """Look up a session, dropping it if expired and marking it recently used."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+
+        if now - session.last_active > self.ttl_seconds:
+            self._remove_locked(session_id)
+            return None
+
+        session.last_active = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _get_or_create_locked(self, session_id: str, now: float) -> Session:
+        """Look up a session, creating it if missing."""
+        session = self._get_locked(session_id, now)
+        if session is None:
+            session = Session(session_id=session_id, last_active=now)
+            self._sessions[session_id] = session
+        return session
+
+    def _append_locked(self, session: Session, entries: List[Dict[str, Any]], new_entries: List[Dict[str, Any]]):
+        """Append entries to one of the session's lists and enforce the turn and byte caps."""
+        for entry in new_entries:
+            entries.append(entry)
+            self._resize_locked(session, self._entry_size(entry))
+
+        while len(entries) > 2 * self.max_turns:
+            self._resize_locked(session, -self._entry_size(entries.pop(0)))
+
+        self._enforce_byte_cap_locked(session)
+
+    def _enforce_byte_cap_locked(self, session: Session):
+        """Drop the oldest exchanges of the session's longest list, then truncate messages and summaries, until it fits the byte cap."""
+        while session.size_bytes > self.max_session_bytes:
+            lists = [session.turns] + list(session.memories.values()) + list(session.pending.values())
+            longest = max(lists, key=len)
+            if len(longest) > 2:
+                for _ in range(2):
+                    self._resize_locked(session, -self._entry_size(longest.pop(0)))
+                continue
+
+            # Only the newest exchanges are left; cut the largest message, then summaries, so the cap holds
+            if not (self._truncate_largest_locked(session, lists) or self._truncate_largest_summary_locked(session)):
+                break
+
+    def _truncate_largest_locked(self, session: Session, lists: List[List[Dict[str, Any]]]) -> bool:
+        """Shorten the session's largest message by the bytes it is over the cap; False if nothing can shrink."""
+        candidates = [(entries, index) for entries in lists for index in range(len(entries))]
+        if not candidates:
+            return False
+        entries, index = max(candidates, key=lambda item: self._entry_size(item[0][item[1]]))
+
+        entry = entries[index]
+        content = entry["content"].encode("utf-8")
+        keep = max(0, len(content) - (session.size_bytes - self.max_session_bytes) - len(TRUNCATION_MARKER))
+        # A new dict, since callers may hold copies of the list but not of its entries
+        truncated = {**entry, "content": content[:keep].decode("utf-8", errors="ignore") + TRUNCATION_MARKER}
+        delta = self._entry_size(truncated) - self._entry_size(entry)
+        if delta >= 0:
+            return False
+
+        entries[index] = truncated
+        self._resize_locked(session, delta)
+        return True
+
+    def _truncate_largest_summary_locked(self, session: Session) -> bool:
+        """Shorten the session's largest summary by the bytes it is over the cap; False if none can shrink."""
+        if not session.summaries:
+            return False
+        agent_name = max(session.summaries, key=lambda name: len(session.summaries[name].encode("utf-8")))
+
+        summary = session.summaries[agent_name]
+        content = summary.encode("utf-8")
+        keep = max(0, len(content) - (session.size_bytes - self.max_session_bytes) - len(TRUNCATION_MARKER))
+        truncated = content[:keep].decode("utf-8", errors="ignore") + TRUNCATION_MARKER
+        delta = self._summary_size(truncated) - self._summary_size(summary)
+        if delta >= 0:
+            return False
+
+        session.summaries[agent_name] = truncated
+        self._resize_locked(session, delta)
+        return True
+
+    def _resize_locked(self, session: Session, delta: int):
+        """Adjust the session and store byte counters."""
+        session.size_bytes += delta
+        self._total_bytes += delta
+
+    def _remove_locked(self, session_id: str):
+        """Remove a session and release its bytes."""
+        session = self._sessions.pop(session_id)
+        self._total_bytes -= session.size_bytes
+        self._evicted_sessions += 1
+
+    def _evict_locked(self, now: float):
+        """Drop expired sessions from the LRU end, then enforce the size limit."""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_active <= self.ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._remove_locked(session_id)
+
+    @staticmethod
+    def _entry_size(entry: Dict[str, Any]) -> int:
+        """Approximate resident size of a stored message."""
+        return len(entry["content"].encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+
+    @staticmethod
+    def _summary_size(summary: Optional[str]) -> int:
+        """Approximate resident size of an agent's summary, counted like a message."""
+        return len(summary.encode("utf-8")) + ENTRY_OVERHEAD_BYTES if summary else 0
+
+
+def create_session_store() -> SessionStore:
+    """Create the session store selected by SESSION_BACKEND ("memory" or "sqlite")."""
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        from utils.sqlite_session_store import SqliteSessionStore
+        return SqliteSessionStore()
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND {backend!r}; expected 'memory' or 'sqlite'")
+    return SessionStore()
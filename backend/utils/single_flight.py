@@ -0,0 +1,165 @@
+"""
+Single-flight execution: concurrent calls with the same key share one run.
+
+During an incident many tenants send the same message within seconds, and
+every one of them would otherwise make its own identical LLM request. The
+first caller for a key (the leader) starts the work; callers arriving while
+it is in flight (followers) wait for the same result. Nothing is kept once
+the call finishes, so this is coalescing, not caching.
+"""
+
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+@dataclass
+class _AsyncCall:
+    """An in-flight async call and the number of callers still waiting on it."""
+    task: asyncio.Task
+    waiters: int = 0
+    abandoned: bool = False
+
+
+@dataclass
+class _SyncCall:
+    """An in-flight call made from a worker thread."""
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key.
+
+    The async path runs the leader's call as its own task, so a leader that
+    is cancelled (a timed-out request, a mispredicted speculative call) does
+    not fail its followers. The task is only cancelled once every caller
+    waiting on it has gone.
+    """
+
+    def __init__(self):
+        self._async_calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], _AsyncCall] = {}
+        self._sync_calls: Dict[Hashable, _SyncCall] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]], label: str = "default") -> Tuple[Any, bool]:
+        """
+        Run factory() unless a call with the same key is already in flight.
+
+        Args:
+            key: Identity of the call; equal keys must mean interchangeable results
+            factory: Creates the awaitable doing the actual work
+            label: Name the call is counted under in stats()
+
+        Returns:
+            Tuple of (result, whether this caller was the leader)
+        """
+        loop = asyncio.get_running_loop()
+        slot = (loop, key)
+
+        call = self._async_calls.get(slot)
+        # A call every caller gave up on is being cancelled; it cannot be joined
+        leader = call is None or call.abandoned
+        if leader:
+            call = _AsyncCall(loop.create_task(factory()))
+            self._async_calls[slot] = call
+            call.task.add_done_callback(lambda _: self._forget_async(slot, call))
+        self._count(label, leader)
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), leader
+        except asyncio.CancelledError:
+            if not call.task.done():
+                call.waiters -= 1
+                if call.waiters == 0:
+                    call.abandoned = True
+                    call.task.cancel()
+            raise
+
+    def do_sync(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        label: str = "default",
+        timeout: Optional[float] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Blocking variant of do() for calls made from worker threads.
+
+        Args:
+            key: Identity of the call; equal keys must mean interchangeable results
+            fn: Does the actual work
+            label: Name the call is counted under in stats()
+            timeout: Seconds a follower waits for the leader; the leader's own call is not limited
+
+        Returns:
+            Tuple of (result, whether this caller was the leader)
+
+        Raises:
+            TimeoutError: If this caller is a follower and the leader did not finish within timeout
+        """
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = _SyncCall()
+                self._sync_calls[key] = call
+        self._count(label, leader)
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Coalesced call {label!r} did not finish within {timeout:g} s")
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+
+        try:
+            call.result = fn()
+            return call.result, True
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Report leader and follower counts and the coalescing ratio, overall and per label."""
+        with self._lock:
+            labels = {
+                label: {**counts, "coalescing_ratio": _ratio(counts)}
+                for label, counts in self._counts.items()
+            }
+            leaders = sum(counts["leaders"] for counts in self._counts.values())
+            followers = sum(counts["followers"] for counts in self._counts.values())
+            in_flight = len(self._async_calls) + len(self._sync_calls)
+
+        return {
+            "in_flight": in_flight,
+            "leaders": leaders,
+            "followers": followers,
+            "coalescing_ratio": _ratio({"leaders": leaders, "followers": followers}),
+            "labels": labels
+        }
+
+    def _count(self, label: str, leader: bool):
+        with self._lock:
+            counts = self._counts.setdefault(label, {"leaders": 0, "followers": 0})
+            counts["leaders" if leader else "followers"] += 1
+
+    def _forget_async(self, slot: Tuple[asyncio.AbstractEventLoop, Hashable], call: _AsyncCall):
+        """Drop a finished call so the next caller with its key starts afresh."""
+        if self._async_calls.get(slot) is call:
+            del self._async_calls[slot]
+
+
+def _ratio(counts: Dict[str, int]) -> float:
+    """Share of calls that were served by another caller's request."""
+    total = counts["leaders"] + counts["followers"]
+    return counts["followers"] / total if total else 0.0
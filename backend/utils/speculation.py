@@ -0,0 +1,98 @@
+"""
+Speculative execution of the specialist agent.
+
+A text turn normally waits for the router's LLM call before the specialist
+starts. Most turns are follow-ups that stay with the previous agent, so the
+workflow can start the predicted specialist alongside the router. If the
+router agrees, the answer is already under way. If not, the call is
+cancelled and its tokens are counted as wasted.
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Dict, Any
+
+from models.schemas import AgentResponse
+from utils.usage import UsageTracker, track_usage, merge_usage
+
+
+class SpeculativeRun:
+    """
+    A specialist call started before routing finished.
+
+    Its usage is kept in a tracker of its own until the routing decision is
+    known, then charged to the request either way, since the tokens were spent.
+    """
+
+    def __init__(self, agent: str, call: Awaitable[AgentResponse]):
+        """
+        Start the call as a task.
+
+        Args:
+            agent: Agent type value the call was started for
+            call: The agent's coroutine, not yet awaited
+        """
+        self.agent = agent
+        self.usage = UsageTracker()
+        self.task = asyncio.create_task(self._run(call))
+        # Retrieve failures of runs that get cancelled so asyncio does not log them
+        self.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def _run(self, call: Awaitable[AgentResponse]) -> AgentResponse:
+        with track_usage(self.usage):
+            return await call
+
+    async def result(self) -> AgentResponse:
+        """Wait for the answer; the router agreed with the prediction."""
+        try:
+            return await self.task
+        finally:
+            merge_usage(self.usage)
+
+    def cancel(self) -> int:
+        """
+        Cancel the call; the router picked another agent.
+
+        Returns:
+            Tokens the call reported before it was cancelled
+        """
+        self.task.cancel()
+        merge_usage(self.usage)
+        return self.usage.total().total_tokens
+
+
+class SpeculationStats:
+    """Thread-safe hit, miss and wasted token counts per predicted agent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.wasted_tokens = 0
+
+    def record_hit(self, agent: str):
+        """Count a prediction the router agreed with."""
+        with self._lock:
+            self.hits[agent] = self.hits.get(agent, 0) + 1
+
+    def record_miss(self, agent: str, wasted_tokens: int):
+        """Count a prediction the router overruled."""
+        with self._lock:
+            self.misses[agent] = self.misses.get(agent, 0) + 1
+            self.wasted_tokens += wasted_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Hit rate overall and per agent, plus wasted tokens."""
+        with self._lock:
+            hits = sum(self.hits.values())
+            runs = hits + sum(self.misses.values())
+            return {
+                "runs": runs,
+                "hits": hits,
+                "hit_rate": round(hits / runs, 4) if runs else None,
+                "wasted_tokens": self.wasted_tokens,
+                "by_agent": {
+                    agent: {"hits": self.hits.get(agent, 0), "misses": self.misses.get(agent, 0)}
+                    for agent in sorted(set(self.hits) | set(self.misses))
+                }
+            }
@@ -0,0 +1,361 @@
+"""
+Session store shared by several worker processes through a local SQLite database.
+
+The in-process SessionStore ties a session to the worker that created it, so
+running uvicorn with --workers would split conversations across processes.
+This store keeps sessions in SQLite (WAL mode) instead:
+
+- Writes are queued as operations and committed in one transaction when a
+  turn finishes (or by a background flusher for summary updates). Inside the
+  transaction each session is re-read and the operations are replayed on it,
+  so concurrent writes from different workers are never lost.
+- Reads go through an in-process cache. PRAGMA data_version tells whether
+  any other process has committed since the last check. Only then is a cached
+  session re-validated against its row version, which costs one indexed lookup.
+
+The session logic itself (turn and byte caps, TTL, compaction bookkeeping)
+is the one in SessionStore, applied to a single-session scratch store.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Optional, List, Dict, Any, Tuple
+
+from utils.session_store import Session, SessionStore
+from utils.usage import UsageCounts, UsageTracker
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    last_active REAL NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);
+CREATE TABLE IF NOT EXISTS flush_generation (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL);
+INSERT OR IGNORE INTO flush_generation (id, value) VALUES (0, 0);
+"""
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "real_estate_sessions.db")
+
+
+@dataclass
+class _CachedSession:
+    """A session as last read from the database, plus this process's unflushed operations."""
+    session: Optional[Session]
+    version: int
+    data_version: int
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    SessionStore persisted in SQLite, safe to share between worker processes.
+
+    Settings come from the environment when not given: SESSION_DB_PATH,
+    SESSION_CACHE_SIZE and SESSION_FLUSH_INTERVAL_MS, plus the SessionStore limits.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        cache_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        **limits
+    ):
+        """
+        Open (or create) the database and start the background flusher.
+
+        Args:
+            path: SQLite database file shared by the workers
+            cache_size: Sessions kept in the in-process read cache
+            flush_interval: Seconds between background flushes of writes made outside a turn
+            **limits: SessionStore limits (max_sessions, ttl_seconds, max_turns, max_session_bytes)
+        """
+        super().__init__(**limits)
+        self.path = path or os.getenv("SESSION_DB_PATH", DEFAULT_DB_PATH)
+        self.cache_size = cache_size or int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+        self.flush_interval = flush_interval or int(os.getenv("SESSION_FLUSH_INTERVAL_MS", "200")) / 1000
+
+        self._conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        self._cache: "OrderedDict[str, _CachedSession]" = OrderedDict()
+        self._ops: Dict[str, List[Tuple[str, tuple]]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.flushes = 0
+        self.flush_failures = 0
+
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="session-flusher", daemon=True)
+        self._flusher.start()
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Return the session if it exists and has not expired."""
+        return self._read(session_id, "get")
+
+    def get_memory(self, session_id: str, agent_name: str) -> List[Dict[str, str]]:
+        """Return a copy of an agent's memory for the session."""
+        return self._read(session_id, "get_memory", agent_name)
+
+    def get_compacted_memory(self, session_id: str, agent_name: str) -> Tuple[Optional[str], List[Dict[str, str]], List[Dict[str, str]]]:
+        """Return copies of an agent's (summary, pending entries, recent entries) for the session."""
+        return self._read(session_id, "get_compacted_memory", agent_name)
+
+    def pending_memory(self, session_id: str, agent_name: str) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """Return the agent's current summary and a copy of its pending entries."""
+        return self._read(session_id, "pending_memory", agent_name)
+
+    def append_turn(self, session_id: str, user_message: str, agent_response: str, agent_type: Optional[str]) -> Session:
+        """Record a user message and the agent's reply. See SessionStore.append_turn."""
+        return self._write(session_id, "append_turn", user_message, agent_response, agent_type)
+
+    def add_usage(self, session_id: str, tracker: UsageTracker) -> Dict[str, Any]:
+        """Add a request's token usage to the session's running totals. See SessionStore.add_usage."""
+        return self._write(session_id, "add_usage", _freeze_usage(tracker))
+
+    def add_memory(self, session_id: str, agent_name: str, user_message: str, ai_message: str):
+        """Record an exchange in an agent's memory for the session."""
+        self._write(session_id, "add_memory", agent_name, user_message, ai_message)
+
+    def clear_memory(self, session_id: str, agent_name: str):
+        """Forget an agent's memory for the session."""
+        self._write(session_id, "clear_memory", agent_name)
+
+    def fold_memory(self, session_id: str, agent_name: str, keep_entries: int) -> int:
+        """Move memory entries beyond the newest keep_entries to pending. See SessionStore.fold_memory."""
+        return self._write(session_id, "fold_memory", agent_name, keep_entries)
+
+    def apply_summary(self, session_id: str, agent_name: str, summary: Optional[str], folded: int):
+        """Replace an agent's summary and drop the pending entries it covers. See SessionStore.apply_summary."""
+        self._write(session_id, "apply_summary", agent_name, summary, folded)
+
+    def delete(self, session_id: str):
+        """Forget a session."""
+        self._write(session_id, "delete")
+
+    def flush(self):
+        """Commit all queued writes in one transaction."""
+        with self._lock:
+            if not self._ops:
+                return
+
+            ops, self._ops = self._ops, {}
+            data_version = self._data_version_locked()
+            flushed: Dict[str, Tuple[Optional[Session], int]] = {}
+            now = time.time()
+
+            try:
+                # Take the write lock before reading, so no other worker commits in between
+                self._conn.execute("BEGIN IMMEDIATE")
+                # Row versions come from a database-wide counter, so a deleted and recreated session never reuses one
+                self._conn.execute("UPDATE flush_generation SET value = value + 1 WHERE id = 0")
+                version = self._conn.execute("SELECT value FROM flush_generation WHERE id = 0").fetchone()[0]
+                for session_id, session_ops in ops.items():
+                    row = self._conn.execute(
+                        "SELECT version, data FROM sessions WHERE session_id = ?", (session_id,)
+                    ).fetchone()
+                    session = self._replay(session_id, _deserialize(session_id, row[1]) if row else None, session_ops)
+
+                    if session is None:
+                        self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                    else:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO sessions (session_id, version, last_active, size_bytes, data) VALUES (?, ?, ?, ?, ?)",
+                            (session_id, version, session.last_active, session.size_bytes, _serialize(session))
+                        )
+                    flushed[session_id] = (session, version if session is not None else 0)
+
+                self._expire_rows_locked(now)
+                self._conn.execute("COMMIT")
+            except Exception as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                self.flush_failures += 1
+                if not isinstance(e, sqlite3.OperationalError):
+                    print(f"Session store flush failed, dropping {len(ops)} sessions' writes: {e}")
+                    return
+                # Busy or locked database: keep the writes for the next flush, ahead of anything queued since
+                print(f"Session store flush failed, will retry: {e}")
+                for session_id, session_ops in ops.items():
+                    self._ops[session_id] = session_ops + self._ops.get(session_id, [])
+                return
+
+            self.flushes += 1
+            for session_id, (session, version) in flushed.items():
+                self._cache[session_id] = _CachedSession(session, version, data_version)
+                self._cache.move_to_end(session_id)
+            self._trim_cache_locked()
+
+    def close(self):
+        """Flush queued writes and close the database."""
+        self._closed.set()
+        self._flusher.join(timeout=self.flush_interval * 2 + 1)
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Report stored sessions, cache effectiveness and write batching."""
+        with self._lock:
+            sessions, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM sessions WHERE last_active >= ?",
+                (time.time() - self.ttl_seconds,)
+            ).fetchone()
+
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "sessions": sessions,
+                "bytes": total_bytes,
+                "evicted_sessions": self._evicted_sessions,
+                "max_sessions": self.max_sessions,
+                "max_session_bytes": self.max_session_bytes,
+                "max_turns": self.max_turns,
+                "ttl_seconds": self.ttl_seconds,
+                "cache": {
+                    "sessions": len(self._cache),
+                    "max_sessions": self.cache_size,
+                    "hits": self.cache_hits,
+                    "misses": self.cache_misses
+                },
+                "queued_writes": sum(len(session_ops) for session_ops in self._ops.values()),
+                "flushes": self.flushes,
+                "flush_failures": self.flush_failures,
+                "compaction": self.compactor.stats() if self.compactor is not None else None
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE last_active >= ?", (time.time() - self.ttl_seconds,)
+            ).fetchone()[0]
+
+    def _read(self, session_id: str, method: str, *args):
+        """Run a SessionStore read method against the current view of one session."""
+        with self._lock:
+            scratch = self._scratch(session_id, self._cached_locked(session_id).session)
+            return getattr(SessionStore, method)(scratch, session_id, *args)
+
+    def _write(self, session_id: str, method: str, *args):
+        """Apply a SessionStore write method to this process's view and queue it for the database."""
+        with self._lock:
+            cached = self._cached_locked(session_id)
+            scratch = self._scratch(session_id, cached.session)
+            result = getattr(SessionStore, method)(scratch, session_id, *args)
+            cached.session = scratch._sessions.get(session_id)
+            self._ops.setdefault(session_id, []).append((method, args))
+            return result
+
+    def _cached_locked(self, session_id: str) -> _CachedSession:
+        """Return the cache entry for a session, re-reading it if another process may have changed it."""
+        data_version = self._data_version_locked()
+        cached = self._cache.get(session_id)
+
+        if cached is not None and cached.data_version == data_version:
+            self.cache_hits += 1
+            self._cache.move_to_end(session_id)
+            return cached
+
+        # Another process committed since this entry was validated; the data is only sent if the row changed
+        row = self._conn.execute(
+            "SELECT version, CASE WHEN version = ? THEN NULL ELSE data END FROM sessions WHERE session_id = ?",
+            (cached.version if cached else -1, session_id)
+        ).fetchone()
+        version = row[0] if row else 0
+
+        if cached is not None and cached.version == version:
+            self.cache_hits += 1
+            cached.data_version = data_version
+            self._cache.move_to_end(session_id)
+            return cached
+
+        self.cache_misses += 1
+        session = _deserialize(session_id, row[1]) if row else None
+        cached = _CachedSession(self._replay(session_id, session, self._ops.get(session_id, [])), version, data_version)
+        self._cache[session_id] = cached
+        self._trim_cache_locked()
+        return cached
+
+    def _replay(self, session_id: str, session: Optional[Session], ops: List[Tuple[str, tuple]]) -> Optional[Session]:
+        """Apply queued write operations to a session and return the result."""
+        if not ops:
+            return session
+        scratch = self._scratch(session_id, session)
+        for method, args in ops:
+            getattr(SessionStore, method)(scratch, session_id, *args)
+        return scratch._sessions.get(session_id)
+
+    def _scratch(self, session_id: str, session: Optional[Session]) -> SessionStore:
+        """A throwaway in-process store holding just this session, to run the SessionStore logic on."""
+        scratch = SessionStore(self.max_sessions, self.ttl_seconds, self.max_turns, self.max_session_bytes)
+        if session is not None:
+            scratch._sessions[session_id] = session
+            scratch._total_bytes = session.size_bytes
+        return scratch
+
+    def _data_version_locked(self) -> int:
+        """Changes whenever another connection commits to the database."""
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _expire_rows_locked(self, now: float):
+        """Delete expired sessions, then the least recently active beyond max_sessions."""
+        expired = self._conn.execute("DELETE FROM sessions WHERE last_active < ?", (now - self.ttl_seconds,)).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM sessions WHERE session_id IN (SELECT session_id FROM sessions ORDER BY last_active DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        ).rowcount
+        self._evicted_sessions += expired + overflow
+
+    def _trim_cache_locked(self):
+        """Drop least recently used cache entries that have no queued writes."""
+        for session_id in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            if session_id not in self._ops:
+                del self._cache[session_id]
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Session store background flush error: {e}")
+
+
+def _freeze_usage(tracker: UsageTracker) -> UsageTracker:
+    """Copy of a request's usage, so a queued add_usage replays the same numbers."""
+    frozen = UsageTracker()
+    for agent, counts in tracker.snapshot().items():
+        frozen.add(agent, counts)
+    return frozen
+
+
+def _serialize(session: Session) -> str:
+    # Field by field: dataclasses.asdict deep-copies every message and dominated flush time
+    return json.dumps({
+        "turns": session.turns,
+        "memories": session.memories,
+        "last_agent": session.last_agent,
+        "last_active": session.last_active,
+        "size_bytes": session.size_bytes,
+        "usage": {agent: asdict(counts) for agent, counts in session.usage.items()},
+        "summaries": session.summaries,
+        "pending": session.pending
+    }, separators=(",", ":"))
+
+
+def _deserialize(session_id: str, data: str) -> Session:
+    fields = json.loads(data)
+    fields["usage"] = {agent: UsageCounts(**counts) for agent, counts in fields.get("usage", {}).items()}
+    return Session(session_id=session_id, **fields)
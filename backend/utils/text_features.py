@@ -0,0 +1,62 @@
+"""
+Lightweight text featurization shared by the local routing classifier.
+"""
+
+import re
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+from utils.keyword_matcher import match_keywords
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def hashed_ngrams(text: str, n_features: int, ngram_range: Tuple[int, int] = (1, 2)) -> np.ndarray:
+    """
+    Hash word n-grams into a fixed-size, L2-normalized feature vector.
+
+    Uses CRC32 rather than Python's salted hash() so vectors are stable across
+    processes and match the ones a model was trained on.
+
+    Args:
+        text: Input text
+        n_features: Size of the output vector
+        ngram_range: Inclusive range of n-gram lengths
+
+    Returns:
+        Float32 vector of shape (n_features,)
+    """
+    vector = np.zeros(n_features, dtype=np.float32)
+    tokens = tokenize(text)
+
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(tokens) - n + 1):
+            digest = zlib.crc32(" ".join(tokens[i:i + n]).encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % n_features] += sign
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+
+    return vector
+
+
+def routing_keyword_scores(text: str) -> Tuple[int, int]:
+    """
+    Count issue and tenancy keywords in the text.
+
+    Returns:
+        Tuple of (issue_score, tenancy_score)
+    """
+    hits = match_keywords(text)
+
+    return len(hits.get("issue", [])), len(hits.get("tenancy", []))
@@ -0,0 +1,198 @@
+"""
+Token and cost accounting for LLM calls.
+
+Every LLM response reports prompt and completion tokens. The LLM callback
+records them into the UsageTracker of the request being handled, found
+through a context variable, so totals are kept per request and per agent
+without threading a tracker through every call. The workflow then adds
+each request's totals to its session.
+"""
+
+import math
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import Optional, Dict, Any, Iterator, Tuple
+
+from utils.metrics import LLM_TOKENS_TOTAL, LLM_COST_USD_TOTAL
+
+
+# USD per million (prompt, completion) tokens; matched by longest model-name prefix
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00)
+}
+
+
+@dataclass
+class UsageCounts:
+    """Token counts and estimated cost for one or more LLM calls."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    image_tokens: int = 0
+    llm_calls: int = 0
+    cost_usd: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: "UsageCounts"):
+        """Accumulate another set of counts into this one."""
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.image_tokens += other.image_tokens
+        self.llm_calls += other.llm_calls
+        self.cost_usd += other.cost_usd
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "total_tokens": self.total_tokens, "cost_usd": round(self.cost_usd, 6)}
+
+
+class UsageTracker:
+    """Per-agent usage for one request."""
+
+    def __init__(self):
+        self.agents: Dict[str, UsageCounts] = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent: str, counts: UsageCounts):
+        """Add counts for an agent."""
+        with self._lock:
+            self.agents.setdefault(agent, UsageCounts()).add(counts)
+
+    def snapshot(self) -> Dict[str, UsageCounts]:
+        """Copies of each agent's counts, taken under the tracker's lock."""
+        with self._lock:
+            return {agent: UsageCounts(**asdict(counts)) for agent, counts in self.agents.items()}
+
+    def total(self) -> UsageCounts:
+        """Sum over all agents."""
+        total = UsageCounts()
+        with self._lock:
+            for counts in self.agents.values():
+                total.add(counts)
+        return total
+
+    def merge(self, other: "UsageTracker"):
+        """Add every agent's counts from another tracker."""
+        for agent, counts in other.snapshot().items():
+            self.add(agent, counts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Totals plus the per-agent breakdown, JSON-serializable."""
+        with self._lock:
+            agents = {agent: counts.to_dict() for agent, counts in self.agents.items()}
+        return {**self.total().to_dict(), "agents": agents}
+
+
+_current_tracker: ContextVar[Optional[UsageTracker]] = ContextVar("current_usage_tracker", default=None)
+
+
+@contextmanager
+def track_usage(tracker: Optional[UsageTracker] = None) -> Iterator[UsageTracker]:
+    """Record usage of the LLM calls made inside the block, including tasks and threads it starts."""
+    tracker = tracker or UsageTracker()
+    token = _current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        try:
+            _current_tracker.reset(token)
+        except ValueError:
+            # An async generator closed from another task runs this in a context it never set
+            pass
+
+
+def merge_usage(tracker: UsageTracker):
+    """Add usage recorded in a separate tracker to the current request's tracker."""
+    current = _current_tracker.get()
+    if current is not None and current is not tracker:
+        current.merge(tracker)
+
+
+def model_prices(model: Optional[str]) -> Tuple[float, float]:
+    """(prompt, completion) USD per million tokens for a model, or zeros if unknown."""
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model and model.startswith(prefix):
+            return MODEL_PRICES[prefix]
+    return 0.0, 0.0
+
+
+def record_llm_usage(agent: str, model: Optional[str], prompt_tokens: int, completion_tokens: int):
+    """
+    Record one LLM call's token usage in metrics and the current request's tracker.
+
+    Args:
+        agent: Agent that made the call
+        model: Model name reported by the API
+        prompt_tokens: Prompt tokens, including image tokens
+        completion_tokens: Completion tokens
+    """
+    prompt_price, completion_price = model_prices(model)
+    cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    LLM_TOKENS_TOTAL.labels(agent, "prompt").inc(prompt_tokens)
+    LLM_TOKENS_TOTAL.labels(agent, "completion").inc(completion_tokens)
+    LLM_COST_USD_TOTAL.labels(agent).inc(cost)
+
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.add(agent, UsageCounts(prompt_tokens, completion_tokens, 0, 1, cost))
+
+
+def record_image_tokens(agent: str, tokens: int):
+    """Record the estimated share of an upcoming call's prompt tokens spent on images."""
+    LLM_TOKENS_TOTAL.labels(agent, "image_estimate").inc(tokens)
+
+    tracker = _current_tracker.get()
+    if tracker is not None:
+        tracker.add(agent, UsageCounts(image_tokens=tokens))
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """
+    Estimate the prompt tokens an image costs on the OpenAI vision models.
+
+    Low detail is a flat 85 tokens. High detail fits the image in 2048x2048,
+    scales its shortest side down to 768, then charges 170 tokens per 512 px
+    tile plus the 85 token base.
+    """
+    if detail == "low":
+        return 85
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def usage_from_llm_result(response: Any) -> Tuple[Optional[str], int, int]:
+    """
+    Extract (model, prompt_tokens, completion_tokens) from a LangChain LLMResult.
+
+    Streamed and plain responses carry usage in different places: the message's
+    usage_metadata for streams, llm_output["token_usage"] otherwise.
+    """
+    llm_output = response.llm_output or {}
+    model = llm_output.get("model_name")
+
+    token_usage = llm_output.get("token_usage") or {}
+    if token_usage:
+        return model, token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            if usage:
+                model = model or message.response_metadata.get("model_name")
+                return model, usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+    return model, 0, 0
@@ -26,7 +26,6 @@ const ChatInterface: FC<ChatInterfaceProps> = ({ sessionId }) => {
   const { isLoading, sendMessage } = useChat({
     sessionId,
     location,
-    messages,
     addMessage,
     addErrorMessage,
     setUploadedImage
@@ -1,6 +1,6 @@
 import { UseChatProps } from '@/types'
 import { sendMessage } from '@/utils/api'
-import { createUserMessage, prepareConversationHistory } from '@/utils/messageUtils'
+import { createUserMessage } from '@/utils/messageUtils'
 import { useState } from 'react'
 
 interface UseChatReturn {
@@ -11,7 +11,6 @@ interface UseChatReturn {
 export const useChat = ({ 
   sessionId, 
   location, 
-  messages, 
   addMessage, 
   addErrorMessage, 
   setUploadedImage 
@@ -26,13 +25,10 @@ export const useChat = ({
     setIsLoading(true)
 
     try {
-      const conversationHistory = prepareConversationHistory(messages)
-      
       const assistantMessage = await sendMessage(
         userMessage,
         location,
         sessionId,
-        conversationHistory,
         uploadedImage
       )
       
@@ -13,11 +13,6 @@ export interface Message {
   isError?: boolean;
 }
 
-export interface ConversationHistoryItem {
-  role: 'user' | 'assistant';
-  content: string;
-}
-
 export interface ChatResponse {
   response: string;
   agent_type: string;
@@ -29,7 +24,6 @@ export interface ChatResponse {
 export interface UseChatProps {
   sessionId: string;
   location?: string;
-  messages: Message[];
   addMessage: (message: Message) => void;
   addErrorMessage: (error: Error) => void;
   setUploadedImage: (image: File | null) => void;
@@ -1,4 +1,4 @@
-import { Message, ConversationHistoryItem } from '@/types'
+import { Message } from '@/types'
 
 const getBackendUrl = (): string => {
   return import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'
@@ -19,14 +19,12 @@ const buildFormData = (
   userMessage: Message,
   uploadedImage: File | null,
   location: string | undefined,
-  sessionId: string,
-  conversationHistory: ConversationHistoryItem[]
+  sessionId: string
 ): FormData => {
   const formData = new FormData()
   formData.append('message', userMessage.content)
   formData.append('location', location || '')
   formData.append('session_id', sessionId)
-  formData.append('conversation_history', JSON.stringify(conversationHistory))
   
   if (uploadedImage) {
     formData.append('file', uploadedImage)
@@ -39,10 +37,9 @@ export const sendMessage = async (
   userMessage: Message,
   location: string | undefined,
   sessionId: string,
-  conversationHistory: ConversationHistoryItem[],
   uploadedImage?: File | null
 ): Promise<Message> => {
-  const formData = buildFormData(userMessage, uploadedImage || null, location, sessionId, conversationHistory)
+  const formData = buildFormData(userMessage, uploadedImage || null, location, sessionId)
 
   const response = await fetch(`${getBackendUrl()}/api/chat`, {
     method: 'POST',
@@ -1,11 +1,4 @@
-import type { Message, ConversationHistoryItem } from '@/types'
-
-export const prepareConversationHistory = (messages: Message[]): ConversationHistoryItem[] => {
-  return messages.map(msg => ({
-    role: msg.role,
-    content: msg.content
-  }))
-}
+import type { Message } from '@/types'
 
 export const createUserMessage = (content: string, uploadedImage: File | null = null): Message => {
   const message: Message = {